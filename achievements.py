@@ -0,0 +1,228 @@
+import os
+import threading
+from datetime import datetime, timezone
+
+import psycopg2
+from dotenv import load_dotenv
+
+from cache import TTLCache
+from coalescer import BufferFull, WriteBuffer
+from db import db_connection
+
+# El tamaño de la tanda y el intervalo de escritura se leen al importar
+load_dotenv()
+
+
+# ==========================================
+# MARK: REGLAS DECLARATIVAS
+# ==========================================
+# Cada regla escucha un tipo de evento y decide con los datos del propio evento
+# (sin consultar la base). backfill_query() es la versión por conjuntos de la
+# misma condición: devuelve los id_jugador que ya la cumplen.
+class ReachLevel:
+    event = "nivel"
+
+    def __init__(self, nombre, descripcion, nivel):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.nivel = nivel
+
+    def matches(self, datos):
+        return datos["nivel"] >= self.nivel
+
+    def backfill_query(self):
+        return "SELECT id_jugador FROM jugador WHERE nivel >= %s", (self.nivel,)
+
+
+class WinMatches:
+    event = "partida"
+
+    def __init__(self, nombre, descripcion, victorias):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.victorias = victorias
+
+    def matches(self, datos):
+        return datos["victorias"] >= self.victorias
+
+    def backfill_query(self):
+        return """
+            SELECT id_jugador FROM ranking_personaje
+            GROUP BY id_jugador
+            HAVING SUM(victorias) >= %s
+        """, (self.victorias,)
+
+
+class OwnPetType:
+    event = "mascota"
+
+    def __init__(self, nombre, descripcion, tipo):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.tipo = tipo
+
+    def matches(self, datos):
+        return datos["tipo"].lower() == self.tipo.lower()
+
+    def backfill_query(self):
+        return """
+            SELECT DISTINCT p.id_jugador
+            FROM mascota m
+            JOIN personaje p ON p.id_personaje = m.id_personaje
+            WHERE lower(m.tipo) = lower(%s)
+        """, (self.tipo,)
+
+
+RULES = [
+    ReachLevel("Aprendiz", "Alcanza el nivel 5", 5),
+    ReachLevel("Veterano", "Alcanza el nivel 20", 20),
+    ReachLevel("Leyenda", "Alcanza el nivel 50", 50),
+    WinMatches("Primera victoria", "Gana tu primera partida", 1),
+    WinMatches("Conquistador", "Gana 10 partidas", 10),
+    WinMatches("Señor de la guerra", "Gana 100 partidas", 100),
+    OwnPetType("Domador de lobos", "Consigue una mascota de tipo Lobo", "Lobo"),
+    OwnPetType("Jinete de dragones", "Consigue una mascota de tipo Dragón", "Dragón"),
+]
+
+
+# ==========================================
+# MARK: MOTOR DE LOGROS
+# ==========================================
+class AchievementEngine:
+    """
+    Evalúa las reglas contra eventos (subida de nivel, partida, mascota nueva)
+    y acumula los desbloqueos en un WriteBuffer: se escriben en obtiene por tandas,
+    al llegar a batch_size o cada flush_every segundos, y al salir.
+
+    Un desbloqueo repetido no es un error: ON CONFLICT DO NOTHING conserva la
+    fecha_desbloqueo original.
+    """
+
+    def __init__(self, rules, batch_size=100, flush_every=2.0, max_pending=10000):
+        self.rules = rules
+        self._by_event = {}
+        for rule in rules:
+            self._by_event.setdefault(rule.event, []).append(rule)
+
+        self._ids = None       # nombre_logro -> id_logro
+        self._catalog_lock = threading.Lock()
+        self._written = TTLCache(maxsize=50000, ttl=3600)  # Ya en obtiene: no se reenvían
+        self._buffer = WriteBuffer(
+            "logros",
+            self._write,
+            merge=min,  # Dos desbloqueos del mismo logro: vale la fecha del primero
+            batch_size=batch_size,
+            flush_every=flush_every,
+            max_pending=max_pending,
+            # Un jugador borrado entre el evento y la tanda: se descarta su fila, no la tanda
+            drop_on=(psycopg2.IntegrityError,),
+        )
+
+    # ---- Eventos ----
+    def emit(self, event, id_jugador, **datos):
+        """
+        Evalúa solo las reglas que escuchan `event`. No abre conexiones si el catálogo
+        ya se cargó al arrancar (sync_catalog): se puede llamar con otra conexión abierta.
+        """
+        rules = [r for r in self._by_event.get(event, ()) if r.matches(datos)]
+        if not rules:
+            return
+
+        ids = self._catalog()
+        ahora = datetime.now(timezone.utc)
+        nuevos = [((id_jugador, ids[r.nombre]), ahora) for r in rules]
+        nuevos = [(key, fecha) for key, fecha in nuevos if not self._written.get(key)]
+        if not nuevos:
+            return
+
+        try:
+            self._buffer.add(nuevos)
+        except BufferFull:
+            # El desbloqueo no se pierde del todo: backfill lo recupera a partir de los datos
+            print(f"⚠️ Buffer de logros lleno: se descartan {len(nuevos)} desbloqueo(s) de {id_jugador}")
+
+    # ---- Escritura por tandas ----
+    def flush(self):
+        """Escribe los desbloqueos pendientes. Devuelve cuántos se enviaron."""
+        return self._buffer.flush()
+
+    def shutdown(self):
+        self._buffer.shutdown()
+
+    # ---- Catálogo ----
+    def sync_catalog(self):
+        """
+        Registra las reglas en logro (idempotente por nombre) y guarda sus id.
+        Se llama al arrancar el worker, antes de que emit() pueda necesitarlo.
+        """
+        with self._catalog_lock:
+            return self._load_catalog()
+
+    # ---- Modo backfill ----
+    def backfill(self):
+        """
+        Evalúa todas las reglas sobre los jugadores existentes: un INSERT ... SELECT
+        por regla. Devuelve {nombre_logro: desbloqueos nuevos}.
+        """
+        ids = self._catalog()
+        nuevos = {}
+
+        with db_connection() as conn, conn.cursor() as cur:
+            for rule in self.rules:
+                consulta, params = rule.backfill_query()
+                cur.execute("""
+                    INSERT INTO obtiene (id_jugador, id_logro, fecha_desbloqueo)
+                    SELECT c.id_jugador, %s, NOW()
+                    FROM ({}) AS c
+                    ON CONFLICT (id_jugador, id_logro) DO NOTHING;
+                """.format(consulta), (ids[rule.nombre],) + params)
+                nuevos[rule.nombre] = cur.rowcount
+
+            conn.commit()
+
+        return nuevos
+
+    # ---- Internos ----
+    def _catalog(self):
+        # Si el worker arrancó sin base, la primera llamada lo carga (una sola vez)
+        if self._ids is None:
+            with self._catalog_lock:
+                if self._ids is None:
+                    self._load_catalog()
+        return self._ids
+
+    def _load_catalog(self):
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO logro (nombre_logro, descripcion_logro)
+                SELECT * FROM unnest(%s::text[], %s::text[])
+                ON CONFLICT (nombre_logro) DO UPDATE
+                SET descripcion_logro = EXCLUDED.descripcion_logro
+                RETURNING nombre_logro, id_logro;
+            """, ([r.nombre for r in self.rules], [r.descripcion for r in self.rules]))
+            ids = dict(cur.fetchall())
+            conn.commit()
+
+        self._ids = ids
+        return ids
+
+    def _write(self, lote):
+        # lote: [((id_jugador, id_logro), fecha)]; un array por columna
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO obtiene (id_jugador, id_logro, fecha_desbloqueo)
+                SELECT * FROM unnest(%s::int[], %s::int[], %s::timestamptz[])
+                ON CONFLICT (id_jugador, id_logro) DO NOTHING;
+            """, ([j for (j, _), _ in lote], [l for (_, l), _ in lote], [f for _, f in lote]))
+            conn.commit()
+
+        for key, _ in lote:
+            self._written.set(key, True)
+
+
+engine = AchievementEngine(
+    RULES,
+    batch_size=int(os.getenv("LOGROS_BATCH", "100")),
+    flush_every=float(os.getenv("LOGROS_FLUSH", "2")),
+    max_pending=int(os.getenv("LOGROS_BUFFER_MAX", "10000")),
+)
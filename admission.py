@@ -0,0 +1,257 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from flask import g, has_request_context, request, session
+
+import db
+import metrics
+
+# Las reglas y los límites se leen al importar
+load_dotenv()
+
+
+# ==========================================
+# MARK: REGLAS POR RUTA
+# ==========================================
+# Cada request pasa por:
+#   1. token buckets por IP, por sesión (id_jugador) y por cuenta (el correo de un
+#      login) según la regla de su endpoint → 429 + Retry-After si el cliente va
+#      más rápido de lo permitido;
+#   2. al pedir su primera conexión, un límite global de requests simultáneos del
+#      tamaño del pool → 503 + Retry-After si no hay hueco antes de ADMISSION_DEADLINE
+#      segundos. Las rutas que no tocan la base (o la respuesta sale de caché) no
+#      ocupan hueco.
+# Así un solo cliente insistiendo en /login (bcrypt) o en /api/personaje/<id> no
+# acapara el pool ni deja una cola que crece sin fin.
+#
+# Regla = {"ip": (tokens_por_segundo, ráfaga), "session": (...), "account": (...),
+# "methods": [...]}. La regla de un endpoint sustituye a la de "*". ADMISSION_RULES
+# (JSON) reemplaza o añade reglas, p. ej. '{"login": {"account": [0.5, 10]}}'.
+DEFAULT_RULES = {
+    # 12 intentos/min por cuenta (ráfaga de 10); por IP se permite más, porque detrás
+    # de un NAT o un proxy muchos jugadores comparten la misma dirección
+    "login": {"ip": (2, 60), "account": (0.2, 10), "methods": ("POST",)},
+    "registro": {"ip": (0.05, 5), "methods": ("POST",)},
+    "obtener_personaje": {"ip": (20, 40), "session": (10, 20)},
+    "obtener_mascota": {"ip": (20, 40), "session": (10, 20)},
+    "obtener_personajes": {"ip": (5, 10), "session": (5, 10)},
+    "obtener_mascotas": {"ip": (5, 10), "session": (5, 10)},
+    "obtener_personajes_con_mascotas": {"ip": (5, 10), "session": (5, 10)},
+    "*": {"session": (20, 40)},
+}
+
+# Sin límites: estáticos, monitoreo y rutas que no usan la base
+EXEMPT = {"static", "ping", "exponer_metricas", "estadisticas_cache"}
+
+
+def admission_settings():
+    rules = dict(DEFAULT_RULES)
+    rules.update(json.loads(os.getenv("ADMISSION_RULES", "{}")))
+
+    return {
+        "enabled": os.getenv("ADMISSION_ENABLED", "1") != "0",
+        "rules": rules,
+        "limit": int(os.getenv("ADMISSION_LIMIT", os.getenv("DB_POOL_MAX", "5"))),   # Requests con base a la vez
+        "deadline": float(os.getenv("ADMISSION_DEADLINE", "2")),   # Espera máxima por un hueco
+        "max_clients": int(os.getenv("ADMISSION_MAX_CLIENTS", "100000")),  # Buckets en memoria
+    }
+
+
+class RateLimited(Exception):
+    """El cliente agotó su bucket; puede reintentar tras retry_after segundos."""
+
+    def __init__(self, retry_after):
+        super().__init__("Demasiadas peticiones")
+        self.retry_after = retry_after
+
+
+class Overloaded(Exception):
+    """No hubo hueco para el request dentro del plazo: se descarta en vez de encolarlo."""
+
+    def __init__(self, retry_after=1):
+        super().__init__("Servidor saturado")
+        self.retry_after = retry_after
+
+
+# ==========================================
+# MARK: TOKEN BUCKETS
+# ==========================================
+class BucketTable:
+    """
+    Un bucket por clave (IP o jugador), acotado por LRU. Un bucket expulsado por
+    inactividad se recrea lleno, que es justo el estado en que habría quedado.
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()  # clave -> [tokens, último relleno]
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """Gasta un token. Devuelve 0 si se admite o los segundos hasta el próximo token."""
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [burst, now]
+                while len(self._buckets) > self.maxsize:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+
+            return (1 - bucket[0]) / rate if rate > 0 else math.inf
+
+
+# ==========================================
+# MARK: LÍMITE GLOBAL DE CONCURRENCIA
+# ==========================================
+class ConcurrencyLimiter:
+    def __init__(self, limit=5, deadline=2):
+        self.limit = limit
+        self.deadline = deadline
+        self.in_flight = 0
+        self.waiting = 0
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            self.waiting += 1
+        try:
+            admitted = self._slots.acquire(timeout=self.deadline)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+        if not admitted:
+            raise Overloaded(retry_after=max(1, math.ceil(self.deadline)))
+
+        with self._lock:
+            self.in_flight += 1
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+
+# ==========================================
+# MARK: CONTROLADOR
+# ==========================================
+class AdmissionController:
+    def __init__(self, rules, limit=5, deadline=2, max_clients=100000, enabled=True):
+        self.enabled = enabled
+        self.rules = rules
+        self.limiter = ConcurrencyLimiter(limit, deadline)
+        self._tables = {scope: BucketTable(max_clients) for scope in ("ip", "session", "account")}
+
+    def rule(self, endpoint, method):
+        rule = self.rules.get(endpoint, self.rules.get("*", {}))
+        if "methods" in rule and method not in rule["methods"]:
+            return {}
+        return rule
+
+    def check(self, endpoint, method, ip=None, session_id=None, account=None):
+        """Aplica los token buckets de la regla del endpoint; lanza RateLimited si no hay token."""
+        if not self.enabled or endpoint is None or endpoint in EXEMPT:
+            return
+
+        rule = self.rule(endpoint, method)
+
+        for scope, key in (("ip", ip), ("session", session_id), ("account", account)):
+            if scope not in rule or key is None:
+                continue
+
+            rate, burst = rule[scope]
+            # Bucket por (endpoint, cliente): agotar /login no bloquea el resto de la app
+            wait = self._tables[scope].take((endpoint, key), rate, burst)
+            if wait:
+                metrics.ADMISSION_DECISIONS.inc(endpoint=endpoint, decision=f"rate_limited_{scope}")
+                raise RateLimited(retry_after=max(1, math.ceil(wait)))
+
+    def admit(self, endpoint):
+        """Un hueco del límite global. Quien recibe True debe llamar a release()."""
+        if not self.enabled or endpoint is None or endpoint in EXEMPT:
+            return False
+
+        try:
+            self.limiter.acquire()
+        except Overloaded:
+            metrics.ADMISSION_DECISIONS.inc(endpoint=endpoint, decision="shed")
+            raise
+
+        metrics.ADMISSION_DECISIONS.inc(endpoint=endpoint, decision="admitted")
+        return True
+
+    def release(self):
+        self.limiter.release()
+
+    def metric_lines(self):
+        return (
+            metrics.gauge_lines("admission_in_flight", "Requests admitidos en curso",
+                                [({}, self.limiter.in_flight)])
+            + metrics.gauge_lines("admission_waiting", "Requests esperando un hueco",
+                                  [({}, self.limiter.waiting)])
+            + metrics.gauge_lines("admission_limit", "Requests con base simultáneos permitidos",
+                                  [({}, self.limiter.limit)])
+        )
+
+
+controller = AdmissionController(**admission_settings())
+
+
+def init_app(app):
+    """Aplica el control de admisión a todos los requests de la app Flask."""
+    @app.before_request
+    def _limitar():
+        # Solo se lee el formulario si la regla limita por cuenta (p. ej. el login)
+        cuenta = "account" in controller.rule(request.endpoint, request.method)
+        correo = request.form.get("correo", "").strip().lower() if cuenta else ""
+        controller.check(request.endpoint, request.method, request.remote_addr,
+                         session.get("id_jugador"), correo or None)
+
+    # El hueco se reserva con la primera conexión del request y se libera al terminarlo
+    @db.add_checkout_gate
+    def _admitir():
+        if has_request_context() and "_admitido" not in g:
+            g._admitido = controller.admit(request.endpoint)
+
+    @app.teardown_request
+    def _liberar(_exc):
+        if g.pop("_admitido", False):
+            controller.release()
+
+    metrics.register_collector(controller.metric_lines)
+
+
+def detach_slot():
+    """
+    Saca el hueco del request actual del teardown y devuelve la función que lo libera
+    (una sola vez). Para respuestas en streaming que siguen con su conexión después
+    de que la vista retorna: respuesta.call_on_close(admission.detach_slot()).
+    """
+    if not g.pop("_admitido", False):
+        return lambda: None
+
+    pendiente = [True]
+
+    def liberar():
+        try:
+            pendiente.pop()
+        except IndexError:
+            return  # Ya liberado
+        controller.release()
+
+    return liberar
@@ -0,0 +1,583 @@
+import asyncio
+import contextvars
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from email.utils import format_datetime, parsedate_to_datetime
+
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+import psycopg
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+import metrics
+from admission import Overloaded, RateLimited, controller as admission
+from db import DatabaseUnavailable, breaker, pool_settings
+from videojuego import (
+    API_BATCH_MAX, CUERPO_NO_OBJETO, PAGINA_MAX, LEER_PRIMARIA_TRAS_ESCRIBIR, anotar_presencia, app as flask_app,
+    calentar, drenar, entrada_cache, invalidar_lobby, leaderboard, mascota_a_dict, mascota_cache, personaje_a_dict, personaje_cache,
+)
+
+
+# ==========================================
+# MARK: API ASÍNCRONA (ASGI)
+# ==========================================
+# uvicorn asgi:app sirve las APIs JSON que más usan los clientes del juego con
+# asyncio y un pool async de Postgres (psycopg 3): mientras una consulta viaja a
+# Supabase el proceso sigue atendiendo otros requests, en vez de tener un hilo
+# bloqueado por cada uno. Todo lo demás (HTML, login, partidas, admin...) lo
+# sigue sirviendo Flask, montado debajo y ejecutado en un pool de hilos.
+#
+# Las consultas, la sesión (la misma cookie firmada de Flask), las cachés y las
+# invalidaciones son las mismas que en videojuego.py: ambas versiones de una ruta
+# deben responder exactamente igual.
+def async_pool_settings():
+    settings = pool_settings()
+    return {
+        "min_size": int(os.getenv("ASYNC_DB_POOL_MIN", "2")),
+        "max_size": int(os.getenv("ASYNC_DB_POOL_MAX", "20")),   # Conexiones compartidas por todo el proceso
+        "timeout": settings["timeout"],
+        "max_lifetime": settings["recycle"],
+        "max_idle": settings["ping_after"] * 10,
+        "kwargs": {"sslmode": settings["sslmode"], "connect_timeout": settings["connect_timeout"]},
+    }
+
+
+_pool = None
+_en_uso = 0  # Conexiones async prestadas ahora mismo (un solo event loop: sin lock)
+# Request en curso ({"endpoint", "admitido"}): un dict y no un flag, para que las tareas
+# hijas (gather) que copian el contexto marquen el mismo request
+_peticion = contextvars.ContextVar("peticion", default=None)
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    global _pool
+
+    _pool = AsyncConnectionPool(os.getenv("DATABASE_URL"), open=False, **async_pool_settings())
+    try:
+        # Las min_size conexiones se abren antes de aceptar tráfico (como calentar())
+        await _pool.open(wait=True)
+        print("✅ Pool async de conexiones creado correctamente.")
+    except PoolTimeout as e:
+        print(f"⚠️ Pool async sin conexiones al arrancar, se reintenta en segundo plano: {e}")
+    await asyncio.to_thread(calentar)
+
+    try:
+        yield
+    finally:
+        # Apagado (SIGTERM): uvicorn ya esperó los requests en curso
+        await _pool.close()
+        await asyncio.to_thread(drenar)
+
+
+@asynccontextmanager
+async def conexion():
+    """
+    Como db_connection(): respeta el circuit breaker y le informa de cada resultado.
+    El pool async es el límite de concurrencia de este tier: sin conexión libre antes
+    de ADMISSION_DEADLINE se descarta el request (Overloaded → 503) en vez de
+    encolarlo. Si el plazo vence sin que el pool esté lleno (no hay conexiones
+    prestadas, o fallaron intentos de conectar mientras tanto) no es saturación sino
+    la base que no responde: cuenta como fallo (DatabaseUnavailable → 503).
+    """
+    global _en_uso
+
+    breaker.before_request()
+    errores = _pool.get_stats().get("connections_errors", 0)
+
+    try:
+        async with _pool.connection(timeout=admission.limiter.deadline) as conn:
+            breaker.record_success()
+            _en_uso += 1
+            peticion = _peticion.get()
+            if peticion is not None and not peticion["admitido"]:
+                # Como admit() en Flask: cuenta el request que consiguió conexión, una vez
+                peticion["admitido"] = True
+                metrics.ADMISSION_DECISIONS.inc(endpoint=peticion["endpoint"], decision="admitted")
+            try:
+                yield conn
+            except psycopg.OperationalError:
+                # La conexión se cayó a mitad de consulta → cuenta para el circuito
+                if conn.closed:
+                    breaker.record_failure()
+                raise
+            finally:
+                _en_uso -= 1
+
+    except PoolTimeout as e:
+        fallidos = _pool.get_stats().get("connections_errors", 0) > errores
+        if _en_uso == 0 or (fallidos and _en_uso < _pool.max_size):
+            print(f"⚠️ Fallo al conectar con la base (pool async): {e}")
+            breaker.record_failure()
+            raise DatabaseUnavailable(retry_after=breaker.retry_after()) from e
+        raise Overloaded(retry_after=max(1, math.ceil(admission.limiter.deadline))) from e
+
+
+# ==== SESIÓN (cookie de Flask) ====
+def leer_sesion(request):
+    valor = request.cookies.get(flask_app.config["SESSION_COOKIE_NAME"])
+    if not valor:
+        return {}
+
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        return serializer.loads(valor, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return {}
+
+
+def marcar_escritura(response, sesion):
+    # Igual que marcar_escritura() de Flask: la sesión lee de la primaria un rato
+    sesion = dict(sesion, leer_primaria_hasta=time.time() + LEER_PRIMARIA_TRAS_ESCRIBIR)
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    response.set_cookie(
+        flask_app.config["SESSION_COOKIE_NAME"], serializer.dumps(sesion),
+        path=flask_app.config["SESSION_COOKIE_PATH"] or "/",
+        domain=flask_app.config["SESSION_COOKIE_DOMAIN"] or None,
+        secure=flask_app.config["SESSION_COOKIE_SECURE"],
+        httponly=flask_app.config["SESSION_COOKIE_HTTPONLY"],
+        samesite=flask_app.config["SESSION_COOKIE_SAMESITE"],
+    )
+    return response
+
+
+def no_autorizado():
+    return JSONResponse({"error": "No autorizado"}, 403)
+
+
+# ==== RESPUESTAS ====
+async def leer_cacheado(cache, clave, cargar):
+    entrada = cache.get(clave)
+
+    if entrada is None:
+        data = await cargar(clave)
+        if data is None:
+            return None
+
+        entrada = entrada_cache(data)
+        cache.set(clave, entrada)
+
+    return entrada
+
+
+async def leer_lote(cache, ids, cargar_varios):
+    encontrados = {}
+    faltantes = []
+
+    for clave in ids:
+        entrada = cache.get(clave)
+        if entrada is None:
+            faltantes.append(clave)
+        else:
+            encontrados[clave] = entrada['data']
+
+    if faltantes:
+        for clave, data in (await cargar_varios(faltantes)).items():
+            cache.set(clave, entrada_cache(data))
+            encontrados[clave] = data
+
+    return encontrados
+
+
+def respuesta_condicional(request, entrada):
+    etag = f'"{entrada["etag"]}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(entrada['modified'], usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag in [e.strip() for e in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+
+    elif "if-modified-since" in request.headers:
+        try:
+            if entrada['modified'] <= parsedate_to_datetime(request.headers["if-modified-since"]):
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    return JSONResponse(entrada['data'], headers=headers)
+
+
+async def leer_ids(request):
+    """Como leer_ids() de Flask: ?ids=1,2,3 o {"ids": [...]}. Devuelve (ids, error)."""
+    if request.method == 'POST':
+        try:
+            cuerpo = await request.json()
+        except ValueError:
+            cuerpo = None
+        if cuerpo is None:
+            cuerpo = {}  # Como get_json(silent=True): sin cuerpo válido no hay ids
+        elif not isinstance(cuerpo, dict):
+            return None, CUERPO_NO_OBJETO
+        crudos = cuerpo.get('ids', [])
+    else:
+        crudos = [x for x in request.query_params.get('ids', '').split(',') if x.strip()]
+
+    if not isinstance(crudos, list):
+        return None, "El campo 'ids' debe ser una lista"
+
+    try:
+        ids = list(dict.fromkeys(int(x) for x in crudos))
+    except (TypeError, ValueError):
+        return None, "Todos los ids deben ser enteros"
+
+    if not ids:
+        return None, "Debes indicar al menos un id"
+
+    if len(ids) > API_BATCH_MAX:
+        return None, f"Máximo {API_BATCH_MAX} ids por petición"
+
+    return ids, None
+
+
+def respuesta_lote(clave, ids, encontrados):
+    return JSONResponse({
+        clave: [encontrados[i] for i in ids if i in encontrados],
+        "no_encontrados": [i for i in ids if i not in encontrados]
+    })
+
+
+def leer_pagina(request):
+    def entero(nombre, por_defecto):
+        try:
+            return int(request.query_params.get(nombre, por_defecto))
+        except ValueError:
+            return por_defecto
+
+    # Cursor opaco = último id visto; 0 = primera página
+    return max(entero('despues', 0), 0), min(max(entero('limite', 50), 1), PAGINA_MAX)
+
+
+def respuesta_pagina(clave, items, limite, campo_id):
+    hay_mas = len(items) > limite
+    items = items[:limite]
+    return JSONResponse({
+        clave: items,
+        "siguiente": items[-1][campo_id] if hay_mas else None
+    })
+
+
+# ==========================================
+# MARK: CARGA DESDE POSTGRES
+# ==========================================
+async def cargar_mascota(id_mascota):
+    async with conexion() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            SELECT id_mascota, nombre_mascota, tipo, nivel
+            FROM mascota
+            WHERE id_mascota = %s;
+        """, (id_mascota,))
+
+        mascota = await cur.fetchone()
+
+    return mascota_a_dict(mascota) if mascota else None
+
+
+async def cargar_personaje(id_personaje):
+    async with conexion() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            SELECT id_personaje, nombre, clase, nivel
+            FROM personaje
+            WHERE id_personaje = %s;
+        """, (id_personaje,))
+
+        personaje = await cur.fetchone()
+
+    return personaje_a_dict(personaje) if personaje else None
+
+
+async def cargar_mascotas(ids):
+    async with conexion() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            SELECT id_mascota, nombre_mascota, tipo, nivel
+            FROM mascota
+            WHERE id_mascota = ANY(%s);
+        """, (ids,))
+
+        return {row[0]: mascota_a_dict(row) for row in await cur.fetchall()}
+
+
+async def cargar_personajes(ids):
+    async with conexion() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            SELECT id_personaje, nombre, clase, nivel
+            FROM personaje
+            WHERE id_personaje = ANY(%s);
+        """, (ids,))
+
+        return {row[0]: personaje_a_dict(row) for row in await cur.fetchall()}
+
+
+# ==========================================
+# MARK: RUTAS
+# ==========================================
+_rutas = []
+
+
+def ruta(path, methods=("GET",)):
+    """Registra la ruta y su latencia en /metrics con la misma etiqueta que en Flask."""
+    etiqueta = path.replace("{", "<int:").replace("}", ">").replace(":int>", ">")
+
+    def decorar(fn):
+        async def medida(request):
+            start = time.perf_counter()
+            status = 500
+            _peticion.set({"endpoint": fn.__name__, "admitido": False})
+            ip = request.client.host if request.client else None
+            try:
+                # Mismos token buckets (por endpoint) que las rutas de Flask
+                id_jugador = leer_sesion(request).get("id_jugador")
+                admission.check(fn.__name__, request.method, ip, id_jugador)
+                # Y la misma presencia que el before_request de Flask
+                if id_jugador is not None:
+                    anotar_presencia(id_jugador, ip)
+                response = await fn(request)
+                status = response.status_code
+                return response
+            except RateLimited as e:
+                status = 429
+                return JSONResponse({"error": "Demasiadas peticiones, reintenta en unos segundos."}, 429,
+                                    {"Retry-After": str(e.retry_after)})
+            except Overloaded as e:
+                status = 503
+                metrics.ADMISSION_DECISIONS.inc(endpoint=fn.__name__, decision="shed")
+                return JSONResponse({"error": "Servidor saturado, reintenta en unos segundos."}, 503,
+                                    {"Retry-After": str(e.retry_after)})
+            except DatabaseUnavailable as e:
+                status = 503
+                return JSONResponse({"error": "Base de datos no disponible, reintenta en unos segundos."}, 503,
+                                    {"Retry-After": str(e.retry_after)})
+            finally:
+                metrics.REQUEST_LATENCY.observe(time.perf_counter() - start, route=etiqueta,
+                                                method=request.method, status=str(status))
+
+        _rutas.append(Route(path, medida, methods=list(methods)))
+        return fn
+
+    return decorar
+
+
+# ==== APIs DE LECTURA ====
+@ruta('/api/mascota/{id_mascota:int}')
+async def obtener_mascota(request):
+    entrada = await leer_cacheado(mascota_cache, request.path_params['id_mascota'], cargar_mascota)
+
+    if entrada:
+        return respuesta_condicional(request, entrada)
+    return JSONResponse({"error": "Mascota no encontrada"}, 404)
+
+
+@ruta('/api/personaje/{id_personaje:int}')
+async def obtener_personaje(request):
+    entrada = await leer_cacheado(personaje_cache, request.path_params['id_personaje'], cargar_personaje)
+
+    if entrada:
+        return respuesta_condicional(request, entrada)
+    return JSONResponse({"error": "Personaje no encontrado"}, 404)
+
+
+@ruta('/api/personajes', methods=('GET', 'POST'))
+async def obtener_personajes(request):
+    ids, error = await leer_ids(request)
+    if error:
+        return JSONResponse({"error": error}, 400)
+
+    return respuesta_lote("personajes", ids, await leer_lote(personaje_cache, ids, cargar_personajes))
+
+
+@ruta('/api/mascotas', methods=('GET', 'POST'))
+async def obtener_mascotas(request):
+    ids, error = await leer_ids(request)
+    if error:
+        return JSONResponse({"error": error}, 400)
+
+    return respuesta_lote("mascotas", ids, await leer_lote(mascota_cache, ids, cargar_mascotas))
+
+
+@ruta('/api/personajes/mascotas', methods=('GET', 'POST'))
+async def obtener_personajes_con_mascotas(request):
+    ids, error = await leer_ids(request)
+    if error:
+        return JSONResponse({"error": error}, 400)
+
+    async with conexion() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            SELECT p.id_personaje, p.nombre, p.clase, p.nivel,
+                   COALESCE(
+                       json_agg(json_build_object(
+                           'id_mascota', m.id_mascota,
+                           'nombre', m.nombre_mascota,
+                           'tipo', m.tipo,
+                           'nivel', m.nivel
+                       ) ORDER BY m.id_mascota) FILTER (WHERE m.id_mascota IS NOT NULL),
+                       '[]'
+                   )
+            FROM personaje p
+            LEFT JOIN mascota m ON m.id_personaje = p.id_personaje
+            WHERE p.id_personaje = ANY(%s)
+            GROUP BY p.id_personaje;
+        """, (ids,))
+
+        encontrados = {}
+        for row in await cur.fetchall():
+            personaje = personaje_a_dict(row)
+            personaje["mascotas"] = row[4]
+            encontrados[row[0]] = personaje
+
+    return respuesta_lote("personajes", ids, encontrados)
+
+
+@ruta('/api/jugador/personajes')
+async def pagina_personajes(request):
+    sesion = leer_sesion(request)
+    if 'id_jugador' not in sesion:
+        return no_autorizado()
+
+    despues, limite = leer_pagina(request)
+
+    async with conexion() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            SELECT id_personaje, nombre, clase, nivel
+            FROM personaje
+            WHERE id_jugador = %s AND id_personaje > %s
+            ORDER BY id_personaje
+            LIMIT %s;
+        """, (sesion['id_jugador'], despues, limite + 1))
+
+        filas = await cur.fetchall()
+
+    return respuesta_pagina("personajes", [personaje_a_dict(f) for f in filas], limite, "id_personaje")
+
+
+@ruta('/api/jugador/mascotas')
+async def pagina_mascotas(request):
+    sesion = leer_sesion(request)
+    if 'id_jugador' not in sesion:
+        return no_autorizado()
+
+    despues, limite = leer_pagina(request)
+
+    async with conexion() as conn, conn.cursor() as cur:
+        await cur.execute("""
+            SELECT m.id_mascota, m.nombre_mascota, m.tipo, m.nivel
+            FROM mascota m
+            JOIN personaje p ON m.id_personaje = p.id_personaje
+            WHERE p.id_jugador = %s AND m.id_mascota > %s
+            ORDER BY m.id_mascota
+            LIMIT %s;
+        """, (sesion['id_jugador'], despues, limite + 1))
+
+        filas = await cur.fetchall()
+
+    return respuesta_pagina("mascotas", [mascota_a_dict(f) for f in filas], limite, "id_mascota")
+
+
+# ==== SELECCIONAR Y ELIMINAR ====
+async def escribir(request, consulta, params_de):
+    """UPDATE/DELETE de la sesión en una transacción. Devuelve (sesion, respuesta_de_error)."""
+    sesion = leer_sesion(request)
+    if 'id_jugador' not in sesion:
+        return sesion, no_autorizado()
+
+    async with conexion() as conn:
+        try:
+            async with conn.cursor() as cur:
+                await cur.execute(consulta, params_de(sesion['id_jugador']))
+            await conn.commit()
+        except Exception as e:
+            await conn.rollback()
+            return sesion, JSONResponse({"error": str(e)}, 400)
+
+    invalidar_lobby(sesion['id_jugador'])
+    return sesion, None
+
+
+@ruta('/eliminar_personaje/{id_personaje:int}', methods=('DELETE',))
+async def eliminar_personaje(request):
+    id_personaje = request.path_params['id_personaje']
+    sesion, error = await escribir(request, """
+        DELETE FROM personaje
+        WHERE id_personaje = %s AND id_jugador = %s;
+    """, lambda id_jugador: (id_personaje, id_jugador))
+    if error:
+        return error
+
+    personaje_cache.pop(id_personaje)
+    # El tablero puede estar refrescándose (con su lock tomado): fuera del event loop
+    await asyncio.to_thread(leaderboard.remove_personaje, id_personaje)
+    mascota_cache.clear()
+    return marcar_escritura(JSONResponse({"success": True}), sesion)
+
+
+@ruta('/seleccionar_personaje/{id_personaje:int}', methods=('POST',))
+async def seleccionar_personaje(request):
+    sesion, error = await escribir(request, """
+        UPDATE jugador
+        SET id_personaje_activo = %s
+        WHERE id_jugador = %s;
+    """, lambda id_jugador: (request.path_params['id_personaje'], id_jugador))
+
+    return error or marcar_escritura(JSONResponse({"success": True}), sesion)
+
+
+@ruta('/eliminar_mascota/{id_mascota:int}', methods=('DELETE',))
+async def eliminar_mascota(request):
+    id_mascota = request.path_params['id_mascota']
+    sesion, error = await escribir(request, """
+        DELETE FROM mascota
+        WHERE id_mascota = %s
+        AND id_personaje IN (SELECT id_personaje FROM personaje WHERE id_jugador = %s);
+    """, lambda id_jugador: (id_mascota, id_jugador))
+    if error:
+        return error
+
+    mascota_cache.pop(id_mascota)
+    return marcar_escritura(JSONResponse({"success": True}), sesion)
+
+
+@ruta('/seleccionar_mascota/{id_mascota:int}', methods=('POST',))
+async def seleccionar_mascota(request):
+    sesion, error = await escribir(request, """
+        UPDATE jugador
+        SET id_mascota_activa = %s
+        WHERE id_jugador = %s;
+    """, lambda id_jugador: (request.path_params['id_mascota'], id_jugador))
+
+    return error or marcar_escritura(JSONResponse({"success": True}), sesion)
+
+
+# ==========================================
+# MARK: MÉTRICAS DEL POOL ASYNC
+# ==========================================
+def metricas_pool_async():
+    stats = _pool.get_stats() if _pool is not None else {}
+    return (
+        metrics.gauge_lines("db_async_pool_size", "Conexiones abiertas del pool async",
+                            [({}, stats.get("pool_size", 0))])
+        + metrics.gauge_lines("db_async_pool_available", "Conexiones libres del pool async",
+                              [({}, stats.get("pool_available", 0))])
+        + metrics.gauge_lines("db_async_requests_waiting", "Requests esperando una conexión async",
+                              [({}, stats.get("requests_waiting", 0))])
+    )
+
+
+metrics.register_collector(metricas_pool_async)
+
+
+# ==========================================
+# MARK: APLICACIÓN ASGI
+# ==========================================
+# Primero las rutas async; lo que no coincida cae en Flask (HTML, login, resto de APIs)
+app = Starlette(
+    routes=_rutas + [Mount("/", app=WSGIMiddleware(flask_app, workers=int(os.getenv("ASGI_WSGI_THREADS", "8"))))],
+    lifespan=lifespan,
+)
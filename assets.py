@@ -0,0 +1,181 @@
+import gzip
+import hashlib
+import importlib.util
+import json
+import mimetypes
+import os
+import shutil
+from io import BytesIO
+
+from flask import request, send_from_directory
+
+
+# ==========================================
+# MARK: VARIANTES A GENERAR
+# ==========================================
+# Paso de build (flask --app videojuego build-assets): genera en static/dist/ copias
+# con el hash del contenido en el nombre, variantes redimensionadas/WebP y copias
+# gzip/brotli de CSS y JS. manifest.json traduce el nombre lógico al archivo final.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST = os.path.join(DIST_DIR, "manifest.json")
+
+# Archivos que se copian tal cual (solo con hash)
+COPY = ["img/fondolobby.jpg", "img/personaje01.png", "img/mascota01.png", "img/icons/iconoSF.png"]
+
+# Variante lógica -> (origen, ancho en px, formato de Pillow)
+RESIZE = {
+    "img/icons/favicon-32.png": ("img/icons/iconoSF.png", 32, "PNG"),
+    "img/icons/favicon-180.png": ("img/icons/iconoSF.png", 180, "PNG"),
+    "img/icons/icono-256.png": ("img/icons/icono.png", 256, "PNG"),
+    "img/personaje01-400.png": ("img/personaje01.png", 400, "PNG"),
+    "img/personaje01-400.webp": ("img/personaje01.png", 400, "WEBP"),
+    "img/mascota01-400.png": ("img/mascota01.png", 400, "PNG"),
+    "img/mascota01-400.webp": ("img/mascota01.png", 400, "WEBP"),
+}
+
+# Texto: además de la copia con hash se guardan .gz y .br precomprimidos
+COMPRESS = ["css/estilo.css", "js/scripts.js"]
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def _hashed_name(logical, data):
+    base, ext = os.path.splitext(logical)
+    return f"{base}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def _write(relative, data):
+    path = os.path.join(DIST_DIR, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _read(logical):
+    with open(os.path.join(STATIC_DIR, logical), "rb") as f:
+        return f.read()
+
+
+def _resize(source, width, fmt):
+    from PIL import Image
+
+    with Image.open(os.path.join(STATIC_DIR, source)) as img:
+        if img.width > width:
+            img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+        out = BytesIO()
+        if fmt == "WEBP":
+            img.save(out, fmt, quality=82, method=6)
+        else:
+            img.save(out, fmt, optimize=True)
+        return out.getvalue()
+
+
+def _compressors():
+    compressors = {".gz": lambda data: gzip.compress(data, 9, mtime=0)}
+    try:
+        import brotli
+        compressors[".br"] = lambda data: brotli.compress(data, quality=11)
+    except ImportError:
+        print("⚠️ Módulo brotli no instalado: solo se generan copias .gz")
+    return compressors
+
+
+def build():
+    """Regenera static/dist/ y el manifiesto. Devuelve {nombre lógico: archivo en dist/}."""
+    if importlib.util.find_spec("PIL") is None:
+        raise SystemExit("❌ Falta Pillow para redimensionar imágenes: pip install Pillow")
+
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+    manifest = {}
+
+    for logical in COPY:
+        data = _read(logical)
+        manifest[logical] = _hashed_name(logical, data)
+        _write(manifest[logical], data)
+
+    for logical, (source, width, fmt) in RESIZE.items():
+        data = _resize(source, width, fmt)
+        manifest[logical] = _hashed_name(logical, data)
+        _write(manifest[logical], data)
+
+    compressors = _compressors()
+    for logical in COMPRESS:
+        data = _read(logical)
+        manifest[logical] = _hashed_name(logical, data)
+        _write(manifest[logical], data)
+        for suffix, compress in compressors.items():
+            _write(manifest[logical] + suffix, compress(data))
+
+    manifest = {k: "dist/" + v.replace(os.sep, "/") for k, v in manifest.items()}
+    _write("manifest.json", json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+# ==========================================
+# MARK: URLS CON HUELLA Y CACHÉ INMUTABLE
+# ==========================================
+def load_manifest():
+    try:
+        with open(MANIFEST, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def init_app(app):
+    """
+    url_for('static', filename=...) devuelve el archivo con hash si hay manifiesto
+    (sin build, el original; las variantes redimensionadas caen a su origen).
+    Los archivos de dist/ se sirven con Cache-Control immutable y, si el navegador
+    lo acepta, en su versión .br/.gz precomprimida.
+    """
+    manifest = load_manifest()
+    hashed = set(manifest.values())
+    if not manifest:
+        print("ℹ️ Sin static/dist/manifest.json: se sirven los archivos originales.")
+
+    @app.url_defaults
+    def _static_con_huella(endpoint, values):
+        if endpoint != "static" or "filename" not in values:
+            return
+        filename = values["filename"]
+        if filename in manifest:
+            values["filename"] = manifest[filename]
+        elif filename in RESIZE:
+            values["filename"] = RESIZE[filename][0]
+
+    default_static = app.view_functions["static"]
+
+    def static(filename):
+        if filename not in hashed:
+            return default_static(filename=filename)
+
+        encoding = _negotiate(filename)
+        resp = send_from_directory(STATIC_DIR, filename + (encoding or ""), max_age=IMMUTABLE_MAX_AGE)
+
+        if encoding:
+            # Se envía el .br/.gz pero el tipo es el del original
+            resp.headers["Content-Encoding"] = "br" if encoding == ".br" else "gzip"
+            resp.content_type = _mimetype(filename)
+        if filename.endswith(tuple(os.path.splitext(c)[1] for c in COMPRESS)):
+            resp.vary.add("Accept-Encoding")
+
+        resp.cache_control.public = True
+        resp.cache_control.immutable = True
+        return resp
+
+    app.view_functions["static"] = static
+
+
+def _negotiate(filename):
+    accepted = request.accept_encodings
+    for suffix, name in ((".br", "br"), (".gz", "gzip")):
+        if accepted[name] and os.path.exists(os.path.join(STATIC_DIR, filename + suffix)):
+            return suffix
+    return None
+
+
+def _mimetype(filename):
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    return f"{mimetype}; charset=utf-8" if mimetype.startswith("text/") else mimetype
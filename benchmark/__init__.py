@@ -0,0 +1,7 @@
+"""
+Benchmark de videojuego.app contra un Postgres local.
+
+    python -m benchmark seed --jugadores 1000
+    python -m benchmark run --usuarios 8 --duracion 30
+    python -m benchmark compare antes.json despues.json
+"""
@@ -0,0 +1,128 @@
+import argparse
+import sys
+
+from benchmark import report
+
+
+# ==========================================
+# MARK: CLI DEL BENCHMARK
+# ==========================================
+def cmd_seed(args):
+    from benchmark.seed import check_target, seed
+
+    check_target(args.force)
+    rangos = seed(args.jugadores, args.personajes, args.mascotas, args.objetos, args.inventario, args.semilla)
+
+    print("✅ Datos sembrados:")
+    for tabla, (desde, hasta) in rangos.items():
+        print(f"   {tabla}: ids {desde}–{hasta}")
+
+
+def cmd_run(args):
+    from benchmark.seed import seeded_range
+    from admission import controller
+    from benchmark.traffic import ACTIONS, run
+    from videojuego import app
+
+    # Todo el tráfico sale de 127.0.0.1: con los límites por IP se mediría el limitador
+    controller.enabled = args.admision
+
+    rangos = seeded_range()
+    if rangos is None:
+        raise SystemExit("❌ No hay jugadores sembrados: ejecuta primero `python -m benchmark seed`.")
+    player_range, object_range = rangos
+
+    print(f"▶️ {args.usuarios} usuarios durante {args.duracion}s contra jugadores {player_range[0]}–{player_range[1]}...")
+    recorder, elapsed = run(app, player_range, object_range, args.usuarios, args.duracion, args.semilla)
+
+    summary = report.summarize(recorder.samples, elapsed)
+    report.print_summary(summary)
+
+    results = dict(summary, meta=report.build_meta({
+        "usuarios": args.usuarios,
+        "duracion": args.duracion,
+        "semilla": args.semilla,
+        "admision": args.admision,
+        "acciones": ACTIONS,
+    }))
+    print(f"💾 Resultados guardados en {report.save_results(results, args.salida)}")
+
+
+def cmd_load(args):
+    from benchmark.load import HTTP_ACTIONS, run
+    from benchmark.seed import seeded_range
+
+    rangos = seeded_range()
+    if rangos is None:
+        raise SystemExit("❌ No hay jugadores sembrados: ejecuta primero `python -m benchmark seed`.")
+
+    print(f"▶️ {args.concurrencia} clientes durante {args.duracion}s contra {args.url}...")
+    samples, elapsed = run(args.url, rangos[0], args.concurrencia, args.sesiones, args.duracion, args.semilla)
+
+    summary = report.summarize(samples, elapsed)
+    report.print_summary(summary)
+
+    results = dict(summary, meta=report.build_meta({
+        "url": args.url,
+        "concurrencia": args.concurrencia,
+        "sesiones": args.sesiones,
+        "duracion": args.duracion,
+        "semilla": args.semilla,
+        "acciones": HTTP_ACTIONS,
+    }))
+    print(f"💾 Resultados guardados en {report.save_results(results, args.salida)}")
+
+
+def cmd_compare(args):
+    regresiones = report.compare(args.antes, args.despues, args.umbral)
+
+    if regresiones:
+        print(f"❌ p95 empeoró más de {args.umbral}% en: {', '.join(regresiones)}")
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description="Benchmark de videojuego.app")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("seed", help="Siembra datos sintéticos con COPY")
+    p.add_argument("--jugadores", type=int, default=1000)
+    p.add_argument("--personajes", type=int, default=3, help="Personajes por jugador")
+    p.add_argument("--mascotas", type=int, default=2, help="Mascotas por personaje")
+    p.add_argument("--objetos", type=int, default=300, help="Tamaño del catálogo de objetos")
+    p.add_argument("--inventario", type=int, default=8, help="Objetos distintos por personaje")
+    p.add_argument("--semilla", type=int, default=42)
+    p.add_argument("--force", action="store_true", help="Permite sembrar en una base que no es local")
+    p.set_defaults(func=cmd_seed)
+
+    p = sub.add_parser("run", help="Reproduce tráfico y mide latencias")
+    p.add_argument("--usuarios", type=int, default=8, help="Usuarios concurrentes (hilos)")
+    p.add_argument("--duracion", type=float, default=30.0, help="Segundos de tráfico")
+    p.add_argument("--semilla", type=int, default=7)
+    p.add_argument("--admision", action="store_true", help="Mantiene el control de admisión activo")
+    p.add_argument("--salida", help="Ruta del JSON (por defecto benchmark/results/<commit>.json)")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("load", help="Carga HTTP concurrente contra un servidor en marcha",
+                       description="Arranca el servidor con ADMISSION_ENABLED=0 (o límites altos en "
+                                   "ADMISSION_RULES): todos los clientes salen de la misma IP.")
+    p.add_argument("--url", default="http://127.0.0.1:8000")
+    p.add_argument("--concurrencia", type=int, default=500, help="Clientes simultáneos (corrutinas)")
+    p.add_argument("--sesiones", type=int, default=50, help="Jugadores logueados entre los que se reparten")
+    p.add_argument("--duracion", type=float, default=30.0, help="Segundos de tráfico")
+    p.add_argument("--semilla", type=int, default=7)
+    p.add_argument("--salida", help="Ruta del JSON (por defecto benchmark/results/<commit>.json)")
+    p.set_defaults(func=cmd_load)
+
+    p = sub.add_parser("compare", help="Compara dos resultados JSON")
+    p.add_argument("antes")
+    p.add_argument("despues")
+    p.add_argument("--umbral", type=float, default=10.0, help="% de empeoramiento de p95 tolerado")
+    p.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import asyncio
+import random
+import time
+
+import httpx
+
+from benchmark.seed import BENCH_EMAIL, BENCH_PASSWORD
+
+
+# ==========================================
+# MARK: CARGA HTTP CONCURRENTE
+# ==========================================
+# A diferencia de `run` (test client en el mismo proceso, un hilo por usuario), aquí
+# se ataca un servidor real por HTTP con miles de clientes concurrentes en un solo
+# event loop: sirve para comparar gunicorn (videojuego:app) con uvicorn (asgi:app).
+# Solo las rutas que existen en las dos versiones, con la misma mezcla.
+HTTP_ACTIONS = {
+    "api_personaje": 40,
+    "api_mascota": 25,
+    "api_lote": 15,
+    "pagina_personajes": 10,
+    "seleccionar_personaje": 6,
+    "seleccionar_mascota": 4,
+}
+
+LOGINS_SIMULTANEOS = 4  # bcrypt: no se satura la cola de hashing del servidor
+LOGIN_INTENTOS = 5
+
+
+class Session:
+    """Un jugador sembrado con su cookie de sesión y sus ids, compartido por varios clientes."""
+
+    def __init__(self, client, id_jugador):
+        self.client = client
+        self.id_jugador = id_jugador
+        self.ids_personajes = []
+        self.ids_mascotas = []
+
+    async def login(self):
+        for _ in range(LOGIN_INTENTOS):
+            resp = await self.client.post("/login", data={
+                "correo": BENCH_EMAIL.format(self.id_jugador),
+                "contrasena": BENCH_PASSWORD,
+            })
+            # 429/503 (admisión o bcrypt saturado): se espera lo que pide el servidor
+            if resp.status_code not in (429, 503):
+                break
+            await asyncio.sleep(float(resp.headers.get("Retry-After", 1)))
+
+        if resp.status_code >= 400:
+            raise SystemExit(f"❌ Login fallido para el jugador {self.id_jugador}: {resp.status_code}")
+
+        resp = await self.client.get("/api/jugador/personajes?limite=100")
+        self.ids_personajes = [p["id_personaje"] for p in resp.json().get("personajes", [])]
+        resp = await self.client.get("/api/jugador/mascotas?limite=100")
+        self.ids_mascotas = [m["id_mascota"] for m in resp.json().get("mascotas", [])]
+
+
+async def _request(samples, route, session, method, url):
+    start = time.perf_counter()
+    try:
+        resp = await session.client.request(method, url)
+        status = resp.status_code
+    except httpx.HTTPError:
+        status = 599  # Conexión rechazada o timeout: cuenta como error
+
+    samples.setdefault(route, []).append({
+        "latency": time.perf_counter() - start,
+        "status": status,
+        # Desde fuera no se ven consultas ni espera del pool
+        "queries": 0,
+        "pool_wait": 0.0,
+        "db_time": 0.0,
+    })
+
+
+async def _step(samples, session, rng):
+    action = rng.choices(list(HTTP_ACTIONS), weights=list(HTTP_ACTIONS.values()))[0]
+    personaje = rng.choice(session.ids_personajes) if session.ids_personajes else 0
+    mascota = rng.choice(session.ids_mascotas) if session.ids_mascotas else 0
+
+    if action == "api_personaje":
+        await _request(samples, action, session, "GET", f"/api/personaje/{personaje}")
+    elif action == "api_mascota":
+        await _request(samples, action, session, "GET", f"/api/mascota/{mascota}")
+    elif action == "api_lote":
+        ids = ",".join(str(rng.choice(session.ids_personajes or [0])) for _ in range(10))
+        await _request(samples, action, session, "GET", f"/api/personajes/mascotas?ids={ids}")
+    elif action == "pagina_personajes":
+        await _request(samples, action, session, "GET", "/api/jugador/personajes?limite=50")
+    elif action == "seleccionar_personaje":
+        await _request(samples, action, session, "POST", f"/seleccionar_personaje/{personaje}")
+    else:
+        await _request(samples, action, session, "POST", f"/seleccionar_mascota/{mascota}")
+
+
+async def _run(url, player_range, concurrencia, sesiones, duracion, semilla, timeout):
+    rng = random.Random(semilla)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    clients = [httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout)
+               for _ in range(min(sesiones, concurrencia))]
+
+    try:
+        players = [Session(c, rng.randint(*player_range)) for c in clients]
+        semaforo = asyncio.Semaphore(LOGINS_SIMULTANEOS)
+
+        async def login(session):
+            async with semaforo:
+                await session.login()
+
+        print(f"🔑 Iniciando {len(players)} sesiones...")
+        await asyncio.gather(*(login(p) for p in players))
+
+        samples = {}
+        deadline = time.monotonic() + duracion
+
+        async def cliente(n):
+            session = players[n % len(players)]
+            crng = random.Random(semilla + n)
+            while time.monotonic() < deadline:
+                await _step(samples, session, crng)
+
+        start = time.monotonic()
+        await asyncio.gather(*(cliente(n) for n in range(concurrencia)))
+        return samples, time.monotonic() - start
+
+    finally:
+        await asyncio.gather(*(c.aclose() for c in clients))
+
+
+def run(url, player_range, concurrencia=500, sesiones=50, duracion=30.0, semilla=7, timeout=30.0):
+    """
+    `concurrencia` clientes repiten acciones de HTTP_ACTIONS durante `duracion` segundos
+    contra `url`, repartidos entre `sesiones` jugadores logueados.
+    Devuelve (samples, segundos_reales) con el formato de report.summarize().
+    """
+    return asyncio.run(_run(url, player_range, concurrencia, sesiones, duracion, semilla, timeout))
@@ -0,0 +1,139 @@
+import json
+import os
+import subprocess
+from datetime import datetime, timezone
+
+
+# ==========================================
+# MARK: ESTADÍSTICAS
+# ==========================================
+def percentile(sorted_values, pct):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    """
+    samples: {ruta: [muestra, ...]} con muestra = dict(latency, status, queries, pool_wait, db_time).
+    Devuelve métricas por ruta y totales (tiempos en milisegundos).
+    """
+    routes = {}
+
+    for route, items in sorted(samples.items()):
+        latencies = sorted(s["latency"] for s in items)
+        waits = sorted(s["pool_wait"] for s in items)
+        count = len(items)
+
+        routes[route] = {
+            "requests": count,
+            # 4xx también: un 429/403 es un request que no hizo su trabajo
+            "errors": sum(1 for s in items if s["status"] >= 400),
+            "throughput_rps": round(count / elapsed, 2) if elapsed else 0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "pool_wait_avg_ms": round(sum(waits) / count * 1000, 3),
+            "pool_wait_p95_ms": round(percentile(waits, 95) * 1000, 3),
+            "queries_per_request": round(sum(s["queries"] for s in items) / count, 2),
+            "db_time_avg_ms": round(sum(s["db_time"] for s in items) / count * 1000, 3),
+        }
+
+    every = sorted(s["latency"] for items in samples.values() for s in items)
+    total = len(every)
+
+    return {
+        "routes": routes,
+        "total": {
+            "requests": total,
+            "errors": sum(r["errors"] for r in routes.values()),
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0,
+            "p50_ms": round(percentile(every, 50) * 1000, 2),
+            "p95_ms": round(percentile(every, 95) * 1000, 2),
+            "p99_ms": round(percentile(every, 99) * 1000, 2),
+        },
+    }
+
+
+# ==========================================
+# MARK: RESULTADOS EN JSON
+# ==========================================
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocido"
+
+
+def save_results(results, path=None):
+    """Guarda el resultado en benchmark/results/<commit>.json (o en path)."""
+    if path is None:
+        folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{results['meta']['commit']}.json")
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+
+    return path
+
+
+def build_meta(config):
+    return {
+        "commit": git_commit(),
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": config,
+    }
+
+
+def print_summary(summary):
+    header = f"{'ruta':<28}{'req':>7}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'espera':>9}{'q/req':>7}{'err':>5}"
+    print(header)
+    print("-" * len(header))
+
+    for route, r in summary["routes"].items():
+        print(f"{route:<28}{r['requests']:>7}{r['throughput_rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+              f"{r['p99_ms']:>9}{r['pool_wait_avg_ms']:>9}{r['queries_per_request']:>7}{r['errors']:>5}")
+
+    t = summary["total"]
+    print("-" * len(header))
+    print(f"{'TOTAL':<28}{t['requests']:>7}{t['throughput_rps']:>9}{t['p50_ms']:>9}{t['p95_ms']:>9}"
+          f"{t['p99_ms']:>9}{'':>9}{'':>7}{t['errors']:>5}")
+    print("(tiempos en ms; espera = espera media por una conexión del pool)")
+
+
+def compare(before_path, after_path, threshold=10.0):
+    """
+    Compara p95 y throughput por ruta entre dos resultados.
+    Devuelve la lista de rutas cuya p95 empeoró más de threshold %.
+    """
+    with open(before_path, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(after_path, encoding="utf-8") as f:
+        after = json.load(f)
+
+    print(f"{before['meta']['commit']} → {after['meta']['commit']}")
+    print(f"{'ruta':<28}{'p95 antes':>11}{'p95 ahora':>11}{'Δ%':>8}{'rps antes':>11}{'rps ahora':>11}")
+
+    regressions = []
+
+    for route in sorted(set(before["routes"]) | set(after["routes"])):
+        a = before["routes"].get(route)
+        b = after["routes"].get(route)
+
+        if not a or not b:
+            print(f"{route:<28}{'(solo en uno de los dos)':>52}")
+            continue
+
+        delta = (b["p95_ms"] - a["p95_ms"]) / a["p95_ms"] * 100 if a["p95_ms"] else 0.0
+        flag = " ⚠️" if delta > threshold else ""
+        print(f"{route:<28}{a['p95_ms']:>11}{b['p95_ms']:>11}{delta:>7.1f}%{a['throughput_rps']:>11}"
+              f"{b['throughput_rps']:>11}{flag}")
+
+        if delta > threshold:
+            regressions.append(route)
+
+    return regressions
@@ -0,0 +1,200 @@
+import csv
+import io
+import os
+import random
+
+from psycopg2 import extensions, sql
+
+from db import db_connection
+from passwords import hasher
+
+
+# ==========================================
+# MARK: DATOS SINTÉTICOS
+# ==========================================
+# Todos los jugadores sembrados comparten contraseña (y hash): así el seed no
+# paga N bcrypt, y el benchmark puede iniciar sesión con cualquiera.
+BENCH_PASSWORD = "benchmark"
+BENCH_EMAIL = "bench{}@example.com"
+
+CLASES = ["Guerrero", "Mago", "Arquero", "Paladín", "Pícaro", "Clérigo"]
+TIPOS_MASCOTA = ["Lobo", "Dragón", "Fénix", "Gato", "Búho", "Gólem"]
+RAREZAS = ["común", "rara", "épica", "legendaria"]
+EFECTOS = ["Cura 50 PV", "Restaura 30 PM", "Fuerza +5", "Invisibilidad", "Resistencia al fuego"]
+
+# Filas por cada COPY: acota la memoria aunque se siembren millones
+CHUNK_ROWS = 50_000
+
+
+def check_target(force=False):
+    """Solo se siembra en un Postgres local salvo que se pida explícitamente."""
+    dsn = extensions.parse_dsn(os.getenv("DATABASE_URL") or "")
+    host = dsn.get("host", "")
+
+    # Sin host o con la ruta de un socket Unix (host=/tmp/pgdata) también es local;
+    # con varios hosts ("a,b") tienen que serlo todos
+    local = all(h in ("", "localhost", "127.0.0.1", "::1") or h.startswith("/") for h in host.split(","))
+
+    if not local and not force:
+        raise SystemExit(f"❌ DATABASE_URL apunta a '{host}'. El benchmark solo siembra en local (usa --force).")
+
+
+def copy_rows(cur, table, columns, rows):
+    """COPY ... FROM STDIN en bloques de CHUNK_ROWS filas desde un iterable."""
+    statement = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+        sql.Identifier(table),
+        sql.SQL(", ").join(map(sql.Identifier, columns))
+    ).as_string(cur)
+
+    total = 0
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    for row in rows:
+        writer.writerow(row)
+        total += 1
+
+        if total % CHUNK_ROWS == 0:
+            buf.seek(0)
+            cur.copy_expert(statement, buf)
+            buf.seek(0)
+            buf.truncate()
+
+    if buf.tell():
+        buf.seek(0)
+        cur.copy_expert(statement, buf)
+
+    return total
+
+
+def next_id(cur, table, column):
+    cur.execute(sql.SQL("SELECT COALESCE(MAX({}), 0) + 1 FROM {};").format(
+        sql.Identifier(column), sql.Identifier(table)))
+    return cur.fetchone()[0]
+
+
+def sync_sequence(cur, table, column):
+    # Tras un COPY con ids explícitos, el SERIAL debe continuar después del máximo
+    cur.execute(sql.SQL("""
+        SELECT setval(pg_get_serial_sequence(%s, %s), (SELECT MAX({}) FROM {}));
+    """).format(sql.Identifier(column), sql.Identifier(table)), (table, column))
+
+
+# ==========================================
+# MARK: SIEMBRA CON COPY
+# ==========================================
+def seed(jugadores=1000, personajes=3, mascotas=2, objetos=300, inventario=8, semilla=42):
+    """
+    Inserta jugadores con sus personajes, mascotas e inventario usando COPY.
+    Los ids se asignan a partir del máximo actual para no chocar con datos previos.
+    Devuelve un resumen con los rangos de ids sembrados.
+    """
+    rng = random.Random(semilla)
+    password_hash = hasher.hash(BENCH_PASSWORD)
+
+    with db_connection() as conn, conn.cursor() as cur:
+        j0 = next_id(cur, "jugador", "id_jugador")
+        p0 = next_id(cur, "personaje", "id_personaje")
+        m0 = next_id(cur, "mascota", "id_mascota")
+        o0 = next_id(cur, "objeto", "id_objeto")
+
+        # ==== JUGADORES (sin personaje/mascota activos: aún no existen) ====
+        copy_rows(cur, "jugador",
+                  ["id_jugador", "nombre_usuario", "correo_electronico", "contrasena_hash", "experiencia", "nivel"],
+                  ((j0 + i, f"bench{j0 + i}", BENCH_EMAIL.format(j0 + i), password_hash,
+                    rng.randint(0, 5000), rng.randint(1, 50))
+                   for i in range(jugadores)))
+
+        # ==== PERSONAJES: los del jugador i son contiguos ====
+        copy_rows(cur, "personaje",
+                  ["id_personaje", "id_jugador", "nombre", "clase", "nivel"],
+                  ((p0 + i * personajes + k, j0 + i, f"Heroe{p0 + i * personajes + k}",
+                    rng.choice(CLASES), rng.randint(1, 60))
+                   for i in range(jugadores) for k in range(personajes)))
+
+        total_personajes = jugadores * personajes
+
+        # ==== MASCOTAS ====
+        copy_rows(cur, "mascota",
+                  ["id_mascota", "id_personaje", "nombre_mascota", "tipo", "nivel"],
+                  ((m0 + c * mascotas + k, p0 + c, f"Mascota{m0 + c * mascotas + k}",
+                    rng.choice(TIPOS_MASCOTA), rng.randint(1, 30))
+                   for c in range(total_personajes) for k in range(mascotas)))
+
+        # ==== CATÁLOGO DE OBJETOS Y SUBTIPOS (1/3 armas, 1/3 armaduras, 1/3 pociones) ====
+        copy_rows(cur, "objeto",
+                  ["id_objeto", "nombre", "descripcion", "valor", "rareza"],
+                  ((o0 + i, f"Objeto{o0 + i}", "Generado por el benchmark",
+                    rng.randint(1, 1000), rng.choice(RAREZAS))
+                   for i in range(objetos)))
+        copy_rows(cur, "arma", ["id_objeto", "dano_base"],
+                  ((o0 + i, rng.randint(5, 120)) for i in range(0, objetos, 3)))
+        copy_rows(cur, "armadura", ["id_objeto", "valor_defensa"],
+                  ((o0 + i, rng.randint(5, 90)) for i in range(1, objetos, 3)))
+        copy_rows(cur, "pocion", ["id_objeto", "efecto"],
+                  ((o0 + i, rng.choice(EFECTOS)) for i in range(2, objetos, 3)))
+
+        # ==== INVENTARIO: objetos distintos por personaje ====
+        if objetos:
+            copy_rows(cur, "inventario",
+                      ["id_personaje", "id_objeto", "cantidad"],
+                      ((p0 + c, o0 + o, rng.randint(1, 20))
+                       for c in range(total_personajes)
+                       for o in rng.sample(range(objetos), min(inventario, objetos))))
+
+        # ==== ACTIVOS: primer personaje y primera mascota, en una sola sentencia ====
+        if personajes:
+            cur.execute("""
+                UPDATE jugador j
+                SET id_personaje_activo = p.id_personaje,
+                    id_mascota_activa = (
+                        SELECT MIN(m.id_mascota) FROM mascota m WHERE m.id_personaje = p.id_personaje
+                    )
+                FROM (
+                    SELECT id_jugador, MIN(id_personaje) AS id_personaje
+                    FROM personaje
+                    WHERE id_jugador BETWEEN %s AND %s
+                    GROUP BY id_jugador
+                ) p
+                WHERE j.id_jugador = p.id_jugador;
+            """, (j0, j0 + jugadores - 1))
+
+        for table, column in [("jugador", "id_jugador"), ("personaje", "id_personaje"),
+                              ("mascota", "id_mascota"), ("objeto", "id_objeto")]:
+            sync_sequence(cur, table, column)
+
+        conn.commit()
+
+    # ANALYZE fuera de la transacción: el planner necesita estadísticas frescas
+    with db_connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("ANALYZE;")
+        finally:
+            conn.autocommit = False
+
+    return {
+        "jugadores": [j0, j0 + jugadores - 1],
+        "personajes": [p0, p0 + total_personajes - 1],
+        "mascotas": [m0, m0 + total_personajes * mascotas - 1],
+        "objetos": [o0, o0 + objetos - 1],
+    }
+
+
+def seeded_range():
+    """Rangos de ids (jugadores, objetos) sembrados por el benchmark, o None."""
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT MIN(id_jugador), MAX(id_jugador)
+            FROM jugador
+            WHERE correo_electronico LIKE 'bench%@example.com';
+        """)
+        low, high = cur.fetchone()
+
+        cur.execute("SELECT MIN(id_objeto), MAX(id_objeto) FROM objeto;")
+        objects = cur.fetchone()
+
+    if low is None or objects[0] is None:
+        return None
+    return (low, high), objects
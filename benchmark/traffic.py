@@ -0,0 +1,212 @@
+import random
+import threading
+import time
+
+import db
+from benchmark.seed import BENCH_EMAIL, BENCH_PASSWORD
+
+
+# ==========================================
+# MARK: MEDICIÓN POR REQUEST
+# ==========================================
+class Recorder:
+    """
+    Se suscribe a los eventos de db.py y atribuye consultas, tiempo de base y
+    espera del pool al request que se está ejecutando en cada hilo.
+    """
+
+    def __init__(self):
+        self.samples = {}
+        self._current = threading.local()
+        self._lock = threading.Lock()
+
+    def __call__(self, event, **data):
+        counters = getattr(self._current, "counters", None)
+        if counters is None:
+            return
+
+        if event == "query":
+            counters["queries"] += 1
+            counters["db_time"] += data["seconds"]
+        elif event in ("checkout", "pool_timeout"):
+            counters["pool_wait"] += data["seconds"]
+
+    def begin(self):
+        self._current.counters = {"queries": 0, "db_time": 0.0, "pool_wait": 0.0}
+
+    def end(self, route, latency, status):
+        sample = dict(self._current.counters, latency=latency, status=status)
+        self._current.counters = None
+
+        with self._lock:
+            self.samples.setdefault(route, []).append(sample)
+
+
+# ==========================================
+# MARK: USUARIO VIRTUAL
+# ==========================================
+# Peso relativo de cada acción en el tráfico simulado (el lobby es lo más visitado)
+ACTIONS = {
+    "lobby": 30,
+    "api_personaje": 15,
+    "api_mascota": 10,
+    "personajes": 8,
+    "mascotas": 8,
+    "api_lote": 5,
+    "pagina_personajes": 4,
+    "seleccionar_personaje": 4,
+    "seleccionar_mascota": 3,
+    "editar_personaje": 4,
+    "crear_eliminar_personaje": 2,
+    "crear_mascota": 2,
+    "inventario": 4,
+    "botin": 2,
+    "login": 2,
+}
+
+
+class VirtualUser:
+    """Un jugador sembrado que navega la app con su propio test client (y cookie de sesión)."""
+
+    def __init__(self, app, recorder, id_jugador, rng, objetos):
+        self.app = app
+        self.objetos = objetos  # (min, max) de ids del catálogo
+        self.recorder = recorder
+        self.id_jugador = id_jugador
+        self.rng = rng
+        self.client = app.test_client()
+        self.ids_personajes = []
+        self.ids_mascotas = []
+        self.etags = {}
+
+    def request(self, route, method, url, **kwargs):
+        self.recorder.begin()
+        start = time.perf_counter()
+
+        resp = self.client.open(url, method=method, **kwargs)
+        resp.get_data()  # Consume el cuerpo (las listas se envían en streaming)
+
+        self.recorder.end(route, time.perf_counter() - start, resp.status_code)
+        return resp
+
+    # ---- Acciones ----
+    def login(self):
+        self.client = self.app.test_client()
+        self.request("login", "POST", "/login", data={
+            "correo": BENCH_EMAIL.format(self.id_jugador),
+            "contrasena": BENCH_PASSWORD,
+        })
+
+        # El cliente del juego carga sus listas al entrar
+        resp = self.request("pagina_personajes", "GET", "/api/jugador/personajes?limite=100")
+        self.ids_personajes = [p["id_personaje"] for p in (resp.get_json() or {}).get("personajes", [])]
+        resp = self.request("pagina_mascotas", "GET", "/api/jugador/mascotas?limite=100")
+        self.ids_mascotas = [m["id_mascota"] for m in (resp.get_json() or {}).get("mascotas", [])]
+
+    def lobby(self):
+        self.request("lobby", "GET", "/lobby")
+
+    def personajes(self):
+        self.request("personajes", "GET", "/personajes")
+
+    def mascotas(self):
+        self.request("mascotas", "GET", "/mascotas")
+
+    def api_personaje(self):
+        self._conditional_get("api_personaje", f"/api/personaje/{self._pick(self.ids_personajes)}")
+
+    def api_mascota(self):
+        self._conditional_get("api_mascota", f"/api/mascota/{self._pick(self.ids_mascotas)}")
+
+    def api_lote(self):
+        ids = ",".join(str(self._pick(self.ids_personajes)) for _ in range(10))
+        self.request("api_lote", "GET", f"/api/personajes/mascotas?ids={ids}")
+
+    def pagina_personajes(self):
+        self.request("pagina_personajes", "GET", "/api/jugador/personajes?limite=50")
+
+    def seleccionar_personaje(self):
+        self.request("seleccionar_personaje", "POST", f"/seleccionar_personaje/{self._pick(self.ids_personajes)}")
+
+    def seleccionar_mascota(self):
+        self.request("seleccionar_mascota", "POST", f"/seleccionar_mascota/{self._pick(self.ids_mascotas)}")
+
+    def editar_personaje(self):
+        self.request("editar_personaje", "POST", "/personajes", data={
+            "id_personaje": self._pick(self.ids_personajes),
+            "nombre": f"Heroe{self.rng.randint(1, 10**6)}",
+            "clase": "Guerrero",
+        })
+
+    def crear_eliminar_personaje(self):
+        ultimo = max(self.ids_personajes, default=0)
+        self.request("crear_personaje", "POST", "/personajes", data={"nombre": "Temporal", "clase": "Mago"})
+
+        # Scroll desde el último conocido para encontrar el nuevo y borrarlo
+        resp = self.request("pagina_personajes", "GET", f"/api/jugador/personajes?despues={ultimo}")
+        for p in (resp.get_json() or {}).get("personajes", []):
+            self.request("eliminar_personaje", "DELETE", f"/eliminar_personaje/{p['id_personaje']}")
+
+    def crear_mascota(self):
+        self.request("crear_mascota", "POST", "/mascotas", data={"nombre": "Cachorro", "tipo": "Lobo"})
+
+    def inventario(self):
+        self.request("api_inventario", "GET", f"/api/inventario/{self._pick(self.ids_personajes)}")
+
+    def botin(self):
+        # Un botín de 50 objetos del catálogo sembrado y luego se consume la mitad
+        id_personaje = self._pick(self.ids_personajes)
+        objetos = [{"id_objeto": self.rng.randint(*self.objetos), "cantidad": self.rng.randint(1, 3)}
+                   for _ in range(50)]
+        self.request("agregar_objetos", "POST", f"/api/inventario/{id_personaje}/agregar", json={"objetos": objetos})
+        self.request("quitar_objetos", "POST", f"/api/inventario/{id_personaje}/quitar", json={"objetos": objetos[:25]})
+
+    # ---- Internos ----
+    def _pick(self, ids):
+        return self.rng.choice(ids) if ids else 0
+
+    def _conditional_get(self, route, url):
+        # Como un navegador: reenvía el ETag recibido y acepta un 304
+        headers = {"If-None-Match": self.etags[url]} if url in self.etags else {}
+        resp = self.request(route, "GET", url, headers=headers)
+        if resp.headers.get("ETag"):
+            self.etags[url] = resp.headers["ETag"]
+
+    def step(self):
+        # Cada acción de ACTIONS es un método con el mismo nombre
+        action = self.rng.choices(list(ACTIONS), weights=list(ACTIONS.values()))[0]
+        getattr(self, action)()
+
+
+# ==========================================
+# MARK: EJECUCIÓN
+# ==========================================
+def run(app, player_range, object_range, usuarios=8, duracion=30.0, semilla=7):
+    """
+    Lanza `usuarios` hilos que navegan durante `duracion` segundos.
+    Devuelve (recorder, segundos_reales).
+    """
+    recorder = Recorder()
+    db.add_listener(recorder)
+    deadline = time.monotonic() + duracion
+    low, high = player_range
+
+    def worker(n):
+        rng = random.Random(semilla + n)
+        user = VirtualUser(app, recorder, rng.randint(low, high), rng, object_range)
+        user.login()
+        while time.monotonic() < deadline:
+            user.step()
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(usuarios)]
+    start = time.monotonic()
+
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        db.remove_listener(recorder)
+
+    return recorder, time.monotonic() - start
@@ -0,0 +1,217 @@
+import queue
+import threading
+
+from psycopg2 import sql
+
+from db import db_connection
+
+
+# ==========================================
+# MARK: TABLAS EXPORTABLES
+# ==========================================
+# Columnas en el orden del CSV (export e import usan el mismo). contrasena_hash se
+# incluye: una copia sin él no permite restaurar ni mover cuentas.
+TABLES = {
+    "jugador": ("id_jugador", [
+        "id_jugador", "nombre_usuario", "correo_electronico", "contrasena_hash", "experiencia",
+        "nivel", "fecha_hora", "direccion_ip", "id_personaje_activo", "id_mascota_activa",
+    ]),
+    "personaje": ("id_personaje", ["id_personaje", "id_jugador", "nombre", "clase", "nivel"]),
+    "mascota": ("id_mascota", ["id_mascota", "id_personaje", "nombre_mascota", "tipo", "nivel"]),
+}
+
+# Referencias circulares jugador → personaje/mascota: al importar jugadores antes que
+# sus personajes, la selección activa queda en NULL (reimportar jugador la restaura).
+OPTIONAL_REFS = {
+    ("jugador", "id_personaje_activo"): ("personaje", "id_personaje"),
+    ("jugador", "id_mascota_activa"): ("mascota", "id_mascota"),
+}
+
+FORMATS = ("csv", "ndjson")
+
+# NDJSON con COPY: una sola columna en CSV con comilla y delimitador que nunca
+# aparecen en un JSON, así cada línea sale (y entra) tal cual, sin escapes.
+_NDJSON_OPTIONS = sql.SQL("(FORMAT csv, QUOTE e'\\x01', DELIMITER e'\\x02')")
+_CSV_OPTIONS = sql.SQL("(FORMAT csv, HEADER true)")
+
+EXPORT_CHUNK = 64 * 1024   # Bytes por trozo enviado al cliente
+EXPORT_QUEUE = 16          # Trozos en vuelo como máximo → memoria constante
+
+
+class ExportCancelled(Exception):
+    """El cliente cerró la conexión: se interrumpe el COPY."""
+
+
+def _table(name):
+    if name not in TABLES:
+        raise ValueError(f"Tabla no exportable: {name}")
+    return TABLES[name]
+
+
+def _format(fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt} (usa {', '.join(FORMATS)})")
+    return fmt
+
+
+# ==========================================
+# MARK: EXPORTACIÓN EN STREAMING (COPY TO STDOUT)
+# ==========================================
+class _QueueWriter:
+    """Archivo falso para copy_expert: agrupa lo escrito en trozos y los encola."""
+
+    def __init__(self):
+        self.queue = queue.Queue(EXPORT_QUEUE)
+        self.cancelled = False
+        self._buf = []
+        self._size = 0
+
+    def write(self, data):
+        if self.cancelled:
+            raise ExportCancelled()
+
+        self._buf.append(data if isinstance(data, bytes) else data.encode())
+        self._size += len(data)
+        if self._size >= EXPORT_CHUNK:
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            # Bloquea si el cliente lee más lento que Postgres: contrapresión
+            self.queue.put(b"".join(self._buf))
+            self._buf, self._size = [], 0
+
+
+_DONE = object()
+
+
+def export_statement(table, fmt):
+    key, columns = _table(table)
+    cols = sql.SQL(", ").join(map(sql.Identifier, columns))
+
+    if _format(fmt) == "csv":
+        query = sql.SQL("SELECT {} FROM {} ORDER BY {}").format(cols, sql.Identifier(table), sql.Identifier(key))
+        options = _CSV_OPTIONS
+    else:
+        query = sql.SQL("SELECT row_to_json(t)::text FROM (SELECT {} FROM {} ORDER BY {}) t").format(
+            cols, sql.Identifier(table), sql.Identifier(key))
+        options = _NDJSON_OPTIONS
+
+    return sql.SQL("COPY ({}) TO STDOUT WITH {}").format(query, options)
+
+
+def stream_export(table, fmt):
+    """
+    Generador de bytes con la tabla entera. El COPY corre en un hilo que escribe en
+    una cola acotada: la memoria no depende del tamaño de la tabla.
+
+    El primer next() espera al primer trozo (o al final/error del COPY), así un fallo
+    de base ocurre antes de empezar a responder.
+    """
+    statement = export_statement(table, fmt)
+
+    def generar():
+        with db_connection() as conn, conn.cursor() as cur:
+            writer = _QueueWriter()
+            error = []
+
+            def copiar():
+                try:
+                    cur.copy_expert(statement, writer)
+                    writer.flush()
+                except BaseException as e:
+                    error.append(e)
+                finally:
+                    writer.queue.put(_DONE)
+
+            hilo = threading.Thread(target=copiar, name=f"export-{table}", daemon=True)
+            hilo.start()
+
+            try:
+                chunk = writer.queue.get()
+                if chunk is _DONE and error:
+                    raise error[0]
+                yield None  # COPY en marcha: ya se puede empezar a responder
+
+                while chunk is not _DONE:
+                    yield chunk
+                    chunk = writer.queue.get()
+
+                if error:
+                    raise error[0]
+
+            finally:
+                if hilo.is_alive():
+                    # Cliente desconectado: se vacía la cola para desbloquear el hilo
+                    writer.cancelled = True
+                    while writer.queue.get() is not _DONE:
+                        pass
+                    hilo.join()
+                if error or writer.cancelled:
+                    # La conexión quedó a medio COPY: no vuelve al pool
+                    conn.close()
+
+            conn.commit()
+
+    chunks = generar()
+    next(chunks)
+    return chunks
+
+
+# ==========================================
+# MARK: IMPORTACIÓN (COPY FROM STDIN + MERGE)
+# ==========================================
+def import_stream(table, fmt, stream):
+    """
+    Carga `stream` (archivo o request.stream, mismo formato que el export) en una
+    tabla temporal con COPY y la fusiona en `table` con un INSERT ... ON CONFLICT
+    DO UPDATE. Todo en una transacción: o entra el archivo entero o nada.
+    Devuelve cuántas filas se insertaron o actualizaron.
+    """
+    key, columns = _table(table)
+    staging = sql.Identifier(f"staging_{table}")
+    target = sql.Identifier(table)
+
+    with db_connection() as conn, conn.cursor() as cur:
+        if _format(fmt) == "csv":
+            cur.execute(sql.SQL("CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP;").format(
+                staging, target))
+            cur.copy_expert(sql.SQL("COPY {} ({}) FROM STDIN WITH {}").format(
+                staging, sql.SQL(", ").join(map(sql.Identifier, columns)), _CSV_OPTIONS), stream)
+            source = sql.SQL("{} s").format(staging)
+        else:
+            cur.execute(sql.SQL("CREATE TEMP TABLE {} (doc jsonb) ON COMMIT DROP;").format(staging))
+            cur.copy_expert(sql.SQL("COPY {} (doc) FROM STDIN WITH {}").format(staging, _NDJSON_OPTIONS), stream)
+            source = sql.SQL("{} d, jsonb_populate_record(NULL::{}, d.doc) s").format(staging, target)
+
+        valores = []
+        for column in columns:
+            ref = OPTIONAL_REFS.get((table, column))
+            if ref:
+                valores.append(sql.SQL("(SELECT r.{key} FROM {ref} r WHERE r.{key} = s.{col})").format(
+                    key=sql.Identifier(ref[1]), ref=sql.Identifier(ref[0]), col=sql.Identifier(column)))
+            else:
+                valores.append(sql.SQL("s.{}").format(sql.Identifier(column)))
+
+        cur.execute(sql.SQL("""
+            INSERT INTO {target} ({cols})
+            SELECT {valores} FROM {source}
+            ON CONFLICT ({key}) DO UPDATE SET {updates};
+        """).format(
+            target=target,
+            cols=sql.SQL(", ").join(map(sql.Identifier, columns)),
+            valores=sql.SQL(", ").join(valores),
+            source=source,
+            key=sql.Identifier(key),
+            updates=sql.SQL(", ").join(
+                sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c)) for c in columns if c != key),
+        ))
+        filas = cur.rowcount
+
+        # Los ids vienen explícitos: el SERIAL debe continuar después del máximo
+        cur.execute(sql.SQL("SELECT setval(pg_get_serial_sequence(%s, %s), (SELECT MAX({}) FROM {}));").format(
+            sql.Identifier(key), target), (table, key))
+
+        conn.commit()
+
+    return filas
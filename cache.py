@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# ==========================================
+# MARK: CACHÉ LRU CON TTL (EN MEMORIA)
+# ==========================================
+class TTLCache:
+    """
+    Caché en memoria del proceso, acotada y segura entre hilos.
+
+    - maxsize: al llenarse se expulsa la entrada usada hace más tiempo (LRU).
+    - ttl: segundos que vive una entrada; cubre los cambios hechos por otros workers.
+
+    Cada worker de gunicorn tiene la suya: las invalidaciones explícitas solo
+    afectan al proceso que hizo la escritura, el TTL se encarga del resto.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # clave -> (expira, valor)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[1] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
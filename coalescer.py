@@ -0,0 +1,130 @@
+import atexit
+import os
+import threading
+
+
+# ==========================================
+# MARK: BUFFER DE ESCRITURAS COALESCENTES
+# ==========================================
+class BufferFull(Exception):
+    """El buffer llegó a su máximo y la base no da abasto; reintentar más tarde."""
+
+    retry_after = 1
+
+
+class WriteBuffer:
+    """
+    Acumula escrituras por clave en memoria y las entrega por tandas a flush_fn.
+
+    - merge(anterior, nuevo) combina dos valores de la misma clave (p. ej. sumar XP).
+    - Se vacía al llegar a batch_size claves o cada flush_every segundos (hilo de
+      fondo), y al salir del proceso.
+    - max_pending acota las claves en memoria: si se llena, add() lanza BufferFull
+      en vez de crecer sin límite. Si flush_fn falla, la tanda vuelve al buffer.
+    - drop_on: excepciones que indican datos inválidos (no una base caída). Reintentar
+      no sirve de nada, así que la tanda se parte en mitades hasta aislar las claves
+      culpables, que se descartan (dead letter) y el resto se escribe.
+
+    Un hilo por worker, creado de forma perezosa (no sobrevive a un fork).
+    """
+
+    def __init__(self, name, flush_fn, merge, batch_size=500, flush_every=1.0, max_pending=50000,
+                 drop_on=()):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.merge = merge
+        self.batch_size = batch_size
+        self.flush_every = flush_every
+        self.max_pending = max_pending
+        self.drop_on = drop_on
+        self.dropped = 0  # Claves descartadas por datos inválidos
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.shutdown)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, items):
+        """items: [(clave, valor)]. Se combinan con lo que ya esté pendiente."""
+        with self._lock:
+            nuevas = {k for k, _ in items if k not in self._pending}
+            if len(self._pending) + len(nuevas) > self.max_pending:
+                self._wakeup.set()
+                raise BufferFull(f"Buffer {self.name} lleno")
+
+            for key, value in items:
+                previo = self._pending.get(key)
+                self._pending[key] = value if previo is None else self.merge(previo, value)
+            full = len(self._pending) >= self.batch_size
+
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Entrega todo lo pendiente a flush_fn. Devuelve cuántas claves se escribieron."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+
+            if not batch:
+                return 0
+
+            escritas, descartadas = [], self.dropped
+            try:
+                self._write(list(batch.items()), escritas)
+
+            except Exception as e:
+                # Nada se pierde: lo no escrito vuelve al buffer combinado con lo llegado mientras tanto
+                for key in escritas:
+                    batch.pop(key, None)
+                print(f"⚠️ No se pudo vaciar el buffer {self.name} ({len(batch)} claves):", e)
+                with self._lock:
+                    for key, value in batch.items():
+                        nuevo = self._pending.get(key)
+                        self._pending[key] = value if nuevo is None else self.merge(value, nuevo)
+
+            return len(escritas) - (self.dropped - descartadas)
+
+    def shutdown(self):
+        # Solo el proceso dueño del buffer lo vacía (el padre de gunicorn no tiene nada)
+        if self._pid == os.getpid():
+            self.flush()
+
+    # ---- Internos ----
+    def _write(self, items, escritas):
+        # Anota en `escritas` las claves ya resueltas (escritas o descartadas)
+        pendientes = [items]
+        while pendientes:
+            tanda = pendientes.pop()
+            try:
+                self.flush_fn(tanda)
+            except self.drop_on as e:
+                if len(tanda) > 1:
+                    mitad = len(tanda) // 2
+                    pendientes += [tanda[mitad:], tanda[:mitad]]
+                    continue
+                print(f"🗑️ Buffer {self.name}: se descarta {tanda[0]!r} por datos inválidos:", e)
+                self.dropped += 1
+            escritas.extend(key for key, _ in tanda)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name=f"flush-{self.name}", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_every)
+            self._wakeup.clear()
+            self.flush()
@@ -0,0 +1,708 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2 import extensions, pool
+
+# La configuración del circuito se lee al importar, así que el .env se carga aquí también
+load_dotenv()
+
+
+# ==========================================
+# MARK: CONFIGURACIÓN DEL POOL
+# ==========================================
+# Todos los tamaños y tiempos se pueden ajustar con variables de entorno
+# sin tocar el código (Render / .env). Se leen al crear el pool, después de load_dotenv().
+def pool_settings():
+    return {
+        "minconn": int(os.getenv("DB_POOL_MIN", "1")),              # Conexiones que se mantienen abiertas
+        "maxconn": int(os.getenv("DB_POOL_MAX", "5")),              # Máximo de conexiones simultáneas
+        "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),       # Segundos esperando un hueco libre
+        "recycle": float(os.getenv("DB_POOL_RECYCLE", "1800")),     # Edad máxima de una conexión
+        "ping_after": float(os.getenv("DB_POOL_PING", "30")),       # Inactividad tras la cual se valida
+        "sslmode": os.getenv("DB_SSLMODE", "require"),              # Requerido para Supabase
+        "connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", "5")),  # No colgar el worker si la base no responde
+    }
+
+
+def breaker_settings():
+    return {
+        "threshold": int(os.getenv("DB_BREAKER_THRESHOLD", "3")),          # Fallos seguidos para abrir
+        "reset_timeout": float(os.getenv("DB_BREAKER_RESET", "10")),       # Espera antes del primer sondeo
+        "max_reset_timeout": float(os.getenv("DB_BREAKER_MAX_RESET", "60")),
+    }
+
+
+def replica_settings():
+    return {
+        "max_lag": float(os.getenv("DB_REPLICA_MAX_LAG", "5")),       # Segundos de retraso tolerados
+        "check_every": float(os.getenv("DB_REPLICA_CHECK", "2")),     # Cada cuánto se mide el retraso
+        "retry_after": float(os.getenv("DB_REPLICA_RETRY", "30")),    # Pausa tras un fallo de la réplica
+    }
+
+
+class DatabaseUnavailable(Exception):
+    """La base no está disponible; el cliente debe reintentar tras retry_after segundos."""
+
+    def __init__(self, message="Base de datos no disponible", retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PoolTimeout(DatabaseUnavailable):
+    """No se liberó ninguna conexión dentro del tiempo de espera."""
+
+
+# ==========================================
+# MARK: INSTRUMENTACIÓN
+# ==========================================
+# Quien quiera medir (benchmark, métricas) se suscribe con add_listener(fn);
+# fn(evento, **datos) recibe:
+#   "checkout"     seconds (espera por la conexión), in_use, size
+#   "pool_timeout" seconds
+#   "query"        statement (SQL parametrizado), seconds
+#   "read_route"   target ("replica" | "primary"), reason
+# Sin suscriptores el coste es una comprobación de lista vacía.
+_listeners = []
+
+
+def add_listener(fn):
+    _listeners.append(fn)
+
+
+def remove_listener(fn):
+    if fn in _listeners:
+        _listeners.remove(fn)
+
+
+def notify(event, **data):
+    for fn in _listeners:
+        try:
+            fn(event, **data)
+        except Exception as e:
+            print(f"⚠️ Error en listener de base de datos: {e}")
+
+
+# Gates: fn() llamadas antes de prestar cada conexión de db_connection(); pueden
+# lanzar para que el request no llegue a pedirla (p. ej. el control de admisión).
+_checkout_gates = []
+
+
+def add_checkout_gate(fn):
+    _checkout_gates.append(fn)
+    return fn
+
+
+class InstrumentedCursor(extensions.cursor):
+    """Cursor que informa la duración de cada sentencia a los listeners."""
+
+    def execute(self, query, vars=None):
+        if not _listeners:
+            return super().execute(query, vars)
+
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            notify("query", statement=self._statement_text(query), seconds=time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        if not _listeners:
+            return super().executemany(query, vars_list)
+
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            notify("query", statement=self._statement_text(query), seconds=time.perf_counter() - start)
+
+    def _statement_text(self, query):
+        # Siempre la sentencia parametrizada (sin valores), como texto
+        if isinstance(query, bytes):
+            return query.decode("utf-8", "replace")
+        if not isinstance(query, str):
+            return query.as_string(self)
+        return query
+
+
+# ==========================================
+# MARK: POOL THREAD-SAFE
+# ==========================================
+class ConnectionPool:
+    """
+    Pool de conexiones seguro entre hilos (gunicorn --threads).
+
+    Envuelve ThreadedConnectionPool y añade:
+    - espera acotada cuando el pool está lleno (en lugar de fallar al instante),
+    - pre-ping de conexiones que llevan tiempo inactivas (Supabase cierra las ociosas),
+    - reciclado de conexiones demasiado viejas.
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=5, timeout=10, recycle=1800, ping_after=30, **kwargs):
+        self._pool = pool.ThreadedConnectionPool(minconn, maxconn, dsn=dsn, **kwargs)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._created = {}    # conexión -> momento de creación
+        self._last_used = {}  # conexión -> última devolución al pool
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self.in_use = 0       # Conexiones prestadas ahora mismo
+        self.pid = os.getpid()
+
+    def getconn(self):
+        start = time.perf_counter()
+
+        # Se reserva un hueco antes de tocar el pool: si está lleno se espera, no se revienta
+        if not self._slots.acquire(timeout=self.timeout):
+            notify("pool_timeout", seconds=time.perf_counter() - start)
+            raise PoolTimeout(f"Sin conexiones libres tras {self.timeout}s")
+
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.in_use += 1
+        notify("checkout", seconds=time.perf_counter() - start, in_use=self.in_use, size=self.maxconn)
+        return conn
+
+    def putconn(self, conn, close=False):
+        try:
+            with self._lock:
+                self.in_use -= 1
+                self._last_used[conn] = time.monotonic()
+                if close or conn.closed:
+                    self._forget(conn)
+
+            # Nunca se devuelve una transacción abierta a otro request
+            if not conn.closed and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+
+            self._pool.putconn(conn, close=close)
+        finally:
+            self._slots.release()
+
+    def warm(self):
+        """
+        Presta las minconn conexiones a la vez, valida cada una con un ping y las
+        devuelve: el primer request ya no paga la conexión ni el handshake TLS.
+        """
+        conns = []
+        try:
+            # Dentro del try: si falla la tercera, las dos primeras vuelven al pool
+            for _ in range(self.minconn):
+                conns.append(self.getconn())
+            for i, conn in enumerate(conns):
+                if not self._ping(conn):
+                    try:
+                        conns[i] = self._replace(conn)
+                    except Exception:
+                        # _replace ya devolvió la vieja cerrada y no obtuvo otra: no hay
+                        # conexión que pasar a putconn, pero su hueco sigue reservado
+                        conns[i] = None
+                        with self._lock:
+                            self.in_use -= 1
+                        self._slots.release()
+                        raise
+        finally:
+            for conn in conns:
+                if conn is not None:
+                    self.putconn(conn)
+        return len(conns)
+
+    def closeall(self):
+        self._pool.closeall()
+        with self._lock:
+            self._created.clear()
+            self._last_used.clear()
+
+    # ---- Internos ----
+    def _checkout(self):
+        conn = self._pool.getconn()
+        now = time.monotonic()
+
+        with self._lock:
+            created = self._created.setdefault(conn, now)
+            last_used = self._last_used.get(conn, now)
+
+        # Conexión demasiado vieja o cerrada por el servidor → se recicla
+        if conn.closed or now - created > self.recycle:
+            return self._replace(conn)
+
+        # Conexión ociosa → se valida con una consulta mínima
+        if now - last_used > self.ping_after and not self._ping(conn):
+            print("♻️ Conexión inactiva descartada, se abre una nueva.")
+            return self._replace(conn)
+
+        return conn
+
+    def _ping(self, conn):
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _replace(self, conn):
+        with self._lock:
+            self._forget(conn)
+        self._pool.putconn(conn, close=True)
+
+        conn = self._pool.getconn()
+        with self._lock:
+            self._created[conn] = time.monotonic()
+        return conn
+
+    def _forget(self, conn):
+        self._created.pop(conn, None)
+        self._last_used.pop(conn, None)
+
+
+# ==========================================
+# MARK: POOL POR WORKER
+# ==========================================
+# Se crea una sola vez por proceso. Si gunicorn hace fork después de crearlo,
+# el PID cambia y el worker abre su propio pool (los sockets no se comparten).
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+
+    if _pool is not None and _pool.pid == os.getpid():
+        return _pool
+
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = ConnectionPool(os.getenv("DATABASE_URL"), cursor_factory=InstrumentedCursor, **pool_settings())
+            print("✅ Pool de conexiones creado correctamente.")
+        return _pool
+
+
+def current_pool():
+    """El pool de este worker si ya existe (sin crearlo), p. ej. para métricas."""
+    db_pool = _pool
+    return db_pool if db_pool is not None and db_pool.pid == os.getpid() else None
+
+
+def warm_pool():
+    """Abre y valida las conexiones mínimas de este proceso (y de la réplica). Devuelve cuántas."""
+    listas = get_pool().warm()
+    if replica.enabled:
+        listas += replica.warm()
+    return listas
+
+
+def close_pool():
+    """
+    Cierra las conexiones de este proceso: al apagar el worker, o en el maestro de
+    gunicorn antes del fork para que ningún hijo herede sus sockets.
+    """
+    global _pool
+
+    with _pool_lock:
+        db_pool, _pool = _pool, None
+    if db_pool is not None and db_pool.pid == os.getpid():
+        db_pool.closeall()
+    replica.close()
+
+
+def reset_pool():
+    """
+    Descarta el pool actual; el siguiente acceso crea uno nuevo.
+    Las conexiones prestadas vuelven al pool viejo, que se libera al quedar sin uso.
+    """
+    global _pool
+
+    with _pool_lock:
+        _pool = None
+
+
+def _checkout():
+    # Con el circuito abierto se falla en milisegundos, sin tocar la red
+    breaker.before_request()
+
+    try:
+        db_pool = get_pool()
+        conn = db_pool.getconn()
+
+    except PoolTimeout:
+        # Pool lleno: la base responde, no cuenta como fallo de conexión
+        raise
+
+    except Exception as e:
+        print(f"⚠️ Fallo al conectar con la base: {e}")
+
+        # Se reinicia el pool para evitar errores de estado corrupto
+        reset_pool()
+
+        # Identificación de Supabase dormida
+        if "Connection refused" in str(e):
+            print("💤 Supabase parece dormida, se sondeará en segundo plano.")
+
+        breaker.record_failure()
+        raise DatabaseUnavailable(retry_after=breaker.retry_after()) from e
+
+    breaker.record_success()
+    return db_pool, conn
+
+
+def get_db_connection():
+    """
+    Obtiene una conexión del pool o lanza DatabaseUnavailable al instante.
+    Quien la pide es responsable de devolverla con get_pool().putconn(conn);
+    en las rutas se usa siempre db_connection().
+    """
+    return _checkout()[1]
+
+
+def _probe_database():
+    # Sondeo del hilo de fondo: pool nuevo + consulta mínima
+    reset_pool()
+    db_pool = get_pool()
+    conn = db_pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1;")
+    finally:
+        db_pool.putconn(conn)
+
+
+# ==========================================
+# MARK: RÉPLICA DE LECTURA
+# ==========================================
+# Con DATABASE_REPLICA_URL definido, db_connection(readonly=True) presta una conexión
+# de la réplica. Se vuelve a la primaria (sin error para el request) si:
+#   - la réplica no responde o falla a mitad de consulta → se ignora DB_REPLICA_RETRY s,
+#   - su retraso supera DB_REPLICA_MAX_LAG o no se puede medir,
+#   - su pool está lleno.
+# Las escrituras y las lecturas que deben ver lo recién escrito usan readonly=False.
+
+# Retraso de replay en segundos. Si ya aplicó todo lo recibido es 0 (sin escrituras
+# en la primaria el último replay puede ser antiguo y no es retraso). Sin streaming
+# conectado no se sabe cuánto falta: NULL → se trata como réplica desactualizada.
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END;
+"""
+
+
+class ReplicaRouter:
+    """
+    Decide réplica o primaria para cada lectura.
+
+    El retraso se mide como mucho cada check_every segundos, con la misma conexión
+    que se va a prestar y por un solo hilo a la vez; el resto usa el último valor.
+    """
+
+    OFF = "off"
+    OK = "ok"
+    STALE = "stale"
+    DOWN = "down"
+
+    def __init__(self, dsn, max_lag=5, check_every=2, retry_after=30):
+        self.dsn = dsn
+        self.max_lag = max_lag
+        self.check_every = check_every
+        self.retry_after = retry_after
+        self.lag = None
+        self._checked_at = float("-inf")
+        self._down_until = 0.0
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        # Hasta la primera medición no se sabe si está al día
+        self.state = self.STALE if dsn else self.OFF
+
+    @property
+    def enabled(self):
+        return bool(self.dsn)
+
+    def checkout(self):
+        """(pool, conexión) de la réplica, o None si la lectura debe ir a la primaria."""
+        if time.monotonic() < self._down_until:
+            return self._primary("down")
+
+        try:
+            replica_pool = self._get_pool()
+            conn = replica_pool.getconn()
+        except PoolTimeout:
+            return self._primary("busy")
+        except Exception as e:
+            self.mark_down(e)
+            return self._primary("down")
+
+        if time.monotonic() - self._checked_at >= self.check_every and self._check_lock.acquire(blocking=False):
+            try:
+                self._measure(conn)
+            except psycopg2.Error as e:
+                replica_pool.putconn(conn, close=True)
+                self.mark_down(e)
+                return self._primary("down")
+            finally:
+                self._check_lock.release()
+
+        if self.state != self.OK:
+            replica_pool.putconn(conn)
+            return self._primary("stale")
+
+        notify("read_route", target="replica", reason="ok")
+        return replica_pool, conn
+
+    def mark_down(self, error):
+        if self.state != self.DOWN:
+            print(f"⚠️ Réplica no disponible, lecturas a la primaria durante {self.retry_after:.0f}s: {error}")
+        self.state = self.DOWN
+        self.lag = None
+        self._checked_at = float("-inf")
+        self._down_until = time.monotonic() + self.retry_after
+
+        # Pool nuevo en el próximo intento (las conexiones viejas pueden estar rotas)
+        with self._pool_lock:
+            self._pool = None
+
+    def warm(self):
+        try:
+            return self._get_pool().warm()
+        except psycopg2.Error as e:
+            self.mark_down(e)
+            return 0
+
+    def close(self):
+        with self._pool_lock:
+            replica_pool, self._pool = self._pool, None
+        if replica_pool is not None and replica_pool.pid == os.getpid():
+            replica_pool.closeall()
+
+    def current_pool(self):
+        replica_pool = self._pool
+        return replica_pool if replica_pool is not None and replica_pool.pid == os.getpid() else None
+
+    def snapshot(self):
+        return {"state": self.state, "lag": None if self.lag is None else round(self.lag, 3)}
+
+    # ---- Internos ----
+    def _primary(self, reason):
+        notify("read_route", target="primary", reason=reason)
+        return None
+
+    def _get_pool(self):
+        replica_pool = self._pool
+        if replica_pool is not None and replica_pool.pid == os.getpid():
+            return replica_pool
+
+        with self._pool_lock:
+            if self._pool is None or self._pool.pid != os.getpid():
+                settings = pool_settings()
+                settings["maxconn"] = int(os.getenv("DB_REPLICA_POOL_MAX", settings["maxconn"]))
+                settings["minconn"] = min(settings["minconn"], settings["maxconn"])
+                # Solo lectura también en la sesión: una escritura mal enrutada falla al instante
+                self._pool = ConnectionPool(self.dsn, cursor_factory=InstrumentedCursor,
+                                            options="-c default_transaction_read_only=on", **settings)
+                print("✅ Pool de la réplica creado correctamente.")
+            return self._pool
+
+    def _measure(self, conn):
+        with conn.cursor() as cur:
+            cur.execute(REPLICA_LAG_QUERY)
+            lag = cur.fetchone()[0]
+        conn.rollback()
+
+        self.lag = None if lag is None else float(lag)
+        self._checked_at = time.monotonic()
+
+        state = self.OK if self.lag is not None and self.lag <= self.max_lag else self.STALE
+        if state != self.state:
+            if state == self.OK:
+                print("✅ Réplica al día, vuelven las lecturas.")
+            else:
+                lag_text = "desconocido" if self.lag is None else f"{self.lag:.1f}s"
+                print(f"🐢 Réplica con retraso {lag_text}, lecturas a la primaria.")
+        self.state = state
+
+
+replica = ReplicaRouter(os.getenv("DATABASE_REPLICA_URL"), **replica_settings())
+
+
+# ==========================================
+# MARK: CIRCUIT BREAKER
+# ==========================================
+class CircuitBreaker:
+    """
+    Corta el acceso a la base tras varios fallos seguidos de conexión.
+
+    - closed: todo normal, se cuentan los fallos.
+    - open: los requests fallan al instante con DatabaseUnavailable.
+    - half_open: un único hilo de fondo está sondeando la base.
+
+    Mientras no esté cerrado, es ese hilo (y no los requests) quien espera y
+    reconecta; cada sondeo fallido duplica la espera hasta max_reset_timeout.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, probe, threshold=3, reset_timeout=10, max_reset_timeout=60):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self._probe = probe
+        self._timeout = reset_timeout
+        self._opened_at = None
+        self._prober = None
+        self._prober_pid = None
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        if self.state == self.CLOSED:
+            return
+
+        with self._lock:
+            # El sondeo pudo cerrar el circuito entre la lectura de arriba y el lock:
+            # sin esta comprobación se lanzaría otro sondeo con _opened_at = None
+            if self.state == self.CLOSED:
+                return
+            # Tras un fork el hilo de sondeo no existe en el hijo
+            self._ensure_prober()
+        raise DatabaseUnavailable(retry_after=self.retry_after())
+
+    def record_success(self):
+        if self.failures:
+            with self._lock:
+                self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.CLOSED and self.failures >= self.threshold:
+                print(f"🔌 Circuito abierto tras {self.failures} fallos de conexión.")
+                self._open()
+
+    def retry_after(self):
+        if self._opened_at is None:
+            return max(1, math.ceil(self.reset_timeout))
+        remaining = self._opened_at + self._timeout - time.monotonic()
+        return max(1, math.ceil(remaining))
+
+    def snapshot(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_after": self.retry_after() if self.state != self.CLOSED else 0,
+        }
+
+    # ---- Internos ----
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._ensure_prober()
+
+    def _ensure_prober(self):
+        if self._prober_pid == os.getpid() and self._prober is not None and self._prober.is_alive():
+            return
+        self._prober = threading.Thread(target=self._probe_loop, name="db-breaker-probe", daemon=True)
+        self._prober_pid = os.getpid()
+        self._prober.start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(max(0.0, self._opened_at + self._timeout - time.monotonic()))
+
+            with self._lock:
+                self.state = self.HALF_OPEN
+
+            try:
+                self._probe()
+            except Exception as e:
+                with self._lock:
+                    self.state = self.OPEN
+                    self._opened_at = time.monotonic()
+                    self._timeout = min(self._timeout * 2, self.max_reset_timeout)
+                print(f"💤 Sondeo fallido, próximo intento en {self._timeout:.0f}s: {e}")
+                continue
+
+            with self._lock:
+                self.state = self.CLOSED
+                self.failures = 0
+                self._opened_at = None
+                self._timeout = self.reset_timeout
+            print("✅ Base de datos recuperada, circuito cerrado.")
+            return
+
+
+breaker = CircuitBreaker(_probe_database, **breaker_settings())
+
+
+# ==========================================
+# MARK: CONTEXT MANAGERS
+# ==========================================
+@contextmanager
+def db_connection(readonly=False):
+    """
+    Presta una conexión del pool y la devuelve SIEMPRE, pase lo que pase.
+    Si el bloque lanza una excepción se hace rollback antes de devolverla.
+    Si la base no está disponible lanza DatabaseUnavailable sin esperar.
+
+    readonly=True: el bloque solo lee y tolera unos segundos de retraso → puede
+    ir a la réplica (ver ReplicaRouter).
+    """
+    for gate in _checkout_gates:
+        gate()
+
+    routed = replica.checkout() if readonly and replica.enabled else None
+    db_pool, conn = routed or _checkout()
+    broken = False
+
+    try:
+        yield conn
+
+    except Exception as e:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+
+        # La conexión se cayó a mitad de consulta → cuenta para el circuito
+        # (o, si era de la réplica, se deja de usar la réplica un rato)
+        if isinstance(e, psycopg2.OperationalError) and conn.closed:
+            broken = True
+            if routed:
+                replica.mark_down(e)
+            else:
+                breaker.record_failure()
+        raise
+
+    finally:
+        db_pool.putconn(conn, close=broken)
+
+
+@contextmanager
+def db_cursor(commit=False, readonly=False):
+    """Atajo: conexión + cursor. Con commit=True se confirma al salir sin errores."""
+    with db_connection(readonly=readonly) as conn:
+        with conn.cursor() as cur:
+            yield cur
+        if commit:
+            conn.commit()
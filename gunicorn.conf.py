@@ -0,0 +1,40 @@
+import os
+
+
+# ==========================================
+# MARK: CONFIGURACIÓN DE GUNICORN
+# ==========================================
+# gunicorn -c gunicorn.conf.py videojuego:app
+# Render define PORT y WEB_CONCURRENCY; el resto se ajusta con variables de entorno.
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL", "25"))  # Margen para terminar requests tras SIGTERM
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+
+
+# ==========================================
+# MARK: HOOKS
+# ==========================================
+def pre_fork(server, worker):
+    # Con preload el maestro importó la app: si abrió conexiones (un comando, un
+    # sondeo) se cierran antes del fork, o el hijo heredaría el mismo socket TLS
+    import db
+
+    db.close_pool()
+
+
+def post_worker_init(worker):
+    # Se ejecuta en el worker ya creado y antes de aceptar conexiones
+    from videojuego import calentar
+
+    calentar()
+
+
+def worker_exit(server, worker):
+    # SIGTERM: gunicorn dejó de aceptar y esperó los requests en curso (graceful_timeout)
+    from videojuego import drenar
+
+    drenar()
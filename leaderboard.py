@@ -0,0 +1,268 @@
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+from db import db_connection
+
+# Los intervalos de sincronización se leen al importar
+load_dotenv()
+
+
+# ==========================================
+# MARK: TABLA ORDENADA (RANKING DE UN TABLERO)
+# ==========================================
+class SortedBoard:
+    """
+    Jugadores ordenados por puntuación descendente en una lista con bisect.
+
+    - rank / posición: búsqueda binaria, O(log n).
+    - top y "alrededor de mí": un slice de la lista.
+    - actualizar una puntuación: bisect + insort (el desplazamiento es un memmove).
+    Los empates comparten puesto (ranking de competición: 1, 2, 2, 4).
+    """
+
+    def __init__(self):
+        self._keys = []    # [(-puntuacion, id_jugador)] ordenada
+        self._scores = {}  # id_jugador -> puntuacion
+
+    def __len__(self):
+        return len(self._keys)
+
+    def set(self, id_jugador, score):
+        self.remove(id_jugador)
+        self._scores[id_jugador] = score
+        insort(self._keys, (-score, id_jugador))
+
+    def remove(self, id_jugador):
+        old = self._scores.pop(id_jugador, None)
+        if old is not None:
+            index = bisect_left(self._keys, (-old, id_jugador))
+            del self._keys[index]
+
+    def score(self, id_jugador):
+        return self._scores.get(id_jugador)
+
+    def rank(self, id_jugador):
+        score = self._scores.get(id_jugador)
+        if score is None:
+            return None
+        # (-score,) es menor que cualquier (-score, id): cae en el primer empatado
+        return bisect_left(self._keys, (-score,)) + 1
+
+    def top(self, n):
+        return self._entries(0, n)
+
+    def around(self, id_jugador, k):
+        score = self._scores.get(id_jugador)
+        if score is None:
+            return []
+        index = bisect_left(self._keys, (-score, id_jugador))
+        return self._entries(max(0, index - k), index + k + 1)
+
+    def _entries(self, start, stop):
+        # [(puesto, id_jugador, puntuacion)] con el puesto de competición de cada uno
+        entries = []
+        for neg_score, id_jugador in self._keys[start:stop]:
+            entries.append((bisect_left(self._keys, (neg_score,)) + 1, id_jugador, -neg_score))
+        return entries
+
+
+# ==========================================
+# MARK: MOTOR DE RANKINGS
+# ==========================================
+class Leaderboard:
+    """
+    Ranking global y por clase, en memoria de cada worker.
+
+    Se alimenta del rollup ranking_personaje (una fila por personaje):
+    - al arrancar (o cada rebuild_every segundos) se carga entero;
+    - cada refresh_every segundos solo se leen las filas con actualizado_en reciente;
+    - las partidas registradas en este proceso se aplican al instante con apply().
+    Los personajes borrados en otro worker desaparecen de aquí en el siguiente rebuild.
+
+    Las consultas a la base se hacen sin el lock (y por un solo hilo): mientras tanto
+    las lecturas y apply() siguen usando los tableros actuales, y el rebuild sustituye
+    los tableros de golpe al terminar.
+    La puntuación de un jugador es la suma de la de sus personajes (global) o la de
+    sus personajes de esa clase (tablero por clase).
+    """
+
+    GLOBAL = "global"
+
+    def __init__(self, refresh_every=5, rebuild_every=600, overlap=30):
+        self.refresh_every = refresh_every
+        self.rebuild_every = rebuild_every
+        self.overlap = overlap              # Segundos releídos para no perder commits tardíos
+        self._boards = {}
+        self._personajes = {}               # id_personaje -> (id_jugador, clase, puntuacion)
+        self._totals = {}                   # (tablero, id_jugador) -> [puntuacion, personajes]
+        self._watermark = None
+        self._loaded_at = None
+        self._polled_at = 0.0
+        self._journal = None                # apply()/remove durante un rebuild, para reaplicarlos
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()  # Un solo hilo consulta la base
+
+    # ---- Consultas ----
+    def top(self, n=10, clase=None):
+        with self._synced() as board:
+            return board(clase).top(n)
+
+    def rank(self, id_jugador, clase=None):
+        with self._synced() as board:
+            b = board(clase)
+            return b.rank(id_jugador), b.score(id_jugador), len(b)
+
+    def around(self, id_jugador, k=5, clase=None):
+        with self._synced() as board:
+            return board(clase).around(id_jugador, k)
+
+    # ---- Actualizaciones ----
+    def apply(self, rows):
+        """Aplica filas (id_personaje, id_jugador, clase, puntuacion) recién escritas."""
+        with self._lock:
+            for row in rows:
+                self._apply_row(*row)
+                if self._journal is not None:
+                    self._journal.append((self._apply_row, row))
+
+    def remove_personaje(self, id_personaje):
+        with self._lock:
+            self._remove_personaje(id_personaje)
+            if self._journal is not None:
+                self._journal.append((self._remove_personaje, (id_personaje,)))
+
+    # ---- Internos ----
+    def _board(self, clase):
+        # Solo para escribir: crea el tablero de una clase nueva
+        return self._boards.setdefault(clase or self.GLOBAL, SortedBoard())
+
+    def _read_board(self, clase):
+        # Para leer: una clase desconocida no crea nada (?clase=<lo que sea> no ocupa memoria)
+        return self._boards.get(clase or self.GLOBAL, EMPTY_BOARD)
+
+    @contextmanager
+    def _synced(self):
+        self._sync()
+        with self._lock:
+            yield self._read_board
+
+    def _sync(self):
+        if not self._due():
+            return
+
+        # Un solo hilo consulta la base; el resto lee los tableros actuales sin esperar,
+        # salvo en la primera carga, cuando todavía no hay nada que leer
+        if not self._sync_lock.acquire(blocking=self._loaded_at is None):
+            return
+        try:
+            due = self._due()
+            if due == "rebuild":
+                self._rebuild()
+            elif due == "poll":
+                self._poll()
+        finally:
+            self._sync_lock.release()
+
+    def _due(self):
+        now = time.monotonic()
+        if self._loaded_at is None or now - self._loaded_at > self.rebuild_every:
+            return "rebuild"
+        if now - self._polled_at > self.refresh_every:
+            return "poll"
+        return None
+
+    def _rebuild(self):
+        with self._lock:
+            self._journal = []
+
+        try:
+            with db_connection() as conn, conn.cursor() as cur:
+                cur.execute("SELECT statement_timestamp();")
+                watermark = cur.fetchone()[0]
+                cur.execute("SELECT id_personaje, id_jugador, clase, puntuacion FROM ranking_personaje;")
+                rows = cur.fetchall()
+
+            # Los tableros nuevos se arman fuera del lock y se sustituyen de una vez
+            nuevo = Leaderboard()
+            for row in rows:
+                nuevo._apply_row(*row)
+
+            with self._lock:
+                self._boards, self._personajes, self._totals = nuevo._boards, nuevo._personajes, nuevo._totals
+                # Lo aplicado en este proceso mientras se consultaba (si la lectura ya lo
+                # incluía no cambia nada; si algo queda atrás lo corrige el siguiente poll)
+                for fn, args in self._journal:
+                    fn(*args)
+                self._watermark = watermark
+                self._loaded_at = self._polled_at = time.monotonic()
+
+        finally:
+            with self._lock:
+                self._journal = None
+
+        print(f"🏆 Ranking reconstruido con {len(rows)} personajes.")
+
+    def _poll(self):
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT statement_timestamp();")
+            watermark = cur.fetchone()[0]
+            cur.execute("""
+                SELECT id_personaje, id_jugador, clase, puntuacion
+                FROM ranking_personaje
+                WHERE actualizado_en > %s - make_interval(secs => %s);
+            """, (self._watermark, self.overlap))
+            rows = cur.fetchall()
+
+        with self._lock:
+            for row in rows:
+                self._apply_row(*row)
+
+            self._watermark = watermark
+            self._polled_at = time.monotonic()
+
+    def _remove_personaje(self, id_personaje):
+        old = self._personajes.pop(id_personaje, None)
+        if old:
+            self._move(old, None)
+
+    def _apply_row(self, id_personaje, id_jugador, clase, puntuacion):
+        new = (id_jugador, clase, puntuacion)
+        old = self._personajes.get(id_personaje)
+        if old == new:
+            return  # Releído por el solape: ya aplicado
+
+        self._personajes[id_personaje] = new
+        self._move(old, new)
+
+    def _move(self, old, new):
+        # Resta la contribución anterior del personaje y suma la nueva en ambos tableros
+        for contribution, sign in ((old, -1), (new, 1)):
+            if contribution is None:
+                continue
+            id_jugador, clase, puntuacion = contribution
+            for board in (self.GLOBAL, clase):
+                key = (board, id_jugador)
+                total = self._totals.setdefault(key, [0, 0])
+                total[0] += sign * puntuacion
+                total[1] += sign
+
+                if total[1] == 0:
+                    # Sin personajes en este tablero: el jugador sale del ranking
+                    del self._totals[key]
+                    self._board(board).remove(id_jugador)
+                else:
+                    self._board(board).set(id_jugador, total[0])
+
+
+# Tablero vacío compartido para las lecturas de clases sin jugadores (nunca se escribe)
+EMPTY_BOARD = SortedBoard()
+
+leaderboard = Leaderboard(
+    refresh_every=float(os.getenv("RANKING_REFRESH", "5")),
+    rebuild_every=float(os.getenv("RANKING_REBUILD", "600")),
+)
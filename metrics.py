@@ -0,0 +1,222 @@
+import os
+import re
+import threading
+import time
+
+from dotenv import load_dotenv
+from flask import g, has_request_context, request
+
+import db
+
+# El umbral del log de consultas lentas se lee al importar
+load_dotenv()
+
+
+# ==========================================
+# MARK: TIPOS DE MÉTRICA (FORMATO PROMETHEUS)
+# ==========================================
+# Cada worker de gunicorn tiene sus propias métricas en memoria: Prometheus debe
+# raspar cada worker o sumar por instancia.
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, labels=()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.label_names = tuple(labels)
+        self._series = {}  # labels -> [conteo por bucket..., suma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, key, ('le', bound))} {count}")
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, ('le', '+Inf'))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, key)} {series[-1]}")
+        return lines
+
+
+def gauge_lines(name, help_text, samples):
+    """samples: [({label: valor}, número)] calculados en el momento del scrape."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {value}")
+    return lines
+
+
+# ==========================================
+# MARK: MÉTRICAS DE LA APP
+# ==========================================
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Latencia por ruta",
+                            LATENCY_BUCKETS, ("route", "method", "status"))
+QUERIES_PER_REQUEST = Histogram("db_queries_per_request", "Consultas SQL por request",
+                                COUNT_BUCKETS, ("route",))
+QUERY_LATENCY = Histogram("db_query_duration_seconds", "Duración por sentencia SQL parametrizada",
+                          LATENCY_BUCKETS, ("statement",))
+POOL_WAIT = Histogram("db_pool_checkout_wait_seconds", "Espera por una conexión del pool",
+                      WAIT_BUCKETS)
+POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Requests que no obtuvieron conexión a tiempo")
+READ_ROUTES = Counter("db_read_routes_total", "Lecturas enviadas a réplica o primaria y por qué",
+                      ("target", "reason"))
+ADMISSION_DECISIONS = Counter("admission_decisions_total", "Decisiones del control de admisión por endpoint",
+                              ("endpoint", "decision"))
+SLOW_QUERIES = Counter("db_slow_queries_total", "Consultas por encima de SLOW_QUERY_MS", ("route",))
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+_metrics = [REQUEST_LATENCY, QUERIES_PER_REQUEST, QUERY_LATENCY, POOL_WAIT, POOL_TIMEOUTS, READ_ROUTES, ADMISSION_DECISIONS, SLOW_QUERIES]
+_collectors = []
+
+
+def register_collector(fn):
+    """fn() devuelve líneas extra (p. ej. de gauge_lines) que se calculan al raspar."""
+    _collectors.append(fn)
+
+
+def _statement_label(statement):
+    # Una sola línea, sin espacios repetidos y acotada: etiqueta estable por sentencia
+    return re.sub(r"\s+", " ", statement).strip()[:160]
+
+
+def _current_route():
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return "sin_ruta"
+
+
+# ==========================================
+# MARK: HOOKS (FLASK + CURSOR)
+# ==========================================
+def _on_db_event(event, **data):
+    if event == "query":
+        seconds = data["seconds"]
+        statement = _statement_label(data["statement"])
+        QUERY_LATENCY.observe(seconds, statement=statement)
+
+        if has_request_context():
+            counters = g.get("_metricas")
+            if counters is not None:
+                counters["queries"] += 1
+
+        if seconds * 1000 >= SLOW_QUERY_MS:
+            route = _current_route()
+            SLOW_QUERIES.inc(route=route)
+            print(f"🐢 Consulta lenta ({seconds * 1000:.0f} ms) en {route}: {statement}")
+
+    elif event == "checkout":
+        POOL_WAIT.observe(data["seconds"])
+
+    elif event == "pool_timeout":
+        POOL_WAIT.observe(data["seconds"])
+        POOL_TIMEOUTS.inc()
+
+    elif event == "read_route":
+        READ_ROUTES.inc(target=data["target"], reason=data["reason"])
+
+
+def init_app(app):
+    """Registra los hooks before/after request y el listener de base de datos."""
+    db.add_listener(_on_db_event)
+
+    @app.before_request
+    def _metricas_inicio():
+        g._metricas = {"start": time.perf_counter(), "queries": 0}
+
+    @app.after_request
+    def _metricas_fin(response):
+        counters = g.get("_metricas")
+        if counters is None:
+            return response
+
+        route = _current_route()
+        method = request.method
+        status = str(response.status_code)
+
+        # Se observa al cerrar la respuesta: incluye el cuerpo enviado en streaming
+        def observe():
+            REQUEST_LATENCY.observe(time.perf_counter() - counters["start"], route=route, method=method, status=status)
+            QUERIES_PER_REQUEST.observe(counters["queries"], route=route)
+
+        response.call_on_close(observe)
+        return response
+
+
+def _pool_lines():
+    db_pool = db.current_pool()
+    in_use = db_pool.in_use if db_pool else 0
+    size = db_pool.maxconn if db_pool else 0
+    lines = (gauge_lines("db_pool_in_use", "Conexiones prestadas ahora", [({}, in_use)])
+             + gauge_lines("db_pool_size", "Máximo de conexiones del pool", [({}, size)]))
+
+    if db.replica.enabled:
+        replica_pool = db.replica.current_pool()
+        estados = {db.replica.OK: 0, db.replica.STALE: 1, db.replica.DOWN: 2}
+        lines += (gauge_lines("db_replica_in_use", "Conexiones de la réplica prestadas ahora",
+                              [({}, replica_pool.in_use if replica_pool else 0)])
+                  + gauge_lines("db_replica_state", "0 = al día, 1 = con retraso, 2 = caída",
+                                [({}, estados[db.replica.state])])
+                  + gauge_lines("db_replica_lag_seconds", "Último retraso medido (-1 = desconocido)",
+                                [({}, -1 if db.replica.lag is None else db.replica.lag)]))
+    return lines
+
+
+def render():
+    """Texto en formato de exposición de Prometheus."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    lines.extend(_pool_lines())
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,316 @@
+import json
+import os
+import re
+
+from db import db_connection
+
+
+# ==========================================
+# MARK: MIGRACIONES VERSIONADAS
+# ==========================================
+# Cada archivo migrations/NNNN_descripcion.sql es una versión. Se aplican en orden,
+# cada una en su propia transacción, y quedan registradas en schema_migrations.
+# Uso: flask --app videojuego migrate
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d+)_(.+)\.sql$")
+
+# Clave del advisory lock: evita que dos workers migren a la vez en un deploy
+MIGRATION_LOCK = 7_355_001
+
+
+def available_migrations():
+    """Lista ordenada de (version, nombre, ruta) encontradas en migrations/."""
+    migrations = []
+
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+
+    return sorted(migrations)
+
+
+def applied_versions(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version     INTEGER PRIMARY KEY,
+            nombre      TEXT        NOT NULL,
+            aplicada_en TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+    """)
+    cur.execute("SELECT version FROM schema_migrations;")
+    return {row[0] for row in cur.fetchall()}
+
+
+def run_migrations(target=None):
+    """
+    Aplica las migraciones pendientes (hasta target si se indica).
+    Devuelve la lista de versiones aplicadas en esta ejecución.
+    """
+    applied_now = []
+
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK,))
+
+        try:
+            done = applied_versions(cur)
+            conn.commit()
+
+            for version, nombre, path in available_migrations():
+                if version in done or (target is not None and version > target):
+                    continue
+
+                with open(path, encoding="utf-8") as f:
+                    sql = f.read()
+
+                print(f"⬆️ Aplicando migración {version:04d}_{nombre}...")
+                cur.execute(sql)
+                cur.execute("""
+                    INSERT INTO schema_migrations (version, nombre) VALUES (%s, %s);
+                """, (version, nombre))
+                conn.commit()
+                applied_now.append(version)
+
+        finally:
+            conn.rollback()
+            cur.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK,))
+            conn.commit()
+
+    return applied_now
+
+
+def migration_status():
+    """[(version, nombre, aplicada)] para mostrar en la CLI."""
+    with db_connection() as conn, conn.cursor() as cur:
+        done = applied_versions(cur)
+        conn.commit()
+
+    return [(version, nombre, version in done) for version, nombre, _ in available_migrations()]
+
+
+# ==========================================
+# MARK: VERIFICACIÓN DE PLANES (EXPLAIN)
+# ==========================================
+# Consultas de las rutas más visitadas, con parámetros de ejemplo y el índice que
+# debe resolver su predicado en cada tabla: (nombre, sql, params, {tabla: índice}).
+# Falla si una tabla se recorre con Seq Scan, o si la tabla esperada no se lee con
+# su índice como Index Cond (p. ej. "Index Scan using personaje_pkey" + Filter
+# cuando faltaba personaje_jugador_idx).
+HOT_QUERIES = [
+    ("login", """
+        SELECT id_jugador, nombre_usuario, contrasena_hash
+        FROM jugador
+        WHERE correo_electronico = %s;
+    """, ("jugador1@example.com",), {"jugador": "jugador_correo_electronico_key"}),
+
+    ("lobby", """
+        SELECT j.id_jugador, j.nombre_usuario, j.experiencia, j.nivel,
+               p.id_personaje, p.nombre, p.nivel, p.clase,
+               m.id_mascota, m.nombre_mascota, m.tipo, m.nivel
+        FROM jugador j
+        LEFT JOIN personaje p ON p.id_personaje = j.id_personaje_activo
+        LEFT JOIN mascota m ON m.id_mascota = j.id_mascota_activa
+        WHERE j.id_jugador = %s;
+    """, (1,), {"jugador": "jugador_pkey", "personaje": "personaje_pkey", "mascota": "mascota_pkey"}),
+
+    ("personajes", """
+        SELECT id_personaje, nombre, clase, nivel
+        FROM personaje
+        WHERE id_jugador = %s
+        ORDER BY id_personaje;
+    """, (1,), {"personaje": "personaje_jugador_idx"}),
+
+    ("pagina_personajes", """
+        SELECT id_personaje, nombre, clase, nivel
+        FROM personaje
+        WHERE id_jugador = %s AND id_personaje > %s
+        ORDER BY id_personaje
+        LIMIT %s;
+    """, (1, 0, 51), {"personaje": "personaje_jugador_idx"}),
+
+    ("mascotas", """
+        SELECT m.id_mascota, m.nombre_mascota, m.tipo, m.nivel
+        FROM mascota m
+        JOIN personaje p ON m.id_personaje = p.id_personaje
+        WHERE p.id_jugador = %s
+        ORDER BY m.id_mascota;
+    """, (1,), {"personaje": "personaje_jugador_idx", "mascota": "mascota_personaje_idx"}),
+
+    ("api_personaje", """
+        SELECT id_personaje, nombre, clase, nivel
+        FROM personaje
+        WHERE id_personaje = %s;
+    """, (1,), {"personaje": "personaje_pkey"}),
+
+    ("api_mascota", """
+        SELECT id_mascota, nombre_mascota, tipo, nivel
+        FROM mascota
+        WHERE id_mascota = %s;
+    """, (1,), {"mascota": "mascota_pkey"}),
+
+    ("api_personajes_lote", """
+        SELECT id_personaje, nombre, clase, nivel
+        FROM personaje
+        WHERE id_personaje = ANY(%s);
+    """, ([1, 2, 3],), {"personaje": "personaje_pkey"}),
+
+    ("inventario", """
+        SELECT o.id_objeto, i.cantidad, a.dano_base, ar.valor_defensa, po.efecto
+        FROM inventario i
+        JOIN objeto o ON o.id_objeto = i.id_objeto
+        LEFT JOIN arma a ON a.id_objeto = i.id_objeto
+        LEFT JOIN armadura ar ON ar.id_objeto = i.id_objeto
+        LEFT JOIN pocion po ON po.id_objeto = i.id_objeto
+        WHERE i.id_personaje = %s
+        ORDER BY o.id_objeto;
+    """, (1,), {"inventario": "inventario_pkey"}),
+
+    ("api_personajes_mascotas", """
+        SELECT p.id_personaje, count(m.id_mascota)
+        FROM personaje p
+        LEFT JOIN mascota m ON m.id_personaje = p.id_personaje
+        WHERE p.id_personaje = ANY(%s)
+        GROUP BY p.id_personaje;
+    """, ([1, 2, 3],), {"personaje": "personaje_pkey", "mascota": "mascota_personaje_idx"}),
+
+    ("ranking_refresco", """
+        SELECT id_personaje, id_jugador, clase, puntuacion
+        FROM ranking_personaje
+        WHERE actualizado_en > NOW() - make_interval(secs => %s);
+    """, (35,), {"ranking_personaje": "ranking_personaje_actualizado_idx"}),
+
+    ("victorias_jugador", """
+        SELECT id_jugador, SUM(victorias)
+        FROM ranking_personaje
+        WHERE id_jugador = ANY(%s)
+        GROUP BY id_jugador;
+    """, ([1, 2, 3],), {"ranking_personaje": "ranking_personaje_jugador_idx"}),
+
+    ("logros", """
+        SELECT l.id_logro, l.nombre_logro, l.descripcion_logro, o.fecha_desbloqueo
+        FROM logro l
+        LEFT JOIN obtiene o ON o.id_logro = l.id_logro AND o.id_jugador = %s
+        ORDER BY o.fecha_desbloqueo IS NULL, o.fecha_desbloqueo, l.id_logro;
+    """, (1,), {"obtiene": "obtiene_pkey"}),
+
+    ("roster_gremio", """
+        SELECT j.id_jugador, j.nombre_usuario, j.nivel, p.nombre, m.nombre_mascota
+        FROM pertenece pe
+        JOIN jugador j ON j.id_jugador = pe.id_jugador
+        LEFT JOIN personaje p ON p.id_personaje = j.id_personaje_activo
+        LEFT JOIN mascota m ON m.id_mascota = j.id_mascota_activa
+        WHERE pe.id_gremio = %s AND pe.id_jugador > %s
+        ORDER BY pe.id_jugador
+        LIMIT %s;
+    """, (1, 0, 51), {"pertenece": "pertenece_gremio_jugador_idx"}),
+
+    ("ajuste_resumen_gremios", """
+        SELECT pe.id_gremio, SUM(v.nivel)
+        FROM unnest(%s::int[], %s::int[]) AS v(id_jugador, nivel)
+        JOIN pertenece pe ON pe.id_jugador = v.id_jugador
+        GROUP BY pe.id_gremio;
+    """, ([1, 2], [1, 1]), {"pertenece": "pertenece_pkey"}),
+
+    ("jugadores_en_linea", """
+        SELECT count(*)
+        FROM jugador
+        WHERE fecha_hora >= NOW() - make_interval(secs => %s);
+    """, (300,), {"jugador": "jugador_fecha_hora_idx"}),
+
+    ("jugadores_inactivos", """
+        SELECT id_jugador, nombre_usuario, nivel, fecha_hora, direccion_ip
+        FROM jugador
+        WHERE fecha_hora < NOW() - make_interval(days => %s)
+        AND (fecha_hora, id_jugador) > (%s::timestamptz, %s)
+        ORDER BY fecha_hora, id_jugador
+        LIMIT %s;
+    """, (30, '-infinity', 0, 51), {"jugador": "jugador_fecha_hora_idx"}),
+
+    ("reportes_delta", """
+        SELECT pa.id_personaje, COUNT(*), SUM(pa.puntuacion), SUM(pt.duracion)
+        FROM partida pt
+        JOIN participa pa ON pa.id_partida = pt.id_partida
+        WHERE pt.id_partida > %s AND pt.id_partida <= %s
+        GROUP BY pa.id_personaje;
+    """, (0, 100), {"partida": "partida_pkey", "participa": "participa_partida_idx"}),
+
+    ("reporte_jugador", """
+        SELECT e.id_personaje, e.partidas, e.victorias, e.puntuacion_total
+        FROM estadistica_personaje e
+        WHERE e.id_jugador = %s;
+    """, (1,), {"estadistica_personaje": "estadistica_personaje_jugador_idx"}),
+]
+
+
+def _bitmap_indexes(plan):
+    # Bitmap Index Scan bajo un Bitmap Heap Scan (directos o dentro de BitmapAnd/Or)
+    for child in plan.get("Plans", []):
+        if child.get("Node Type") == "Bitmap Index Scan":
+            yield child
+        else:
+            yield from _bitmap_indexes(child)
+
+
+def _scans(plan):
+    # Recorre el árbol del plan JSON: [(tabla, tipo de nodo, índice, filtra con Index Cond)]
+    found = []
+    table = plan.get("Relation Name")
+
+    if plan.get("Node Type") == "Bitmap Heap Scan":
+        for index in _bitmap_indexes(plan):
+            found.append((table, "Bitmap Heap Scan", index.get("Index Name"), "Index Cond" in index))
+    elif table:
+        found.append((table, plan.get("Node Type"), plan.get("Index Name"), "Index Cond" in plan))
+
+    for child in plan.get("Plans", []):
+        found.extend(_scans(child))
+    return found
+
+
+def _plan_problems(scans, expected):
+    problems = [f"Seq Scan sobre {table}" for table, node, _, _ in scans if node == "Seq Scan"]
+
+    for table, index in expected.items():
+        used = [s for s in scans if s[0] == table]
+        if any(s[2] == index and s[3] for s in used):
+            continue
+
+        if not used:
+            problems.append(f"{table} no aparece en el plan (se esperaba {index})")
+        else:
+            vistos = ", ".join(f"{node} {idx or ''}{'' if cond else ' sin Index Cond'}".strip()
+                               for _, node, idx, cond in used)
+            problems.append(f"{table} no filtra con {index} ({vistos})")
+
+    return problems
+
+
+def check_query_plans(queries=HOT_QUERIES):
+    """
+    Ejecuta EXPLAIN de cada consulta frecuente y devuelve {nombre: [problemas]}
+    (vacío si cada tabla esperada se filtra con su índice). Conviene correrlo sobre
+    un dataset sembrado.
+
+    Se desactiva enable_seqscan dentro de la transacción para que el resultado no
+    dependa de que la tabla de pruebas sea pequeña. Por eso no basta con buscar
+    Seq Scans: sin el índice correcto el planner recorre otro (la PK) y filtra
+    después, así que se comprueba qué índice lleva el predicado como Index Cond.
+    """
+    failures = {}
+
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_seqscan = off;")
+
+        for nombre, sql, params, expected in queries:
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cur.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+
+            problems = _plan_problems(_scans(plan[0]["Plan"]), expected)
+            if problems:
+                failures[nombre] = problems
+
+        conn.rollback()
+
+    return failures
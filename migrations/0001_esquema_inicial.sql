@@ -0,0 +1,139 @@
+-- ==========================================
+-- 0001 — Esquema inicial (modelo relacional del README)
+-- ==========================================
+-- Se usa IF NOT EXISTS para poder adoptar la base de Supabase que ya tiene las tablas.
+
+CREATE EXTENSION IF NOT EXISTS pgcrypto;
+
+-- ==== ENTIDADES PRINCIPALES ====
+CREATE TABLE IF NOT EXISTS jugador (
+    id_jugador           SERIAL PRIMARY KEY,
+    nombre_usuario       VARCHAR(50)  NOT NULL,
+    correo_electronico   VARCHAR(255) NOT NULL UNIQUE,
+    contrasena_hash      TEXT         NOT NULL,
+    experiencia          INTEGER      NOT NULL DEFAULT 0,
+    nivel                INTEGER      NOT NULL DEFAULT 1,
+    fecha_hora           TIMESTAMPTZ,
+    direccion_ip         INET,
+    id_personaje_activo  INTEGER,
+    id_mascota_activa    INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS personaje (
+    id_personaje  SERIAL PRIMARY KEY,
+    id_jugador    INTEGER     NOT NULL REFERENCES jugador (id_jugador) ON DELETE CASCADE,
+    nombre        VARCHAR(50) NOT NULL,
+    clase         VARCHAR(50) NOT NULL,
+    nivel         INTEGER     NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS mascota (
+    id_mascota      SERIAL PRIMARY KEY,
+    id_personaje    INTEGER     NOT NULL REFERENCES personaje (id_personaje) ON DELETE CASCADE,
+    nombre_mascota  VARCHAR(50) NOT NULL,
+    tipo            VARCHAR(50) NOT NULL,
+    nivel           INTEGER     NOT NULL DEFAULT 1
+);
+
+-- Personaje y mascota activos del jugador (referencia circular → se añaden después)
+DO $$
+BEGIN
+    ALTER TABLE jugador
+        ADD CONSTRAINT jugador_personaje_activo_fk
+        FOREIGN KEY (id_personaje_activo) REFERENCES personaje (id_personaje) ON DELETE SET NULL;
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$
+BEGIN
+    ALTER TABLE jugador
+        ADD CONSTRAINT jugador_mascota_activa_fk
+        FOREIGN KEY (id_mascota_activa) REFERENCES mascota (id_mascota) ON DELETE SET NULL;
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+-- ==== OBJETOS Y SUBTIPOS (HERENCIA 1:1) ====
+CREATE TABLE IF NOT EXISTS objeto (
+    id_objeto    SERIAL PRIMARY KEY,
+    nombre       VARCHAR(100) NOT NULL,
+    descripcion  TEXT,
+    valor        INTEGER      NOT NULL DEFAULT 0,
+    rareza       VARCHAR(30)
+);
+
+CREATE TABLE IF NOT EXISTS pocion (
+    id_objeto  INTEGER PRIMARY KEY REFERENCES objeto (id_objeto) ON DELETE CASCADE,
+    efecto     VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS arma (
+    id_objeto  INTEGER PRIMARY KEY REFERENCES objeto (id_objeto) ON DELETE CASCADE,
+    dano_base  INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS armadura (
+    id_objeto      INTEGER PRIMARY KEY REFERENCES objeto (id_objeto) ON DELETE CASCADE,
+    valor_defensa  INTEGER NOT NULL
+);
+
+-- ==== OTRAS ENTIDADES ====
+CREATE TABLE IF NOT EXISTS habilidad (
+    id_habilidad           SERIAL PRIMARY KEY,
+    nombre_habilidad       VARCHAR(100) NOT NULL,
+    descripcion_habilidad  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS logro (
+    id_logro           SERIAL PRIMARY KEY,
+    nombre_logro       VARCHAR(100) NOT NULL,
+    descripcion_logro  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS gremio (
+    id_gremio        SERIAL PRIMARY KEY,
+    nombre           VARCHAR(100) NOT NULL,
+    fecha_fundacion  DATE NOT NULL DEFAULT CURRENT_DATE
+);
+
+CREATE TABLE IF NOT EXISTS partida (
+    id_partida  SERIAL PRIMARY KEY,
+    fecha_hora  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    duracion    INTEGER     NOT NULL DEFAULT 0,   -- segundos
+    resultado   VARCHAR(20)                       -- 'victoria', 'derrota', 'empate'
+);
+
+-- ==== TABLAS ASOCIATIVAS ====
+CREATE TABLE IF NOT EXISTS pertenece (
+    id_jugador   INTEGER NOT NULL REFERENCES jugador (id_jugador) ON DELETE CASCADE,
+    id_gremio    INTEGER NOT NULL REFERENCES gremio (id_gremio) ON DELETE CASCADE,
+    fecha_union  DATE    NOT NULL DEFAULT CURRENT_DATE,
+    PRIMARY KEY (id_jugador, id_gremio)
+);
+
+CREATE TABLE IF NOT EXISTS habilidad_personaje (
+    id_personaje  INTEGER NOT NULL REFERENCES personaje (id_personaje) ON DELETE CASCADE,
+    id_habilidad  INTEGER NOT NULL REFERENCES habilidad (id_habilidad) ON DELETE CASCADE,
+    nivel         INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (id_personaje, id_habilidad)
+);
+
+CREATE TABLE IF NOT EXISTS inventario (
+    id_personaje  INTEGER NOT NULL REFERENCES personaje (id_personaje) ON DELETE CASCADE,
+    id_objeto     INTEGER NOT NULL REFERENCES objeto (id_objeto) ON DELETE CASCADE,
+    cantidad      INTEGER NOT NULL DEFAULT 1 CHECK (cantidad >= 0),
+    PRIMARY KEY (id_personaje, id_objeto)
+);
+
+CREATE TABLE IF NOT EXISTS participa (
+    id_personaje  INTEGER NOT NULL REFERENCES personaje (id_personaje) ON DELETE CASCADE,
+    id_partida    INTEGER NOT NULL REFERENCES partida (id_partida) ON DELETE CASCADE,
+    puntuacion    INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (id_personaje, id_partida)
+);
+
+CREATE TABLE IF NOT EXISTS obtiene (
+    id_jugador        INTEGER     NOT NULL REFERENCES jugador (id_jugador) ON DELETE CASCADE,
+    id_logro          INTEGER     NOT NULL REFERENCES logro (id_logro) ON DELETE CASCADE,
+    fecha_desbloqueo  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id_jugador, id_logro)
+);
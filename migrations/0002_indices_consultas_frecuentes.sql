@@ -0,0 +1,21 @@
+-- ==========================================
+-- 0002 — Índices para las consultas frecuentes de videojuego.py
+-- ==========================================
+-- jugador WHERE correo_electronico = %s ya usa el índice de la restricción UNIQUE.
+
+-- Lista y paginación keyset de personajes: WHERE id_jugador = %s [AND id_personaje > %s] ORDER BY id_personaje
+CREATE INDEX IF NOT EXISTS personaje_jugador_idx ON personaje (id_jugador, id_personaje);
+
+-- mascota JOIN personaje ON id_personaje y personajes con sus mascotas
+CREATE INDEX IF NOT EXISTS mascota_personaje_idx ON mascota (id_personaje, id_mascota);
+
+-- Claves foráneas del lado "muchos" que no encabezan su PK compuesta
+CREATE INDEX IF NOT EXISTS pertenece_gremio_idx ON pertenece (id_gremio);
+CREATE INDEX IF NOT EXISTS participa_partida_idx ON participa (id_partida);
+CREATE INDEX IF NOT EXISTS inventario_objeto_idx ON inventario (id_objeto);
+CREATE INDEX IF NOT EXISTS obtiene_logro_idx ON obtiene (id_logro);
+CREATE INDEX IF NOT EXISTS habilidad_personaje_habilidad_idx ON habilidad_personaje (id_habilidad);
+
+-- ON DELETE SET NULL de personaje/mascota activos
+CREATE INDEX IF NOT EXISTS jugador_personaje_activo_idx ON jugador (id_personaje_activo);
+CREATE INDEX IF NOT EXISTS jugador_mascota_activa_idx ON jugador (id_mascota_activa);
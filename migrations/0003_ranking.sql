@@ -0,0 +1,25 @@
+-- ==========================================
+-- 0003 — Rollup de puntuaciones para los rankings
+-- ==========================================
+-- Una fila por personaje con su puntuación acumulada en participa. La mantiene
+-- /api/partidas en la misma sentencia que registra la partida; los workers leen
+-- solo las filas con actualizado_en reciente para actualizar su ranking en memoria.
+
+CREATE TABLE IF NOT EXISTS ranking_personaje (
+    id_personaje    INTEGER     PRIMARY KEY REFERENCES personaje (id_personaje) ON DELETE CASCADE,
+    id_jugador      INTEGER     NOT NULL,
+    clase           VARCHAR(50) NOT NULL,
+    puntuacion      BIGINT      NOT NULL DEFAULT 0,
+    partidas        INTEGER     NOT NULL DEFAULT 0,
+    actualizado_en  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS ranking_personaje_actualizado_idx ON ranking_personaje (actualizado_en);
+
+-- Carga inicial desde las partidas que ya existan
+INSERT INTO ranking_personaje (id_personaje, id_jugador, clase, puntuacion, partidas)
+SELECT p.id_personaje, p.id_jugador, p.clase, SUM(pa.puntuacion), COUNT(*)
+FROM participa pa
+JOIN personaje p ON p.id_personaje = pa.id_personaje
+GROUP BY p.id_personaje
+ON CONFLICT (id_personaje) DO NOTHING;
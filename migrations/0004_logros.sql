@@ -0,0 +1,22 @@
+-- ==========================================
+-- 0004 — Soporte para el motor de logros
+-- ==========================================
+-- Las reglas se declaran en achievements.py y se identifican por nombre_logro.
+CREATE UNIQUE INDEX IF NOT EXISTS logro_nombre_idx ON logro (nombre_logro);
+
+-- Victorias acumuladas por personaje: "gana K partidas" se evalúa sin contar participa
+ALTER TABLE ranking_personaje ADD COLUMN IF NOT EXISTS victorias INTEGER NOT NULL DEFAULT 0;
+
+UPDATE ranking_personaje r
+SET victorias = v.victorias
+FROM (
+    SELECT pa.id_personaje, COUNT(*) AS victorias
+    FROM participa pa
+    JOIN partida pt ON pt.id_partida = pa.id_partida
+    WHERE pt.resultado = 'victoria'
+    GROUP BY pa.id_personaje
+) v
+WHERE v.id_personaje = r.id_personaje;
+
+-- Suma de victorias de un jugador tras cada partida
+CREATE INDEX IF NOT EXISTS ranking_personaje_jugador_idx ON ranking_personaje (id_jugador);
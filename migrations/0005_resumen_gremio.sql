@@ -0,0 +1,34 @@
+-- ==========================================
+-- 0005 — Rollup de agregados por gremio
+-- ==========================================
+-- Una fila por gremio con miembros, suma de niveles y puntuación combinada. Se
+-- ajusta con deltas en la misma transacción que la unión/salida, la subida de
+-- nivel o la partida; la página del gremio nunca agrega a todos sus miembros.
+CREATE TABLE IF NOT EXISTS resumen_gremio (
+    id_gremio         INTEGER     PRIMARY KEY REFERENCES gremio (id_gremio) ON DELETE CASCADE,
+    miembros          INTEGER     NOT NULL DEFAULT 0,
+    nivel_total       BIGINT      NOT NULL DEFAULT 0,
+    puntuacion_total  BIGINT      NOT NULL DEFAULT 0,
+    actualizado_en    TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Roster paginado por keyset: WHERE id_gremio = ? AND id_jugador > ? ORDER BY id_jugador
+CREATE INDEX IF NOT EXISTS pertenece_gremio_jugador_idx ON pertenece (id_gremio, id_jugador);
+DROP INDEX IF EXISTS pertenece_gremio_idx;
+
+-- Carga inicial
+INSERT INTO resumen_gremio (id_gremio, miembros, nivel_total, puntuacion_total)
+SELECT g.id_gremio,
+       COUNT(pe.id_jugador),
+       COALESCE(SUM(j.nivel), 0),
+       COALESCE(SUM(r.puntuacion), 0)
+FROM gremio g
+LEFT JOIN pertenece pe ON pe.id_gremio = g.id_gremio
+LEFT JOIN jugador j ON j.id_jugador = pe.id_jugador
+LEFT JOIN (
+    SELECT id_jugador, SUM(puntuacion) AS puntuacion
+    FROM ranking_personaje
+    GROUP BY id_jugador
+) r ON r.id_jugador = pe.id_jugador
+GROUP BY g.id_gremio
+ON CONFLICT (id_gremio) DO NOTHING;
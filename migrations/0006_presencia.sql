@@ -0,0 +1,7 @@
+-- ==========================================
+-- 0006 — Presencia: última conexión de cada jugador
+-- ==========================================
+-- jugador.fecha_hora guarda la última vez que se le vio (se escribe por tandas).
+-- Con este índice "en línea ahora", los conteos de activos/inactivos y la lista
+-- de inactivos por antigüedad son recorridos de rango, no Seq Scan de jugador.
+CREATE INDEX IF NOT EXISTS jugador_fecha_hora_idx ON jugador (fecha_hora, id_jugador);
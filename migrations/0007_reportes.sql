@@ -0,0 +1,41 @@
+-- ==========================================
+-- 0007 — Rollups para los reportes de rendimiento
+-- ==========================================
+-- reports.refresh() suma a estas tablas solo las partidas nuevas desde la marca
+-- de agua (reporte_watermark.ultima_partida); los reportes nunca agregan participa.
+CREATE TABLE IF NOT EXISTS estadistica_personaje (
+    id_personaje      INTEGER     PRIMARY KEY REFERENCES personaje (id_personaje) ON DELETE CASCADE,
+    id_jugador        INTEGER     NOT NULL,
+    clase             VARCHAR(50) NOT NULL,
+    partidas          INTEGER     NOT NULL DEFAULT 0,
+    victorias         INTEGER     NOT NULL DEFAULT 0,
+    derrotas          INTEGER     NOT NULL DEFAULT 0,
+    empates           INTEGER     NOT NULL DEFAULT 0,
+    puntuacion_total  BIGINT      NOT NULL DEFAULT 0,
+    duracion_total    BIGINT      NOT NULL DEFAULT 0,   -- segundos
+    actualizado_en    TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS estadistica_personaje_jugador_idx ON estadistica_personaje (id_jugador);
+
+-- Por clase del personaje en el momento de jugar (no se recalcula si cambia de clase)
+CREATE TABLE IF NOT EXISTS estadistica_clase (
+    clase             VARCHAR(50) PRIMARY KEY,
+    partidas          BIGINT      NOT NULL DEFAULT 0,
+    victorias         BIGINT      NOT NULL DEFAULT 0,
+    derrotas          BIGINT      NOT NULL DEFAULT 0,
+    empates           BIGINT      NOT NULL DEFAULT 0,
+    puntuacion_total  BIGINT      NOT NULL DEFAULT 0,
+    duracion_total    BIGINT      NOT NULL DEFAULT 0,
+    actualizado_en    TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS reporte_watermark (
+    nombre          TEXT        PRIMARY KEY,
+    ultima_partida  INTEGER     NOT NULL DEFAULT 0,
+    actualizado_en  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Se empieza desde cero: el primer refresco procesa todo el histórico
+INSERT INTO reporte_watermark (nombre) VALUES ('estadisticas')
+ON CONFLICT (nombre) DO NOTHING;
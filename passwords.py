@@ -0,0 +1,120 @@
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+from dotenv import load_dotenv
+
+# El coste y el tamaño del pool se leen al importar
+load_dotenv()
+
+
+# ==========================================
+# MARK: HASHING DE CONTRASEÑAS (APP, NO POSTGRES)
+# ==========================================
+# Antes se hacía crypt(%s, gen_salt('bf')) dentro de la base: una ráfaga de logins
+# saturaba la CPU compartida de Supabase. Ahora bcrypt corre en un pool de procesos
+# acotado en la app y la base solo busca por correo_electronico.
+#
+# Los hashes existentes de pgcrypto ($2a$06$...) son bcrypt estándar y se verifican
+# igual; al iniciar sesión se re-hashean con el coste configurado.
+def password_settings():
+    return {
+        "rounds": int(os.getenv("BCRYPT_ROUNDS", "12")),          # Coste (log2 de iteraciones)
+        "workers": int(os.getenv("PASSWORD_WORKERS", "2")),       # Procesos dedicados a hashing
+        "max_pending": int(os.getenv("PASSWORD_QUEUE", "32")),    # Trabajos en cola como máximo
+        "timeout": float(os.getenv("PASSWORD_QUEUE_TIMEOUT", "5")),
+    }
+
+
+BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+
+
+class PasswordPoolBusy(Exception):
+    """La cola de hashing está llena; el cliente debe reintentar más tarde."""
+
+    retry_after = 1
+
+
+# ---- Funciones que corren en los procesos del pool ----
+def _encode(password):
+    # bcrypt solo usa los primeros 72 bytes (pgcrypto también los trunca)
+    return password.encode("utf-8")[:72]
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(_encode(password), bcrypt.gensalt(rounds=rounds)).decode("ascii")
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(_encode(password), hashed.encode("ascii"))
+
+
+# ==========================================
+# MARK: POOL DE PROCESOS POR WORKER
+# ==========================================
+class PasswordHasher:
+    """
+    Ejecuta bcrypt en un ProcessPoolExecutor con cola acotada.
+    Se crea de forma perezosa en cada worker (no sobrevive a un fork).
+    """
+
+    def __init__(self, rounds=12, workers=2, max_pending=32, timeout=5):
+        self.rounds = rounds
+        self.workers = workers
+        self.timeout = timeout
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password, hashed):
+        """
+        True/False si el hash es bcrypt; ValueError si tiene otro formato
+        (p. ej. un hash md5 antiguo de pgcrypto, que se verifica en SQL).
+        """
+        if not hashed or not hashed.startswith(BCRYPT_PREFIXES):
+            raise ValueError("Formato de hash no soportado")
+        return self._run(_check, password, hashed)
+
+    def needs_rehash(self, hashed):
+        # $2b$<coste>$... → se re-hashea si no es $2b$ o el coste cambió
+        try:
+            prefix, cost = hashed.split("$")[1:3]
+            return prefix != "2b" or int(cost) != self.rounds
+        except (AttributeError, ValueError):
+            return True
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # ---- Internos ----
+    def _run(self, fn, *args):
+        if not self._pending.acquire(timeout=self.timeout):
+            raise PasswordPoolBusy("Demasiados inicios de sesión simultáneos")
+
+        try:
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._pending.release()
+
+    def _get_executor(self):
+        if self._executor is not None and self._pid == os.getpid():
+            return self._executor
+
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+
+hasher = PasswordHasher(**password_settings())
+atexit.register(hasher.shutdown)
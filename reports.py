@@ -0,0 +1,183 @@
+import os
+
+from dotenv import load_dotenv
+
+from db import db_connection
+
+# El retraso de seguridad y el tamaño de cada pasada se leen al importar
+load_dotenv()
+
+
+# ==========================================
+# MARK: REFRESCO INCREMENTAL DE LOS ROLLUPS
+# ==========================================
+# Marca de agua = última id_partida ya sumada. Cada pasada suma a
+# estadistica_personaje y estadistica_clase solo las partidas (marca, hasta].
+#
+# Las partidas más recientes que REPORTES_RETRASO segundos se dejan para la
+# siguiente pasada: así una transacción que tomó su id_partida pero aún no hizo
+# commit no queda por detrás de la marca (y fuera del reporte) para siempre.
+WATERMARK = "estadisticas"
+REPORTES_RETRASO = int(os.getenv("REPORTES_RETRASO", "60"))
+REPORTES_LOTE = int(os.getenv("REPORTES_LOTE", "50000"))  # Partidas por pasada (y transacción)
+
+
+def refresh_once(lag=REPORTES_RETRASO, batch=REPORTES_LOTE):
+    """
+    Una pasada en una transacción. Devuelve (desde, hasta, personajes_actualizados);
+    desde == hasta si no había nada nuevo.
+    """
+    with db_connection() as conn, conn.cursor() as cur:
+        # FOR UPDATE: dos crons a la vez se turnan en vez de sumar dos veces
+        cur.execute("""
+            SELECT ultima_partida FROM reporte_watermark WHERE nombre = %s FOR UPDATE;
+        """, (WATERMARK,))
+        desde = cur.fetchone()[0]
+
+        # Hasta la primera partida todavía "reciente" (o la última, si no hay ninguna)
+        cur.execute("""
+            SELECT LEAST(
+                %s + %s,
+                COALESCE(
+                    (SELECT min(id_partida) - 1 FROM partida
+                     WHERE id_partida > %s AND fecha_hora >= NOW() - make_interval(secs => %s)),
+                    (SELECT max(id_partida) FROM partida),
+                    %s
+                )
+            );
+        """, (desde, batch, desde, lag, desde))
+        hasta = cur.fetchone()[0]
+
+        if hasta <= desde:
+            conn.rollback()
+            return desde, desde, 0
+
+        cur.execute("""
+            WITH delta AS (
+                SELECT pa.id_personaje, p.id_jugador, p.clase,
+                       COUNT(*) AS partidas,
+                       COUNT(*) FILTER (WHERE pt.resultado = 'victoria') AS victorias,
+                       COUNT(*) FILTER (WHERE pt.resultado = 'derrota') AS derrotas,
+                       COUNT(*) FILTER (WHERE pt.resultado = 'empate') AS empates,
+                       SUM(pa.puntuacion) AS puntuacion,
+                       SUM(pt.duracion) AS duracion
+                FROM partida pt
+                JOIN participa pa ON pa.id_partida = pt.id_partida
+                JOIN personaje p ON p.id_personaje = pa.id_personaje
+                WHERE pt.id_partida > %s AND pt.id_partida <= %s
+                GROUP BY pa.id_personaje, p.id_jugador, p.clase
+            ),
+            por_clase AS (
+                INSERT INTO estadistica_clase AS e
+                    (clase, partidas, victorias, derrotas, empates, puntuacion_total, duracion_total)
+                SELECT clase, SUM(partidas), SUM(victorias), SUM(derrotas), SUM(empates),
+                       SUM(puntuacion), SUM(duracion)
+                FROM delta
+                GROUP BY clase
+                ON CONFLICT (clase) DO UPDATE
+                SET partidas = e.partidas + EXCLUDED.partidas,
+                    victorias = e.victorias + EXCLUDED.victorias,
+                    derrotas = e.derrotas + EXCLUDED.derrotas,
+                    empates = e.empates + EXCLUDED.empates,
+                    puntuacion_total = e.puntuacion_total + EXCLUDED.puntuacion_total,
+                    duracion_total = e.duracion_total + EXCLUDED.duracion_total,
+                    actualizado_en = NOW()
+            )
+            INSERT INTO estadistica_personaje AS e
+                (id_personaje, id_jugador, clase, partidas, victorias, derrotas, empates,
+                 puntuacion_total, duracion_total)
+            SELECT id_personaje, id_jugador, clase, partidas, victorias, derrotas, empates,
+                   puntuacion, duracion
+            FROM delta
+            ON CONFLICT (id_personaje) DO UPDATE
+            SET clase = EXCLUDED.clase,
+                partidas = e.partidas + EXCLUDED.partidas,
+                victorias = e.victorias + EXCLUDED.victorias,
+                derrotas = e.derrotas + EXCLUDED.derrotas,
+                empates = e.empates + EXCLUDED.empates,
+                puntuacion_total = e.puntuacion_total + EXCLUDED.puntuacion_total,
+                duracion_total = e.duracion_total + EXCLUDED.duracion_total,
+                actualizado_en = NOW();
+        """, (desde, hasta))
+        personajes = cur.rowcount
+
+        cur.execute("""
+            UPDATE reporte_watermark
+            SET ultima_partida = %s, actualizado_en = NOW()
+            WHERE nombre = %s;
+        """, (hasta, WATERMARK))
+        conn.commit()
+
+    return desde, hasta, personajes
+
+
+def refresh(lag=REPORTES_RETRASO, batch=REPORTES_LOTE):
+    """Repite pasadas hasta alcanzar el retraso. Devuelve (desde, hasta, personajes)."""
+    inicio = None
+    total = 0
+
+    while True:
+        desde, hasta, personajes = refresh_once(lag, batch)
+        inicio = desde if inicio is None else inicio
+        total += personajes
+        if hasta - desde < batch:
+            return inicio, hasta, total
+
+
+# ==========================================
+# MARK: REPORTES (SOLO LEEN LOS ROLLUPS)
+# ==========================================
+# Los rollups ya van REPORTES_RETRASO segundos por detrás: se leen de la réplica si la hay.
+def _stats(partidas, victorias, derrotas, empates, puntuacion, duracion):
+    return {
+        "partidas": partidas,
+        "victorias": victorias,
+        "derrotas": derrotas,
+        "empates": empates,
+        "tasa_victoria": round(victorias / partidas, 4) if partidas else 0,
+        "puntuacion_media": round(puntuacion / partidas, 2) if partidas else 0,
+        "tiempo_jugado": duracion,  # segundos
+    }
+
+
+def player_report(id_jugador):
+    """Totales del jugador y el desglose por personaje. None si no ha jugado."""
+    with db_connection(readonly=True) as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT e.id_personaje, p.nombre, e.clase, e.partidas, e.victorias, e.derrotas,
+                   e.empates, e.puntuacion_total, e.duracion_total
+            FROM estadistica_personaje e
+            JOIN personaje p ON p.id_personaje = e.id_personaje
+            WHERE e.id_jugador = %s
+            ORDER BY e.partidas DESC, e.id_personaje;
+        """, (id_jugador,))
+
+        filas = cur.fetchall()
+
+    if not filas:
+        return None
+
+    totales = [sum(f[i] for f in filas) for i in range(3, 9)]
+    return dict(_stats(*totales), id_jugador=id_jugador, personajes=[
+        dict(_stats(*f[3:9]), id_personaje=f[0], nombre=f[1], clase=f[2]) for f in filas
+    ])
+
+
+def class_report():
+    with db_connection(readonly=True) as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT clase, partidas, victorias, derrotas, empates, puntuacion_total, duracion_total
+            FROM estadistica_clase
+            ORDER BY partidas DESC, clase;
+        """)
+
+        return [dict(_stats(*f[1:7]), clase=f[0]) for f in cur.fetchall()]
+
+
+def watermark():
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT ultima_partida, actualizado_en FROM reporte_watermark WHERE nombre = %s;
+        """, (WATERMARK,))
+
+        return cur.fetchone()
@@ -1,9 +1,23 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, session, flash
+from flask import Flask, Response, render_template, stream_template, request, redirect, url_for, jsonify, session, flash, has_request_context
+from werkzeug.middleware.proxy_fix import ProxyFix
+import os, sys, json, hashlib, time
+import click
 import psycopg2
-import os
+from datetime import datetime, timezone
 from dotenv import load_dotenv
-import threading, time, requests
-from psycopg2 import pool
+
+from achievements import engine as logros_engine
+from admission import Overloaded, RateLimited
+from cache import TTLCache
+from coalescer import BufferFull, WriteBuffer
+from db import DatabaseUnavailable, breaker, close_pool, db_connection, replica, warm_pool
+from leaderboard import leaderboard
+from passwords import PasswordPoolBusy, hasher
+import admission
+import assets
+import bulk
+import metrics
+import reports
 
 # ==========================================
 # MARK: CONFIGURACIÓN INICIAL
@@ -17,48 +31,94 @@ app = Flask(__name__)
 # Clave para manejar sesiones seguras (cookies firmadas)
 app.secret_key = os.getenv("SECRET_KEY", "clave_segura_para_sesiones")
 
+# Detrás del proxy de Render la IP real llega en X-Forwarded-For. Solo se confía en
+# tantos saltos como indique PROXY_SALTOS (0 = conexión directa, no se lee la cabecera).
+if int(os.getenv("PROXY_SALTOS", "0")):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.getenv("PROXY_SALTOS")), x_proto=1)
+
+# URLs con hash del contenido y caché inmutable para los archivos de static/dist/
+assets.init_app(app)
+
+# Latencia por ruta, consultas por request, espera del pool y log de consultas lentas
+metrics.init_app(app)
+
+# Token buckets por IP/sesión y límite de requests simultáneos (después de las
+# métricas: los rechazos también cuentan en la latencia por ruta)
+admission.init_app(app)
+
 
 # ==========================================
 # MARK: CONEXIÓN A LA BASE DE DATOS (POOL CONNECTION)
 # ==========================================
-# Esta función administra la conexión con Supabase usando un POOL de conexiones.
+# El pool vive en db.py: es thread-safe, se crea una vez por worker y
+# db_connection() garantiza que la conexión siempre vuelve al pool.
 # Motivo: evitar que Render duerma la app, reducir latencia y prevenir caídas por reconexión constante.
-def get_db_connection(max_retries=12, wait_time=10):
-    import psycopg2, os, time
 
-    for attempt in range(max_retries):
-        try:
-            # Si el pool no existe, se crea
-            if not hasattr(app, 'db_pool') or app.db_pool is None:
-                app.db_pool = psycopg2.pool.SimpleConnectionPool(
-                    minconn=1,        # Conexión mínima
-                    maxconn=5,        # Máximo de conexiones simultáneas
-                    dsn=os.getenv("DATABASE_URL"),
-                    sslmode='require' # Requerido para Supabase
-                )
-                print("✅ Pool de conexiones creado correctamente.")
+# Si la base está caída el circuit breaker lanza DatabaseUnavailable al instante:
+# se responde 503 + Retry-After en vez de bloquear el worker reintentando.
+@app.errorhandler(DatabaseUnavailable)
+def base_no_disponible(e):
+    headers = {"Retry-After": str(e.retry_after)}
 
-            # Se obtiene una conexión activa del pool
-            conn = app.db_pool.getconn()
-            return conn
+    # Las llamadas fetch() de las plantillas y las APIs esperan JSON
+    if request.path.startswith('/api/') or request.method != 'GET':
+        return jsonify({"error": "Base de datos no disponible, reintenta en unos segundos."}), 503, headers
+
+    return "Base de datos no disponible, reintenta en unos segundos.", 503, headers
+
+
+# ==== RÉPLICA DE LECTURA ====
+# Con DATABASE_REPLICA_URL las consultas de solo lectura de los GET van a la réplica
+# (db.py vuelve a la primaria si está caída o atrasada). Quien acaba de escribir
+# (p. ej. seleccionar_personaje y luego el lobby) lee de la primaria durante
+# DB_READ_YOUR_WRITES segundos para ver su propio cambio.
+LEER_PRIMARIA_TRAS_ESCRIBIR = float(os.getenv("DB_READ_YOUR_WRITES", "10"))
+
+
+def lectura():
+    """db_connection() para un bloque que solo lee; decide si puede ir a la réplica."""
+    if not has_request_context():
+        return db_connection()
+
+    # Un POST que escribe y después lista (personajes, mascotas) debe verse a sí mismo
+    escribio = request.method not in ('GET', 'HEAD') or session.get('leer_primaria_hasta', 0) > time.time()
+    return db_connection(readonly=not escribio)
+
+
+@app.after_request
+def marcar_escritura(response):
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and 'id_jugador' in session:
+        session['leer_primaria_hasta'] = time.time() + LEER_PRIMARIA_TRAS_ESCRIBIR
+    return response
 
-        except Exception as e:
-            # Error al conectar → se informa y se reintenta tras esperar
-            print(f"⚠️ Intento {attempt+1}/{max_retries} fallido para conectar: {e}")
 
-            # Se reinicia el pool para evitar errores de estado corrupto
-            if hasattr(app, 'db_pool'):
-                app.db_pool = None
+# Ráfaga de logins: la cola de bcrypt está llena → 503 en vez de encolar sin límite
+@app.errorhandler(PasswordPoolBusy)
+def hashing_saturado(e):
+    return "Demasiados inicios de sesión simultáneos, reintenta en unos segundos.", 503, {"Retry-After": str(e.retry_after)}
 
-            # Identificación de Supabase dormida
-            if "Connection refused" in str(e):
-                print("💤 Supabase parece dormida, esperando que despierte...")
 
-            time.sleep(wait_time)
+# Control de admisión: el cliente superó su ritmo (429) o no hubo hueco a tiempo (503)
+@app.errorhandler(RateLimited)
+def demasiadas_peticiones(e):
+    headers = {"Retry-After": str(e.retry_after)}
+    if request.path.startswith('/api/') or request.method != 'GET':
+        return jsonify({"error": "Demasiadas peticiones, reintenta en unos segundos."}), 429, headers
+    return "Demasiadas peticiones, reintenta en unos segundos.", 429, headers
 
-    # Luego de varios intentos fallidos:
-    print("❌ No se pudo conectar a la base después de varios intentos prolongados.")
-    raise Exception("Error persistente al conectar a la base de datos.")
+
+@app.errorhandler(Overloaded)
+def servidor_saturado(e):
+    headers = {"Retry-After": str(e.retry_after)}
+    if request.path.startswith('/api/') or request.method != 'GET':
+        return jsonify({"error": "Servidor saturado, reintenta en unos segundos."}), 503, headers
+    return "Servidor saturado, reintenta en unos segundos.", 503, headers
+
+
+# Ingesta de XP saturada (el buffer está lleno y la base no da abasto)
+@app.errorhandler(BufferFull)
+def buffer_lleno(e):
+    return jsonify({"error": "Demasiados eventos, reintenta en unos segundos."}), 503, {"Retry-After": str(e.retry_after)}
 
 
 # ==========================================
@@ -71,21 +131,20 @@ def login():
         correo = request.form['correo']
         contrasena = request.form['contrasena']
 
-        # Conexión segura usando parámetros (previene SQL Injection)
-        conn = get_db_connection()
-        cur = conn.cursor()
+        # Conexión segura usando parámetros (previene SQL Injection).
+        # La base solo hace una búsqueda indexada; bcrypt corre en la app.
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT id_jugador, nombre_usuario, contrasena_hash
+                FROM jugador
+                WHERE correo_electronico = %s;
+            """, (correo,))
 
-        # Se usa crypt() para validar contraseña en PostgreSQL
-        cur.execute("""
-            SELECT id_jugador, nombre_usuario
-            FROM jugador
-            WHERE correo_electronico = %s
-            AND contrasena_hash = crypt(%s, contrasena_hash);
-        """, (correo, contrasena))
+            user = cur.fetchone()
 
-        user = cur.fetchone()
-        cur.close()
-        app.db_pool.putconn(conn)
+        # La conexión ya volvió al pool: no se retiene mientras se calcula el hash
+        if user and not verificar_contrasena(user, contrasena):
+            user = None
 
         if user:
             # Se guardan datos mínimos en sesión (NO información sensible)
@@ -100,6 +159,41 @@ def login():
     return render_template('login.html')
 
 
+def verificar_contrasena(user, contrasena):
+    """
+    Verifica con bcrypt en el pool de procesos. Los hashes de pgcrypto siguen
+    siendo válidos y, tras un login correcto, se re-hashean con el coste actual.
+    """
+    id_jugador, _, contrasena_hash = user
+
+    try:
+        valida = hasher.verify(contrasena, contrasena_hash)
+
+    except ValueError:
+        # Hash antiguo que no es bcrypt → se valida con crypt() como antes
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT %s = crypt(%s, %s);", (contrasena_hash, contrasena, contrasena_hash))
+            valida = cur.fetchone()[0]
+
+    if valida and hasher.needs_rehash(contrasena_hash):
+        try:
+            nuevo_hash = hasher.hash(contrasena)
+            with db_connection() as conn, conn.cursor() as cur:
+                # Solo si nadie cambió la contraseña mientras tanto
+                cur.execute("""
+                    UPDATE jugador
+                    SET contrasena_hash = %s
+                    WHERE id_jugador = %s AND contrasena_hash = %s;
+                """, (nuevo_hash, id_jugador, contrasena_hash))
+                conn.commit()
+
+        except Exception as e:
+            # El re-hash es oportunista: si falla, el login sigue siendo válido
+            print("No se pudo actualizar el hash de la contraseña:", e)
+
+    return valida
+
+
 @app.route('/registro', methods=['GET', 'POST'])
 def registro():
     if request.method == 'POST':
@@ -107,23 +201,24 @@ def registro():
         correo = request.form['correo']
         contrasena = request.form['contrasena']
 
-        try:
-            conn = get_db_connection()
-            cur = conn.cursor()
+        # bcrypt en la app (pool de procesos), antes de pedir la conexión
+        contrasena_hash = hasher.hash(contrasena)
 
-            # crypt() + gen_salt('bf') → Hash seguro con Blowfish (similar a bcrypt)
-            cur.execute("""
-                INSERT INTO jugador (nombre_usuario, correo_electronico, contrasena_hash)
-                VALUES (%s, %s, crypt(%s, gen_salt('bf')));
-            """, (usuario, correo, contrasena))
+        try:
+            with db_connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO jugador (nombre_usuario, correo_electronico, contrasena_hash)
+                    VALUES (%s, %s, %s);
+                """, (usuario, correo, contrasena_hash))
 
-            conn.commit()
-            cur.close()
-            app.db_pool.putconn(conn)
+                conn.commit()
 
             flash('Registro exitoso. Ahora puedes iniciar sesión.', 'success')
             return redirect(url_for('login'))
 
+        except DatabaseUnavailable:
+            raise
+
         except Exception as e:
             print("Error al registrar:", e)
             flash('Error: correo duplicado o datos inválidos.', 'error')
@@ -147,6 +242,18 @@ def index():
     return redirect(url_for('login'))
 
 
+# Snapshot del lobby por jugador: es la página más visitada y casi nunca cambia.
+# Se invalida explícitamente al cambiar personaje/mascota activos o al editarlos.
+lobby_cache = TTLCache(
+    maxsize=int(os.getenv("LOBBY_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("LOBBY_CACHE_TTL", "30"))
+)
+
+
+def invalidar_lobby(id_jugador):
+    lobby_cache.pop(id_jugador)
+
+
 @app.route('/lobby')
 def lobby():
     # Si no hay sesión → no se permite acceder
@@ -154,90 +261,147 @@ def lobby():
         flash('Debes iniciar sesión primero.', 'warning')
         return redirect(url_for('login'))
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    snapshot = lobby_cache.get(session['id_jugador'])
 
-    # Se cargan datos esenciales del jugador
-    cur.execute("""
-        SELECT id_jugador, nombre_usuario, experiencia, nivel, id_personaje_activo, id_mascota_activa
-        FROM jugador
-        WHERE id_jugador = %s;
-    """, (session['id_jugador'],))
+    if snapshot is None:
+        snapshot = cargar_lobby(session['id_jugador'])
 
-    jugador_data = cur.fetchone()
+        # Si por alguna razón el usuario no existe (inconsistencia)
+        if snapshot is None:
+            flash("Error al cargar datos del jugador.", "error")
+            return redirect(url_for('logout'))
 
-    # Si por alguna razón el usuario no existe (inconsistencia)
-    if not jugador_data:
-        flash("Error al cargar datos del jugador.", "error")
-        return redirect(url_for('logout'))
+        lobby_cache.set(session['id_jugador'], snapshot)
+
+    # Se envían los datos al Lobby
+    return render_template('lobby.html', **snapshot)
+
+
+def cargar_lobby(id_jugador):
+    """
+    Carga jugador + personaje activo + mascota activa en una sola consulta.
+    Devuelve los diccionarios listos para la plantilla, o None si el jugador no existe.
+    Lee de la primaria: el resultado va a lobby_cache (ver CACHÉ DE LAS APIs JSON).
+    """
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT j.id_jugador, j.nombre_usuario, j.experiencia, j.nivel,
+                   p.id_personaje, p.nombre, p.nivel, p.clase,
+                   m.id_mascota, m.nombre_mascota, m.tipo, m.nivel
+            FROM jugador j
+            LEFT JOIN personaje p ON p.id_personaje = j.id_personaje_activo
+            LEFT JOIN mascota m ON m.id_mascota = j.id_mascota_activa
+            WHERE j.id_jugador = %s;
+        """, (id_jugador,))
+
+        row = cur.fetchone()
+
+    if not row:
+        return None
 
     # Diccionario para enviar al HTML
     jugador = {
-        'id': jugador_data[0],
-        'nombre': jugador_data[1],
-        'experiencia': jugador_data[2],
-        'nivel': jugador_data[3],
-        'xp_porcentaje': jugador_data[2] % 100  # Se simula barra de XP
+        'id': row[0],
+        'nombre': row[1],
+        'experiencia': row[2],
+        'nivel': row[3],
+        'xp_porcentaje': row[2] % 100  # Se simula barra de XP
     }
 
     # ==== PERSONAJE ACTIVO ====
-    cur.execute("""
-        SELECT nombre, nivel, clase
-        FROM personaje
-        WHERE id_personaje = %s;
-    """, (jugador_data[4],))
-
-    personaje_data = cur.fetchone()
-
-    if personaje_data:
+    if row[4] is not None:
         personaje = {
-            'nombre': personaje_data[0],
-            'nivel': personaje_data[1],
-            'clase': personaje_data[2],
-            'imagen': url_for('static', filename='img/personaje01.png')
+            'nombre': row[5],
+            'nivel': row[6],
+            'clase': row[7],
+            'imagen': url_for('static', filename='img/personaje01-400.png'),
+            'imagen_webp': url_for('static', filename='img/personaje01-400.webp')
         }
     else:
         personaje = {
             'nombre': 'Sin personaje activo',
             'nivel': 0,
             'clase': 'N/A',
-            'imagen': url_for('static', filename='img/personaje01.png')
+            'imagen': url_for('static', filename='img/personaje01-400.png'),
+            'imagen_webp': url_for('static', filename='img/personaje01-400.webp')
         }
 
     # ==== MASCOTA ACTIVA ====
-    cur.execute("""
-        SELECT nombre_mascota, tipo, nivel
-        FROM mascota
-        WHERE id_mascota = %s;
-    """, (jugador_data[5],))
-
-    mascota_data = cur.fetchone()
-
-    if mascota_data:
+    if row[8] is not None:
         mascota = {
-            'nombre': mascota_data[0],
-            'tipo': mascota_data[1],
-            'nivel': mascota_data[2],
-            'imagen': url_for('static', filename='img/mascota01.png')
+            'nombre': row[9],
+            'tipo': row[10],
+            'nivel': row[11],
+            'imagen': url_for('static', filename='img/mascota01-400.png'),
+            'imagen_webp': url_for('static', filename='img/mascota01-400.webp')
         }
     else:
         mascota = {
             'nombre': 'Sin mascota activa',
             'tipo': 'N/A',
             'nivel': 0,
-            'imagen': url_for('static', filename='img/mascota01.png')
+            'imagen': url_for('static', filename='img/mascota01-400.png'),
+            'imagen_webp': url_for('static', filename='img/mascota01-400.webp')
         }
 
-    cur.close()
-    app.db_pool.putconn(conn)
+    return {'jugador': jugador, 'personaje': personaje, 'mascota': mascota}
 
-    # Se envían los datos al Lobby
-    return render_template('lobby.html', jugador=jugador, personaje=personaje, mascota=mascota)
+
+# ==========================================
+# MARK: LISTAS PAGINADAS Y EN STREAMING
+# ==========================================
+# Hay cuentas (bots, pruebas) con miles de personajes: las listas nunca se cargan
+# enteras en memoria. El HTML se envía en streaming desde un cursor de servidor
+# y el scroll infinito usa paginación keyset (WHERE id > último ORDER BY id LIMIT n).
+PAGINA_MAX = int(os.getenv("PAGINA_MAX", "100"))
+STREAM_ITERSIZE = int(os.getenv("STREAM_ITERSIZE", "200"))
+
+
+def filas_en_streaming(nombre, consulta, params):
+    """
+    Itera las filas con un cursor con nombre (server-side), trayendo
+    STREAM_ITERSIZE filas por viaje. La consulta se lanza aquí mismo, antes de
+    empezar a responder, para que un fallo de base siga devolviendo un 503.
+    """
+    def generar():
+        with lectura() as conn, conn.cursor(name=nombre) as cur:
+            cur.itersize = STREAM_ITERSIZE
+            cur.execute(consulta, params)
+            yield None  # Consulta lanzada: ya se puede empezar a responder
+            yield from cur
+
+    filas = generar()
+    next(filas)
+    return filas
+
+
+def leer_pagina():
+    # Cursor opaco = último id visto; 0 = primera página
+    despues = request.args.get('despues', 0, type=int)
+    limite = request.args.get('limite', 50, type=int)
+    return max(despues, 0), min(max(limite, 1), PAGINA_MAX)
+
+
+def respuesta_pagina(clave, items, limite, campo_id):
+    # Se pidió limite + 1 filas: si sobra una, hay página siguiente
+    hay_mas = len(items) > limite
+    items = items[:limite]
+
+    return jsonify({
+        clave: items,
+        "siguiente": items[-1][campo_id] if hay_mas else None
+    })
 
 
 # ==========================================
 # MARK: PERSONAJES — CRUD COMPLETO
 # ==========================================
+def id_de_formulario(campo):
+    """Id opcional de un formulario de edición: None si viene vacío, ValueError si no es un entero."""
+    crudo = (request.form.get(campo) or "").strip()
+    return int(crudo) if crudo else None
+
+
 @app.route('/personajes', methods=['GET', 'POST'])
 def personajes():
     # Verificación de sesión
@@ -245,56 +409,95 @@ def personajes():
         flash('Debes iniciar sesión primero.', 'warning')
         return redirect(url_for('login'))
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-
     # *** CREAR O EDITAR PERSONAJE ***
     if request.method == 'POST':
-        id_personaje = request.form.get('id_personaje')
+        try:
+            id_personaje = id_de_formulario('id_personaje')
+        except ValueError:
+            flash('⚠️ El personaje indicado no es válido.', 'error')
+            return redirect(url_for('personajes'))
+
         nombre = request.form['nombre']
         clase = request.form['clase']
         id_jugador = session['id_jugador']
 
-        try:
-            if id_personaje:
-                # Modificar personaje existente
-                cur.execute("""
-                    UPDATE personaje
-                    SET nombre = %s, clase = %s
-                    WHERE id_personaje = %s AND id_jugador = %s;
-                """, (nombre, clase, id_personaje, id_jugador))
-
-                flash('✅ Personaje modificado correctamente.', 'success')
-
-            else:
-                # Crear personaje nuevo
-                cur.execute("""
-                    INSERT INTO personaje (id_jugador, nombre, clase, nivel)
-                    VALUES (%s, %s, %s, 1);
-                """, (id_jugador, nombre, clase))
-
-                flash('🆕 Personaje creado correctamente.', 'success')
-
-            conn.commit()
-
-        except Exception as e:
-            conn.rollback()
-            flash(f'⚠️ Error al guardar personaje: {e}', 'error')
-
-    # Obtener personajes del jugador
-    cur.execute("""
+        movidos = None
+        with db_connection() as conn, conn.cursor() as cur:
+            try:
+                if id_personaje is not None:
+                    # Modificar personaje existente
+                    cur.execute("""
+                        UPDATE personaje
+                        SET nombre = %s, clase = %s
+                        WHERE id_personaje = %s AND id_jugador = %s;
+                    """, (nombre, clase, id_personaje, id_jugador))
+
+                    # Cambiar de clase lo mueve de tablero en los rankings
+                    cur.execute("""
+                        UPDATE ranking_personaje
+                        SET clase = %s, actualizado_en = NOW()
+                        WHERE id_personaje = %s AND id_jugador = %s AND clase <> %s
+                        RETURNING id_personaje, id_jugador, clase, puntuacion;
+                    """, (clase, id_personaje, id_jugador, clase))
+                    movidos = cur.fetchall()
+
+                    flash('✅ Personaje modificado correctamente.', 'success')
+
+                else:
+                    # Crear personaje nuevo
+                    cur.execute("""
+                        INSERT INTO personaje (id_jugador, nombre, clase, nivel)
+                        VALUES (%s, %s, %s, 1);
+                    """, (id_jugador, nombre, clase))
+
+                    flash('🆕 Personaje creado correctamente.', 'success')
+
+                conn.commit()
+
+            except Exception as e:
+                conn.rollback()
+                movidos = None
+                flash(f'⚠️ Error al guardar personaje: {e}', 'error')
+
+        # Tras el único commit y fuera del with: nada de esto puede deshacer la edición
+        if movidos is not None:
+            leaderboard.apply(movidos)
+            invalidar_lobby(id_jugador)
+            personaje_cache.pop(id_personaje)
+
+    # Obtener personajes del jugador (en streaming: nunca están todos en memoria)
+    personajes = filas_en_streaming("lista_personajes", """
         SELECT id_personaje, nombre, clase, nivel
         FROM personaje
         WHERE id_jugador = %s
         ORDER BY id_personaje;
     """, (session['id_jugador'],))
 
-    personajes = cur.fetchall()
+    return stream_template('personajes.html', personajes=personajes)
 
-    cur.close()
-    app.db_pool.putconn(conn)
 
-    return render_template('personajes.html', personajes=personajes)
+@app.route('/api/jugador/personajes')
+def pagina_personajes():
+    """
+    API paginada (keyset) para scroll infinito: ?despues=<id_personaje>&limite=50
+    """
+    if 'id_jugador' not in session:
+        return jsonify({"error": "No autorizado"}), 403
+
+    despues, limite = leer_pagina()
+
+    with lectura() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT id_personaje, nombre, clase, nivel
+            FROM personaje
+            WHERE id_jugador = %s AND id_personaje > %s
+            ORDER BY id_personaje
+            LIMIT %s;
+        """, (session['id_jugador'], despues, limite + 1))
+
+        filas = cur.fetchall()
+
+    return respuesta_pagina("personajes", [personaje_a_dict(f) for f in filas], limite, "id_personaje")
 
 
 # ==== ELIMINAR PERSONAJE ====
@@ -303,25 +506,24 @@ def eliminar_personaje(id_personaje):
     if 'id_jugador' not in session:
         return jsonify({"error": "No autorizado"}), 403
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    try:
-        cur.execute("""
-            DELETE FROM personaje
-            WHERE id_personaje = %s AND id_jugador = %s;
-        """, (id_personaje, session['id_jugador']))
-
-        conn.commit()
-        return jsonify({"success": True})
+    with db_connection() as conn, conn.cursor() as cur:
+        try:
+            cur.execute("""
+                DELETE FROM personaje
+                WHERE id_personaje = %s AND id_jugador = %s;
+            """, (id_personaje, session['id_jugador']))
 
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": str(e)}), 400
+            conn.commit()
+            invalidar_lobby(session['id_jugador'])
+            personaje_cache.pop(id_personaje)
+            leaderboard.remove_personaje(id_personaje)
+            # Sus mascotas pueden haber cambiado (ON DELETE) y no sabemos sus ids
+            mascota_cache.clear()
+            return jsonify({"success": True})
 
-    finally:
-        cur.close()
-        app.db_pool.putconn(conn)
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 400
 
 
 # ==== SELECCIONAR PERSONAJE COMO ACTIVO ====
@@ -330,26 +532,21 @@ def seleccionar_personaje(id_personaje):
     if 'id_jugador' not in session:
         return jsonify({"error": "No autorizado"}), 403
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    try:
-        cur.execute("""
-            UPDATE jugador
-            SET id_personaje_activo = %s
-            WHERE id_jugador = %s;
-        """, (id_personaje, session['id_jugador']))
-
-        conn.commit()
-        return jsonify({"success": True})
+    with db_connection() as conn, conn.cursor() as cur:
+        try:
+            cur.execute("""
+                UPDATE jugador
+                SET id_personaje_activo = %s
+                WHERE id_jugador = %s;
+            """, (id_personaje, session['id_jugador']))
 
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": str(e)}), 400
+            conn.commit()
+            invalidar_lobby(session['id_jugador'])
+            return jsonify({"success": True})
 
-    finally:
-        cur.close()
-        app.db_pool.putconn(conn)
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 400
 
 
 # ==========================================
@@ -361,62 +558,96 @@ def mascotas():
         flash('Debes iniciar sesión primero.', 'warning')
         return redirect(url_for('login'))
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-
     # Crear o modificar mascota
     if request.method == 'POST':
-        id_mascota = request.form.get('id_mascota')
+        try:
+            id_mascota = id_de_formulario('id_mascota')
+        except ValueError:
+            flash('⚠️ La mascota indicada no es válida.', 'error')
+            return redirect(url_for('mascotas'))
+
         nombre = request.form['nombre']
         tipo = request.form['tipo']
         id_jugador = session['id_jugador']
 
-        try:
-            if id_mascota and id_mascota.strip() != "":
-                # Modificar mascota existente
-                cur.execute("""
-                    UPDATE mascota
-                    SET nombre_mascota = %s, tipo = %s
-                    WHERE id_mascota = %s
-                    AND id_personaje IN (
-                        SELECT id_personaje FROM personaje WHERE id_jugador = %s
-                    );
-                """, (nombre, tipo, id_mascota, id_jugador))
-
-                flash('✅ Mascota modificada correctamente.', 'success')
-
-            else:
-                # Crear mascota
-                cur.execute("""
-                    INSERT INTO mascota (id_personaje, nombre_mascota, tipo, nivel)
-                    VALUES (
-                        (SELECT id_personaje FROM personaje WHERE id_jugador = %s LIMIT 1),
-                        %s, %s, 1
-                    );
-                """, (id_jugador, nombre, tipo))
-
-                flash('🆕 Mascota creada correctamente.', 'success')
-
-            conn.commit()
-
-        except Exception as e:
-            conn.rollback()
-            flash(f'⚠️ Error al guardar mascota: {e}', 'error')
-
-    # Obtener mascotas del jugador
-    cur.execute("""
+        guardada = False
+        with db_connection() as conn, conn.cursor() as cur:
+            try:
+                if id_mascota is not None:
+                    # Modificar mascota existente
+                    cur.execute("""
+                        UPDATE mascota
+                        SET nombre_mascota = %s, tipo = %s
+                        WHERE id_mascota = %s
+                        AND id_personaje IN (
+                            SELECT id_personaje FROM personaje WHERE id_jugador = %s
+                        );
+                    """, (nombre, tipo, id_mascota, id_jugador))
+
+                    flash('✅ Mascota modificada correctamente.', 'success')
+
+                else:
+                    # Crear mascota
+                    cur.execute("""
+                        INSERT INTO mascota (id_personaje, nombre_mascota, tipo, nivel)
+                        VALUES (
+                            (SELECT id_personaje FROM personaje WHERE id_jugador = %s LIMIT 1),
+                            %s, %s, 1
+                        );
+                    """, (id_jugador, nombre, tipo))
+
+                    flash('🆕 Mascota creada correctamente.', 'success')
+
+                guardada = cur.rowcount > 0
+                conn.commit()
+
+            except Exception as e:
+                conn.rollback()
+                flash(f'⚠️ Error al guardar mascota: {e}', 'error')
+
+        # Ya fuera del with: la conexión volvió al pool y un fallo aquí no deshace nada.
+        # Solo cuenta una mascota que de verdad se guardó
+        if guardada:
+            if id_mascota is not None:
+                invalidar_lobby(id_jugador)
+                mascota_cache.pop(id_mascota)
+            logros_engine.emit("mascota", id_jugador, tipo=tipo)
+
+    # Obtener mascotas del jugador (en streaming)
+    mascotas = filas_en_streaming("lista_mascotas", """
         SELECT m.id_mascota, m.nombre_mascota, m.tipo, m.nivel
         FROM mascota m
         JOIN personaje p ON m.id_personaje = p.id_personaje
-        WHERE p.id_jugador = %s;
+        WHERE p.id_jugador = %s
+        ORDER BY m.id_mascota;
     """, (session['id_jugador'],))
 
-    mascotas = cur.fetchall()
+    return stream_template('mascotas.html', mascotas=mascotas)
+
 
-    cur.close()
-    app.db_pool.putconn(conn)
+@app.route('/api/jugador/mascotas')
+def pagina_mascotas():
+    """
+    API paginada (keyset) para scroll infinito: ?despues=<id_mascota>&limite=50
+    """
+    if 'id_jugador' not in session:
+        return jsonify({"error": "No autorizado"}), 403
+
+    despues, limite = leer_pagina()
+
+    with lectura() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT m.id_mascota, m.nombre_mascota, m.tipo, m.nivel
+            FROM mascota m
+            JOIN personaje p ON m.id_personaje = p.id_personaje
+            WHERE p.id_jugador = %s AND m.id_mascota > %s
+            ORDER BY m.id_mascota
+            LIMIT %s;
+        """, (session['id_jugador'], despues, limite + 1))
+
+        filas = cur.fetchall()
 
-    return render_template('mascotas.html', mascotas=mascotas)
+    return respuesta_pagina("mascotas", [mascota_a_dict(f) for f in filas], limite, "id_mascota")
 
 
 # ==== ELIMINAR MASCOTA ====
@@ -425,26 +656,22 @@ def eliminar_mascota(id_mascota):
     if 'id_jugador' not in session:
         return jsonify({"error": "No autorizado"}), 403
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    try:
-        cur.execute("""
-            DELETE FROM mascota
-            WHERE id_mascota = %s
-            AND id_personaje IN (SELECT id_personaje FROM personaje WHERE id_jugador = %s);
-        """, (id_mascota, session['id_jugador']))
-
-        conn.commit()
-        return jsonify({"success": True})
+    with db_connection() as conn, conn.cursor() as cur:
+        try:
+            cur.execute("""
+                DELETE FROM mascota
+                WHERE id_mascota = %s
+                AND id_personaje IN (SELECT id_personaje FROM personaje WHERE id_jugador = %s);
+            """, (id_mascota, session['id_jugador']))
 
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": str(e)}), 400
+            conn.commit()
+            invalidar_lobby(session['id_jugador'])
+            mascota_cache.pop(id_mascota)
+            return jsonify({"success": True})
 
-    finally:
-        cur.close()
-        app.db_pool.putconn(conn)
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 400
 
 
 # ==== SELECCIONAR MASCOTA ACTIVA ====
@@ -453,26 +680,21 @@ def seleccionar_mascota(id_mascota):
     if 'id_jugador' not in session:
         return jsonify({"error": "No autorizado"}), 403
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    try:
-        cur.execute("""
-            UPDATE jugador
-            SET id_mascota_activa = %s
-            WHERE id_jugador = %s;
-        """, (id_mascota, session['id_jugador']))
-
-        conn.commit()
-        return jsonify({"success": True})
+    with db_connection() as conn, conn.cursor() as cur:
+        try:
+            cur.execute("""
+                UPDATE jugador
+                SET id_mascota_activa = %s
+                WHERE id_jugador = %s;
+            """, (id_mascota, session['id_jugador']))
 
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": str(e)}), 400
+            conn.commit()
+            invalidar_lobby(session['id_jugador'])
+            return jsonify({"success": True})
 
-    finally:
-        cur.close()
-        app.db_pool.putconn(conn)
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 400
 
 
 # ==========================================
@@ -482,49 +704,185 @@ def seleccionar_mascota(id_mascota):
 def ping():
     """
     Ruta usada por el cron-job para mantener despierta la base.
-    Consulta rápida para evitar que Supabase entre en modo sleep.
+    Informa el estado del circuit breaker; solo consulta la base si está cerrado.
     """
+    estado = breaker.snapshot()
+
+    if estado["state"] != breaker.CLOSED:
+        # El hilo de fondo ya está sondeando: no se bloquea este request
+        return jsonify({"db": "unavailable", "breaker": estado}), 200
+
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT NOW();")
-        cur.fetchone()
-        cur.close()
-        app.db_pool.putconn(conn)
+        with db_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT NOW();")
+            cur.fetchone()
 
-        print("✅ Ping exitoso: conexión a la base activa.")
-        return "OK", 200
+        estado = {"db": "ok", "breaker": breaker.snapshot()}
+        if replica.enabled:
+            estado["replica"] = replica.snapshot()
+        return jsonify(estado), 200
 
     except Exception as e:
         print(f"⚠️ Ping fallido, base posiblemente dormida: {e}")
-        return "Database waking up", 200
+        return jsonify({"db": "unavailable", "breaker": breaker.snapshot()}), 200
+
+
+# ==== CACHÉ DE LAS APIs JSON ====
+# Read-through: la primera consulta va a Postgres, las siguientes salen de memoria.
+# Los UPDATE/DELETE de este módulo invalidan la entrada correspondiente.
+# Las cachés son compartidas por todas las sesiones, así que se llenan SIEMPRE desde
+# la primaria: una lectura de la réplica atrasada volvería a guardar la fila que
+# un escritor acaba de invalidar (y nadie vería su propia escritura hasta el TTL).
+personaje_cache = TTLCache(
+    maxsize=int(os.getenv("API_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("API_CACHE_TTL", "60"))
+)
+mascota_cache = TTLCache(
+    maxsize=int(os.getenv("API_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("API_CACHE_TTL", "60"))
+)
+# Los agregados de un gremio cambian con cada partida de sus miembros: TTL corto
+gremio_cache = TTLCache(
+    maxsize=int(os.getenv("API_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("GREMIO_CACHE_TTL", "15"))
+)
+
+
+def entrada_cache(data):
+    cuerpo = json.dumps(data, sort_keys=True, default=str).encode()
+    return {
+        'data': data,
+        'etag': hashlib.sha1(cuerpo).hexdigest(),
+        'modified': datetime.now(timezone.utc).replace(microsecond=0)
+    }
+
+
+def leer_cacheado(cache, clave, cargar):
+    """
+    Devuelve la entrada cacheada ({data, etag, modified}) o la carga con cargar(clave).
+    Si el registro no existe devuelve None y no se guarda nada.
+    """
+    entrada = cache.get(clave)
+
+    if entrada is None:
+        data = cargar(clave)
+        if data is None:
+            return None
+
+        entrada = entrada_cache(data)
+        cache.set(clave, entrada)
+
+    return entrada
+
+
+def leer_lote(cache, ids, cargar_varios):
+    """
+    Versión por lotes de leer_cacheado: lo que no está en caché se resuelve
+    con UNA consulta (cargar_varios recibe la lista y devuelve {id: data}).
+    """
+    encontrados = {}
+    faltantes = []
+
+    for clave in ids:
+        entrada = cache.get(clave)
+        if entrada is None:
+            faltantes.append(clave)
+        else:
+            encontrados[clave] = entrada['data']
+
+    if faltantes:
+        for clave, data in cargar_varios(faltantes).items():
+            cache.set(clave, entrada_cache(data))
+            encontrados[clave] = data
+
+    return encontrados
+
+
+def respuesta_condicional(entrada):
+    # make_conditional responde 304 si coincide If-None-Match / If-Modified-Since
+    resp = jsonify(entrada['data'])
+    resp.set_etag(entrada['etag'])
+    resp.last_modified = entrada['modified']
+    resp.cache_control.no_cache = True  # El cliente siempre revalida (barato gracias al ETag)
+    return resp.make_conditional(request)
+
+
+def mascota_a_dict(row):
+    return {
+        "id_mascota": row[0],
+        "nombre": row[1],
+        "tipo": row[2],
+        "nivel": row[3]
+    }
+
+
+def personaje_a_dict(row):
+    return {
+        "id_personaje": row[0],
+        "nombre": row[1],
+        "clase": row[2],
+        "nivel": row[3]
+    }
+
+
+def cargar_mascota(id_mascota):
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT id_mascota, nombre_mascota, tipo, nivel
+            FROM mascota
+            WHERE id_mascota = %s;
+        """, (id_mascota,))
+
+        mascota = cur.fetchone()
+
+    return mascota_a_dict(mascota) if mascota else None
+
+
+def cargar_personaje(id_personaje):
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT id_personaje, nombre, clase, nivel
+            FROM personaje
+            WHERE id_personaje = %s;
+        """, (id_personaje,))
+
+        personaje = cur.fetchone()
+
+    return personaje_a_dict(personaje) if personaje else None
+
+
+def cargar_mascotas(ids):
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT id_mascota, nombre_mascota, tipo, nivel
+            FROM mascota
+            WHERE id_mascota = ANY(%s);
+        """, (ids,))
+
+        return {row[0]: mascota_a_dict(row) for row in cur.fetchall()}
+
+
+def cargar_personajes(ids):
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT id_personaje, nombre, clase, nivel
+            FROM personaje
+            WHERE id_personaje = ANY(%s);
+        """, (ids,))
+
+        return {row[0]: personaje_a_dict(row) for row in cur.fetchall()}
 
 
 @app.route('/api/mascota/<int:id_mascota>')
 def obtener_mascota(id_mascota):
     """
     API pública (segura) que devuelve datos de una mascota en formato JSON.
+    Soporta ETag / Last-Modified: si el cliente ya la tiene recibe un 304.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
+    entrada = leer_cacheado(mascota_cache, id_mascota, cargar_mascota)
 
-    cur.execute("""
-        SELECT id_mascota, nombre_mascota, tipo, nivel
-        FROM mascota
-        WHERE id_mascota = %s;
-    """, (id_mascota,))
-
-    mascota = cur.fetchone()
-    cur.close()
-    app.db_pool.putconn(conn)
-
-    if mascota:
-        return jsonify({
-            "id_mascota": mascota[0],
-            "nombre": mascota[1],
-            "tipo": mascota[2],
-            "nivel": mascota[3]
-        })
+    if entrada:
+        return respuesta_condicional(entrada)
 
     else:
         return jsonify({"error": "Mascota no encontrada"}), 404
@@ -533,48 +891,1410 @@ def obtener_mascota(id_mascota):
 @app.route('/api/personaje/<int:id_personaje>')
 def obtener_personaje(id_personaje):
     """
-    API que devuelve datos de un personaje.
+    API que devuelve datos de un personaje (con ETag / Last-Modified).
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
+    entrada = leer_cacheado(personaje_cache, id_personaje, cargar_personaje)
 
-    cur.execute("""
-        SELECT id_personaje, nombre, clase, nivel
-        FROM personaje
-        WHERE id_personaje = %s;
-    """, (id_personaje,))
-
-    personaje = cur.fetchone()
-    cur.close()
-    app.db_pool.putconn(conn)
-
-    if personaje:
-        return jsonify({
-            "id_personaje": personaje[0],
-            "nombre": personaje[1],
-            "clase": personaje[2],
-            "nivel": personaje[3]
-        })
+    if entrada:
+        return respuesta_condicional(entrada)
     else:
         return jsonify({"error": "Personaje no encontrado"}), 404
 
 
-# ==========================================
-# MARK: RUTAS EXTRA (HTML simple)
-# ==========================================
-@app.route('/inventario')
-def inventario():
-    return render_template('inventario.html')
+# ==== APIs POR LOTES ====
+# Un servidor de juego que pinta un grupo o un gremio pide todos los ids de una vez:
+# una petición HTTP, una conexión del pool y una consulta con = ANY(%s).
+API_BATCH_MAX = int(os.getenv("API_BATCH_MAX", "200"))
 
 
-@app.route('/gremio')
-def gremio():
-    return render_template('gremio.html')
+def cuerpo_json():
+    """Cuerpo JSON del request ({} si no hay); None si no es un objeto (lista, escalar)."""
+    cuerpo = request.get_json(silent=True)
+    if cuerpo is None:
+        return {}
+    return cuerpo if isinstance(cuerpo, dict) else None
 
 
-@app.route('/logros')
-def logros():
-    return render_template('logros.html')
+CUERPO_NO_OBJETO = "El cuerpo debe ser un objeto JSON"
+
+
+def leer_ids():
+    """
+    Lee los ids de ?ids=1,2,3 o de un cuerpo JSON {"ids": [1, 2, 3]}.
+    Devuelve (ids_sin_duplicados, error).
+    """
+    if request.method == 'POST':
+        cuerpo = cuerpo_json()
+        if cuerpo is None:
+            return None, CUERPO_NO_OBJETO
+        crudos = cuerpo.get('ids', [])
+    else:
+        crudos = [x for x in request.args.get('ids', '').split(',') if x.strip()]
+
+    if not isinstance(crudos, list):
+        return None, "El campo 'ids' debe ser una lista"
+
+    try:
+        ids = list(dict.fromkeys(int(x) for x in crudos))  # Mantiene el orden pedido
+    except (TypeError, ValueError):
+        return None, "Todos los ids deben ser enteros"
+
+    if not ids:
+        return None, "Debes indicar al menos un id"
+
+    if len(ids) > API_BATCH_MAX:
+        return None, f"Máximo {API_BATCH_MAX} ids por petición"
+
+    return ids, None
+
+
+def respuesta_lote(clave, ids, encontrados):
+    # Se respeta el orden de la petición y se informa lo que no existe
+    return jsonify({
+        clave: [encontrados[i] for i in ids if i in encontrados],
+        "no_encontrados": [i for i in ids if i not in encontrados]
+    })
+
+
+@app.route('/api/personajes', methods=['GET', 'POST'])
+def obtener_personajes():
+    """
+    API por lotes: varios personajes en una sola consulta.
+    """
+    ids, error = leer_ids()
+    if error:
+        return jsonify({"error": error}), 400
+
+    return respuesta_lote("personajes", ids, leer_lote(personaje_cache, ids, cargar_personajes))
+
+
+@app.route('/api/mascotas', methods=['GET', 'POST'])
+def obtener_mascotas():
+    """
+    API por lotes: varias mascotas en una sola consulta.
+    """
+    ids, error = leer_ids()
+    if error:
+        return jsonify({"error": error}), 400
+
+    return respuesta_lote("mascotas", ids, leer_lote(mascota_cache, ids, cargar_mascotas))
+
+
+@app.route('/api/personajes/mascotas', methods=['GET', 'POST'])
+def obtener_personajes_con_mascotas():
+    """
+    API por lotes para pantallas de grupo: cada personaje con sus mascotas,
+    todo en una consulta (json_agg agrupa las mascotas por personaje).
+    """
+    ids, error = leer_ids()
+    if error:
+        return jsonify({"error": error}), 400
+
+    with lectura() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT p.id_personaje, p.nombre, p.clase, p.nivel,
+                   COALESCE(
+                       json_agg(json_build_object(
+                           'id_mascota', m.id_mascota,
+                           'nombre', m.nombre_mascota,
+                           'tipo', m.tipo,
+                           'nivel', m.nivel
+                       ) ORDER BY m.id_mascota) FILTER (WHERE m.id_mascota IS NOT NULL),
+                       '[]'
+                   )
+            FROM personaje p
+            LEFT JOIN mascota m ON m.id_personaje = p.id_personaje
+            WHERE p.id_personaje = ANY(%s)
+            GROUP BY p.id_personaje;
+        """, (ids,))
+
+        encontrados = {}
+        for row in cur.fetchall():
+            personaje = personaje_a_dict(row)
+            personaje["mascotas"] = row[4]
+            encontrados[row[0]] = personaje
+
+    return respuesta_lote("personajes", ids, encontrados)
+
+
+@app.route('/api/cache/stats')
+def estadisticas_cache():
+    """
+    Aciertos/fallos de las cachés de este worker, para ajustar tamaños y TTL.
+    """
+    return jsonify({
+        "lobby": lobby_cache.stats(),
+        "personaje": personaje_cache.stats(),
+        "mascota": mascota_cache.stats(),
+        "gremio": gremio_cache.stats()
+    })
+
+
+def metricas_cache_y_breaker():
+    caches = {"lobby": lobby_cache, "personaje": personaje_cache, "mascota": mascota_cache,
+              "gremio": gremio_cache}
+    stats = {nombre: cache.stats() for nombre, cache in caches.items()}
+    estados = {breaker.CLOSED: 0, breaker.HALF_OPEN: 1, breaker.OPEN: 2}
+
+    return (
+        metrics.gauge_lines("cache_hits", "Aciertos acumulados por caché",
+                            [({"cache": n}, st["hits"]) for n, st in stats.items()])
+        + metrics.gauge_lines("cache_misses", "Fallos acumulados por caché",
+                              [({"cache": n}, st["misses"]) for n, st in stats.items()])
+        + metrics.gauge_lines("cache_size", "Entradas actuales por caché",
+                              [({"cache": n}, st["size"]) for n, st in stats.items()])
+        + metrics.gauge_lines("db_breaker_state", "0 = cerrado, 1 = half-open, 2 = abierto",
+                              [({}, estados[breaker.state])])
+    )
+
+
+metrics.register_collector(metricas_cache_y_breaker)
+
+
+@app.route('/metrics')
+def exponer_metricas():
+    """
+    Métricas de este worker en formato Prometheus.
+    Si METRICS_TOKEN está definido se exige 'Authorization: Bearer <token>'.
+    """
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return "No autorizado", 403
+
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+# ==========================================
+# MARK: INVENTARIO
+# ==========================================
+# Todo el inventario de un personaje sale de una consulta: los subtipos
+# (arma/armadura/poción) se resuelven con LEFT JOIN, no con una consulta por objeto.
+def cargar_inventario(id_personaje):
+    with lectura() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT o.id_objeto, o.nombre, o.descripcion, o.valor, o.rareza, i.cantidad,
+                   CASE
+                       WHEN a.id_objeto IS NOT NULL THEN 'arma'
+                       WHEN ar.id_objeto IS NOT NULL THEN 'armadura'
+                       WHEN po.id_objeto IS NOT NULL THEN 'pocion'
+                       ELSE 'objeto'
+                   END,
+                   a.dano_base, ar.valor_defensa, po.efecto
+            FROM inventario i
+            JOIN objeto o ON o.id_objeto = i.id_objeto
+            LEFT JOIN arma a ON a.id_objeto = i.id_objeto
+            LEFT JOIN armadura ar ON ar.id_objeto = i.id_objeto
+            LEFT JOIN pocion po ON po.id_objeto = i.id_objeto
+            WHERE i.id_personaje = %s
+            ORDER BY o.id_objeto;
+        """, (id_personaje,))
+
+        return [{
+            "id_objeto": row[0],
+            "nombre": row[1],
+            "descripcion": row[2],
+            "valor": row[3],
+            "rareza": row[4],
+            "cantidad": row[5],
+            "tipo": row[6],
+            "dano_base": row[7],
+            "valor_defensa": row[8],
+            "efecto": row[9]
+        } for row in cur.fetchall()]
+
+
+def leer_objetos():
+    """
+    Lee {"objetos": [{"id_objeto": 1, "cantidad": 3}, ...]} del cuerpo JSON.
+    Suma las repeticiones (ON CONFLICT no puede tocar la misma fila dos veces).
+    Devuelve ([(id_objeto, cantidad)], error).
+    """
+    cuerpo = cuerpo_json()
+    if cuerpo is None:
+        return None, CUERPO_NO_OBJETO
+    objetos = cuerpo.get('objetos')
+
+    if not isinstance(objetos, list) or not objetos:
+        return None, "Debes enviar una lista 'objetos' con id_objeto y cantidad"
+
+    if len(objetos) > API_BATCH_MAX:
+        return None, f"Máximo {API_BATCH_MAX} objetos por petición"
+
+    totales = {}
+    try:
+        for objeto in objetos:
+            id_objeto = int(objeto['id_objeto'])
+            cantidad = int(objeto.get('cantidad', 1))
+            if cantidad <= 0:
+                return None, "Las cantidades deben ser positivas"
+            totales[id_objeto] = totales.get(id_objeto, 0) + cantidad
+    except (TypeError, KeyError, ValueError, AttributeError):
+        return None, "Cada objeto necesita id_objeto y cantidad enteros"
+
+    return list(totales.items()), None
+
+
+def columnas(filas):
+    # Una lista por columna para unnest(%s::int[], ...): toda la tanda viaja en una
+    # sola sentencia y el texto SQL es el mismo para cualquier tanda
+    return [list(c) for c in zip(*filas)]
+
+
+@app.route('/inventario')
+def inventario():
+    if 'id_jugador' not in session:
+        flash('Debes iniciar sesión primero.', 'warning')
+        return redirect(url_for('login'))
+
+    # Por defecto, el inventario del personaje activo
+    id_personaje = request.args.get('personaje', type=int)
+
+    with lectura() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT p.id_personaje, p.nombre
+            FROM personaje p
+            JOIN jugador j ON j.id_jugador = p.id_jugador
+            WHERE j.id_jugador = %s
+            AND p.id_personaje = COALESCE(%s, j.id_personaje_activo);
+        """, (session['id_jugador'], id_personaje))
+
+        personaje = cur.fetchone()
+
+    objetos = cargar_inventario(personaje[0]) if personaje else []
+    return render_template('inventario.html', personaje=personaje, objetos=objetos)
+
+
+@app.route('/api/inventario/<int:id_personaje>')
+def obtener_inventario(id_personaje):
+    """
+    API que devuelve el inventario completo de un personaje, con los atributos de cada subtipo.
+    """
+    return jsonify({"id_personaje": id_personaje, "objetos": cargar_inventario(id_personaje)})
+
+
+@app.route('/api/inventario/<int:id_personaje>/agregar', methods=['POST'])
+def agregar_objetos(id_personaje):
+    """
+    Agrega una tanda de objetos (p. ej. un botín) en UN solo INSERT ... ON CONFLICT.
+    """
+    if 'id_jugador' not in session:
+        return jsonify({"error": "No autorizado"}), 403
+
+    objetos, error = leer_objetos()
+    if error:
+        return jsonify({"error": error}), 400
+
+    with db_connection() as conn, conn.cursor() as cur:
+        try:
+            # El JOIN con personaje garantiza que es del jugador de la sesión
+            cur.execute("""
+                INSERT INTO inventario (id_personaje, id_objeto, cantidad)
+                SELECT p.id_personaje, d.id_objeto, d.cantidad
+                FROM unnest(%s::int[], %s::int[]) AS d(id_objeto, cantidad)
+                JOIN personaje p ON p.id_personaje = %s AND p.id_jugador = %s
+                ON CONFLICT (id_personaje, id_objeto)
+                DO UPDATE SET cantidad = inventario.cantidad + EXCLUDED.cantidad
+                RETURNING id_objeto, cantidad;
+            """, (*columnas(objetos), id_personaje, session['id_jugador']))
+
+            filas = cur.fetchall()
+            conn.commit()
+
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 400
+
+    if not filas:
+        return jsonify({"error": "Personaje no encontrado"}), 404
+
+    return jsonify({"success": True, "objetos": [{"id_objeto": f[0], "cantidad": f[1]} for f in filas]})
+
+
+@app.route('/api/inventario/<int:id_personaje>/quitar', methods=['POST'])
+def quitar_objetos(id_personaje):
+    """
+    Quita una tanda de objetos en una sola sentencia: las filas que llegan a 0
+    se borran y el resto se descuenta (nunca queda una cantidad negativa).
+    """
+    if 'id_jugador' not in session:
+        return jsonify({"error": "No autorizado"}), 403
+
+    objetos, error = leer_objetos()
+    if error:
+        return jsonify({"error": error}), 400
+
+    with db_connection() as conn, conn.cursor() as cur:
+        try:
+            cur.execute("""
+                WITH d(id_objeto, cantidad) AS (SELECT * FROM unnest(%s::int[], %s::int[])),
+                propio AS (
+                    SELECT id_personaje FROM personaje WHERE id_personaje = %s AND id_jugador = %s
+                ),
+                borrados AS (
+                    DELETE FROM inventario i
+                    USING d, propio
+                    WHERE i.id_personaje = propio.id_personaje
+                    AND i.id_objeto = d.id_objeto
+                    AND i.cantidad <= d.cantidad
+                    RETURNING i.id_objeto, 0 AS cantidad
+                ),
+                restados AS (
+                    UPDATE inventario i
+                    SET cantidad = i.cantidad - d.cantidad
+                    FROM d, propio
+                    WHERE i.id_personaje = propio.id_personaje
+                    AND i.id_objeto = d.id_objeto
+                    AND i.cantidad > d.cantidad
+                    RETURNING i.id_objeto, i.cantidad
+                )
+                SELECT EXISTS (SELECT 1 FROM propio),
+                       COALESCE((
+                           SELECT json_agg(json_build_object('id_objeto', id_objeto, 'cantidad', cantidad))
+                           FROM (SELECT * FROM borrados UNION ALL SELECT * FROM restados) r
+                       ), '[]');
+            """, (*columnas(objetos), id_personaje, session['id_jugador']))
+
+            es_propio, restantes = cur.fetchone()
+            conn.commit()
+
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 400
+
+    if not es_propio:
+        return jsonify({"error": "Personaje no encontrado"}), 404
+
+    return jsonify({"success": True, "objetos": restantes})
+
+
+# ==========================================
+# MARK: PARTIDAS Y RANKINGS
+# ==========================================
+# Los rankings no suman participa en cada request: se leen de un SortedBoard en
+# memoria (leaderboard.py) alimentado por el rollup ranking_personaje.
+RESULTADOS = ('victoria', 'derrota', 'empate')
+RANKING_MAX = int(os.getenv("RANKING_MAX", "100"))
+
+
+def token_autorizado(variable):
+    # 'Authorization: Bearer <token>'; si la variable no está definida la ruta queda cerrada
+    token = os.getenv(variable)
+    return bool(token) and request.headers.get("Authorization") == f"Bearer {token}"
+
+
+def servidor_autorizado():
+    # Solo el servidor de juego registra partidas
+    return token_autorizado("GAME_SERVER_TOKEN")
+
+
+def leer_partida():
+    """
+    Lee {"duracion": 300, "resultado": "victoria",
+         "participantes": [{"id_personaje": 1, "puntuacion": 120}, ...]}.
+    Devuelve (duracion, resultado, [(id_personaje, puntuacion)], error).
+    """
+    cuerpo = cuerpo_json()
+    if cuerpo is None:
+        return None, None, None, CUERPO_NO_OBJETO
+    participantes = cuerpo.get('participantes')
+    resultado = cuerpo.get('resultado')
+
+    if not isinstance(participantes, list) or not participantes:
+        return None, None, None, "Debes enviar una lista 'participantes' con id_personaje y puntuacion"
+
+    if len(participantes) > API_BATCH_MAX:
+        return None, None, None, f"Máximo {API_BATCH_MAX} participantes por partida"
+
+    if resultado is not None and resultado not in RESULTADOS:
+        return None, None, None, f"El resultado debe ser uno de: {', '.join(RESULTADOS)}"
+
+    try:
+        duracion = int(cuerpo.get('duracion', 0))
+        filas = {}
+        for p in participantes:
+            filas[int(p['id_personaje'])] = int(p.get('puntuacion', 0))
+    except (TypeError, KeyError, ValueError, AttributeError):
+        return None, None, None, "duracion, id_personaje y puntuacion deben ser enteros"
+
+    return duracion, resultado, list(filas.items()), None
+
+
+@app.route('/api/partidas', methods=['POST'])
+def registrar_partida():
+    """
+    Registra una partida y sus participaciones y acumula las puntuaciones en
+    ranking_personaje, todo en una sola sentencia.
+    """
+    if not servidor_autorizado():
+        return jsonify({"error": "No autorizado"}), 403
+
+    duracion, resultado, participantes, error = leer_partida()
+    if error:
+        return jsonify({"error": error}), 400
+
+    with db_connection() as conn, conn.cursor() as cur:
+        try:
+            cur.execute("""
+                WITH d(id_personaje, puntuacion) AS (SELECT * FROM unnest(%s::int[], %s::int[])),
+                nueva AS (
+                    INSERT INTO partida (duracion, resultado)
+                    VALUES (%s, %s)
+                    RETURNING id_partida
+                ),
+                inscritos AS (
+                    INSERT INTO participa (id_personaje, id_partida, puntuacion)
+                    SELECT d.id_personaje, nueva.id_partida, d.puntuacion
+                    FROM d CROSS JOIN nueva
+                    RETURNING id_personaje
+                ),
+                acumulados AS (
+                    INSERT INTO ranking_personaje (id_personaje, id_jugador, clase, puntuacion, partidas, victorias)
+                    SELECT p.id_personaje, p.id_jugador, p.clase, d.puntuacion, 1, %s
+                    FROM d JOIN personaje p ON p.id_personaje = d.id_personaje
+                    ON CONFLICT (id_personaje) DO UPDATE
+                    SET puntuacion = ranking_personaje.puntuacion + EXCLUDED.puntuacion,
+                        partidas = ranking_personaje.partidas + 1,
+                        victorias = ranking_personaje.victorias + EXCLUDED.victorias,
+                        actualizado_en = NOW()
+                    RETURNING id_personaje, id_jugador, clase, puntuacion
+                )
+                SELECT (SELECT id_partida FROM nueva), a.*
+                FROM acumulados a;
+            """, (*columnas(participantes), duracion, resultado, int(resultado == 'victoria')))
+
+            filas = cur.fetchall()
+
+            # Victorias totales de cada ganador (la misma transacción ya ve el rollup nuevo)
+            victorias = []
+            if resultado == 'victoria':
+                cur.execute("""
+                    SELECT id_jugador, SUM(victorias)
+                    FROM ranking_personaje
+                    WHERE id_jugador = ANY(%s)
+                    GROUP BY id_jugador;
+                """, (list({f[2] for f in filas}),))
+                victorias = cur.fetchall()
+
+            # La puntuación combinada de los gremios sube con la de sus miembros
+            puntos = dict(participantes)
+            por_jugador = {}
+            for f in filas:
+                por_jugador[f[2]] = por_jugador.get(f[2], 0) + puntos[f[1]]
+            gremios = ajustar_resumen_gremios(cur, [(j, 0, p) for j, p in por_jugador.items()])
+
+            conn.commit()
+
+        except Exception as e:
+            # Un id_personaje inexistente viola la FK de participa: no se guarda nada
+            conn.rollback()
+            return jsonify({"error": str(e)}), 400
+
+    # Este worker lo ve al instante; los demás en su siguiente refresco
+    leaderboard.apply([f[1:] for f in filas])
+    for id_gremio in gremios:
+        gremio_cache.pop(id_gremio)
+    for id_jugador, total in victorias:
+        logros_engine.emit("partida", id_jugador, victorias=total)
+
+    return jsonify({"success": True, "id_partida": filas[0][0]}), 201
+
+
+def leer_clase_y_limite(parametro, por_defecto):
+    clase = request.args.get('clase') or None
+    limite = min(max(request.args.get(parametro, por_defecto, type=int), 1), RANKING_MAX)
+    return clase, limite
+
+
+def nombres_jugadores(ids):
+    if not ids:
+        return {}
+
+    with lectura() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT id_jugador, nombre_usuario
+            FROM jugador
+            WHERE id_jugador = ANY(%s);
+        """, (list(ids),))
+
+        return dict(cur.fetchall())
+
+
+def respuesta_ranking(clase, entradas):
+    nombres = nombres_jugadores({e[1] for e in entradas})
+    return jsonify({
+        "clase": clase,
+        "ranking": [{
+            "puesto": puesto,
+            "id_jugador": id_jugador,
+            "nombre_usuario": nombres.get(id_jugador),
+            "puntuacion": puntuacion
+        } for puesto, id_jugador, puntuacion in entradas]
+    })
+
+
+@app.route('/api/ranking')
+def ranking():
+    """
+    Top N global o de una clase: ?clase=Mago&n=10
+    """
+    clase, n = leer_clase_y_limite('n', 10)
+    return respuesta_ranking(clase, leaderboard.top(n, clase))
+
+
+@app.route('/api/ranking/jugador/<int:id_jugador>')
+def puesto_jugador(id_jugador):
+    """
+    Puesto de un jugador en el ranking global o de una clase: ?clase=Mago
+    """
+    clase = request.args.get('clase') or None
+    puesto, puntuacion, total = leaderboard.rank(id_jugador, clase)
+
+    if puesto is None:
+        return jsonify({"error": "El jugador no aparece en este ranking"}), 404
+
+    return jsonify({
+        "clase": clase,
+        "id_jugador": id_jugador,
+        "puesto": puesto,
+        "puntuacion": puntuacion,
+        "jugadores": total
+    })
+
+
+@app.route('/api/ranking/alrededor/<int:id_jugador>')
+def ranking_alrededor(id_jugador):
+    """
+    Los k jugadores por encima y por debajo de uno: ?clase=Mago&k=5
+    """
+    clase, k = leer_clase_y_limite('k', 5)
+    entradas = leaderboard.around(id_jugador, k, clase)
+
+    if not entradas:
+        return jsonify({"error": "El jugador no aparece en este ranking"}), 404
+
+    return respuesta_ranking(clase, entradas)
+
+
+# ==========================================
+# MARK: EXPERIENCIA Y NIVELES
+# ==========================================
+# Los servidores de juego reportan XP en tandas. Los eventos se suman por jugador
+# en memoria y se escriben con UN UPDATE ... FROM unnest(...) por vaciado: miles
+# de eventos por segundo se convierten en unas pocas sentencias.
+XP_POR_NIVEL = int(os.getenv("XP_POR_NIVEL", "100"))  # Coincide con xp_porcentaje del lobby
+XP_EVENTOS_MAX = int(os.getenv("XP_EVENTOS_MAX", "1000"))
+XP_EVENTO_MAX = int(os.getenv("XP_EVENTO_MAX", "100000"))  # XP máxima de un solo evento
+INT4_MAX = 2**31 - 1  # Los id_jugador son INTEGER
+
+
+def guardar_experiencia(lote):
+    """
+    Aplica [(id_jugador, xp)] en una sentencia. El nivel de toda la tanda se calcula
+    en SQL (experiencia / XP_POR_NIVEL + 1, nunca baja). Las filas se bloquean en
+    orden de id para que dos workers vaciando a la vez no se bloqueen mutuamente.
+    """
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            WITH d(id_jugador, xp) AS (SELECT * FROM unnest(%s::int[], %s::bigint[])),
+            previos AS (
+                SELECT j.id_jugador, j.experiencia, j.nivel
+                FROM jugador j
+                JOIN d ON d.id_jugador = j.id_jugador
+                ORDER BY j.id_jugador
+                FOR UPDATE OF j
+            )
+            UPDATE jugador j
+            SET experiencia = v.experiencia + d.xp,
+                nivel = GREATEST(v.nivel, (v.experiencia + d.xp) / %s + 1)
+            FROM previos v
+            JOIN d ON d.id_jugador = v.id_jugador
+            WHERE j.id_jugador = v.id_jugador
+            RETURNING j.id_jugador, v.nivel, j.nivel;
+        """, (*columnas(lote), XP_POR_NIVEL))
+
+        filas = cur.fetchall()
+        subidas = [(id_jugador, nuevo) for id_jugador, viejo, nuevo in filas if nuevo > viejo]
+        niveles = {id_jugador: viejo for id_jugador, viejo, _ in filas}
+
+        gremios = ajustar_resumen_gremios(cur, [(j, nuevo - niveles[j], 0) for j, nuevo in subidas])
+        conn.commit()
+
+    # La tanda ya está confirmada: un fallo de aquí en adelante no debe llegar al
+    # WriteBuffer, que la devolvería al buffer y la XP se sumaría dos veces
+    try:
+        for id_jugador, _, _ in filas:
+            invalidar_lobby(id_jugador)
+        for id_gremio in gremios:
+            gremio_cache.pop(id_gremio)
+        for id_jugador, nivel in subidas:
+            logros_engine.emit("nivel", id_jugador, nivel=nivel)
+    except Exception as e:
+        print("⚠️ XP guardada, pero falló la invalidación o los logros:", e)
+
+
+xp_buffer = WriteBuffer(
+    "experiencia",
+    guardar_experiencia,
+    merge=lambda a, b: a + b,
+    batch_size=int(os.getenv("XP_BATCH", "500")),
+    flush_every=float(os.getenv("XP_FLUSH", "1")),
+    max_pending=int(os.getenv("XP_BUFFER_MAX", "50000")),
+    # Un valor fuera de rango nunca va a entrar: se descarta en vez de reintentarlo sin fin
+    drop_on=(psycopg2.DataError, psycopg2.IntegrityError),
+)
+metrics.register_collector(lambda: (
+    metrics.gauge_lines("xp_buffer_pending", "Jugadores con XP pendiente de escribir",
+                        [({}, len(xp_buffer))])
+    + metrics.gauge_lines("xp_buffer_dropped", "Jugadores cuya XP se descartó por datos inválidos",
+                          [({}, xp_buffer.dropped)])
+))
+
+
+def leer_eventos_xp():
+    """
+    Lee {"eventos": [{"id_jugador": 1, "xp": 50}, ...]} del cuerpo JSON.
+    Devuelve ([(id_jugador, xp)], error).
+    """
+    cuerpo = cuerpo_json()
+    if cuerpo is None:
+        return None, CUERPO_NO_OBJETO
+    eventos = cuerpo.get('eventos')
+
+    if not isinstance(eventos, list) or not eventos:
+        return None, "Debes enviar una lista 'eventos' con id_jugador y xp"
+
+    if len(eventos) > XP_EVENTOS_MAX:
+        return None, f"Máximo {XP_EVENTOS_MAX} eventos por petición"
+
+    filas = []
+    try:
+        for evento in eventos:
+            id_jugador, xp = int(evento['id_jugador']), int(evento['xp'])
+            if not 0 < id_jugador <= INT4_MAX:
+                return None, "id_jugador fuera de rango"
+            if not 0 < xp <= XP_EVENTO_MAX:
+                return None, f"La XP de cada evento debe estar entre 1 y {XP_EVENTO_MAX}"
+            filas.append((id_jugador, xp))
+    except (TypeError, KeyError, ValueError):
+        return None, "Cada evento necesita id_jugador y xp enteros"
+
+    return filas, None
+
+
+@app.route('/api/experiencia', methods=['POST'])
+def reportar_experiencia():
+    """
+    Ingesta de XP por tandas desde el servidor de juego. Responde 202: la XP queda
+    en el buffer del worker y se escribe en el siguiente vaciado.
+    """
+    if not servidor_autorizado():
+        return jsonify({"error": "No autorizado"}), 403
+
+    eventos, error = leer_eventos_xp()
+    if error:
+        return jsonify({"error": error}), 400
+
+    xp_buffer.add(eventos)
+    return jsonify({"success": True, "aceptados": len(eventos)}), 202
+
+
+# ==========================================
+# MARK: PRESENCIA (ÚLTIMA CONEXIÓN)
+# ==========================================
+# Cada request autenticado anota (fecha, ip) del jugador en memoria; un hilo lo
+# vuelca a jugador.fecha_hora / direccion_ip con un UPDATE por tanda. Ningún
+# request hace su propio UPDATE.
+PRESENCIA_EN_LINEA = int(os.getenv("PRESENCIA_EN_LINEA", "300"))  # Segundos para contar como "en línea"
+
+
+def guardar_presencia(lote):
+    """Aplica [(id_jugador, (fecha, ip))] en una sentencia; nunca retrocede fecha_hora."""
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            WITH d(id_jugador, fecha, ip) AS (
+                SELECT * FROM unnest(%s::int[], %s::timestamptz[], %s::inet[])
+            ),
+            previos AS (
+                SELECT j.id_jugador
+                FROM jugador j
+                JOIN d ON d.id_jugador = j.id_jugador
+                ORDER BY j.id_jugador
+                FOR UPDATE OF j
+            )
+            UPDATE jugador j
+            SET fecha_hora = d.fecha,
+                direccion_ip = d.ip
+            FROM previos v
+            JOIN d ON d.id_jugador = v.id_jugador
+            WHERE j.id_jugador = v.id_jugador
+            AND (j.fecha_hora IS NULL OR j.fecha_hora < d.fecha);
+        """, columnas([(j, f, ip) for j, (f, ip) in lote]))
+        conn.commit()
+
+
+presencia_buffer = WriteBuffer(
+    "presencia",
+    guardar_presencia,
+    merge=lambda a, b: max(a, b),  # Se queda la visita más reciente
+    batch_size=int(os.getenv("PRESENCIA_BATCH", "1000")),
+    flush_every=float(os.getenv("PRESENCIA_FLUSH", "10")),
+    max_pending=int(os.getenv("PRESENCIA_BUFFER_MAX", "50000")),
+)
+
+
+def anotar_presencia(id_jugador, ip):
+    """Encola la visita del jugador (también la usan las rutas de asgi.py)."""
+    try:
+        presencia_buffer.add([(id_jugador, (datetime.now(timezone.utc), ip))])
+    except BufferFull:
+        pass  # La presencia es aproximada: con la base atascada se descarta esta visita
+
+
+@app.before_request
+def registrar_presencia():
+    if 'id_jugador' in session:
+        anotar_presencia(session['id_jugador'], request.remote_addr)
+
+
+@app.route('/api/jugadores/en_linea')
+def jugadores_en_linea():
+    """
+    Jugadores vistos en los últimos PRESENCIA_EN_LINEA segundos (rango sobre el índice).
+    """
+    with lectura() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT count(*)
+            FROM jugador
+            WHERE fecha_hora >= NOW() - make_interval(secs => %s);
+        """, (PRESENCIA_EN_LINEA,))
+
+        return jsonify({"en_linea": cur.fetchone()[0], "ventana_segundos": PRESENCIA_EN_LINEA})
+
+
+@app.route('/api/jugadores/actividad')
+def actividad_jugadores():
+    """
+    Activos (vistos en los últimos ?dias=7), inactivos y nunca vistos.
+    Tres conteos independientes para que cada uno sea un rango del índice.
+    """
+    if not servidor_autorizado():
+        return jsonify({"error": "No autorizado"}), 403
+
+    dias = min(max(request.args.get('dias', 7, type=int), 1), 3650)
+
+    with lectura() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT (SELECT count(*) FROM jugador WHERE fecha_hora >= NOW() - make_interval(days => %s)),
+                   (SELECT count(*) FROM jugador WHERE fecha_hora < NOW() - make_interval(days => %s)),
+                   (SELECT count(*) FROM jugador WHERE fecha_hora IS NULL);
+        """, (dias, dias))
+
+        activos, inactivos, nunca = cur.fetchone()
+
+    return jsonify({"dias": dias, "activos": activos, "inactivos": inactivos, "nunca_vistos": nunca})
+
+
+@app.route('/api/jugadores/inactivos')
+def jugadores_inactivos():
+    """
+    Jugadores sin conectarse en ?dias=30, del que lleva más tiempo ausente al que menos.
+    Keyset sobre (fecha_hora, id_jugador): ?despues=<siguiente de la página anterior>
+    """
+    if not servidor_autorizado():
+        return jsonify({"error": "No autorizado"}), 403
+
+    dias = min(max(request.args.get('dias', 30, type=int), 1), 3650)
+    limite = min(max(request.args.get('limite', 50, type=int), 1), PAGINA_MAX)
+
+    # Cursor opaco "fecha|id"; sin cursor se empieza por la visita más antigua
+    desde, despues = '-infinity', 0
+    if request.args.get('despues'):
+        try:
+            desde, despues = request.args['despues'].rsplit('|', 1)
+            despues = int(despues)
+        except ValueError:
+            return jsonify({"error": "Cursor 'despues' inválido"}), 400
+
+    with lectura() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT id_jugador, nombre_usuario, nivel, fecha_hora, direccion_ip
+            FROM jugador
+            WHERE fecha_hora < NOW() - make_interval(days => %s)
+            AND (fecha_hora, id_jugador) > (%s::timestamptz, %s)
+            ORDER BY fecha_hora, id_jugador
+            LIMIT %s;
+        """, (dias, desde, despues, limite + 1))
+
+        filas = cur.fetchall()
+
+    jugadores = [{
+        "id_jugador": f[0],
+        "nombre_usuario": f[1],
+        "nivel": f[2],
+        "fecha_hora": f[3].isoformat(),
+        "direccion_ip": f[4]
+    } for f in filas[:limite]]
+
+    siguiente = None
+    if len(filas) > limite:
+        siguiente = f"{jugadores[-1]['fecha_hora']}|{jugadores[-1]['id_jugador']}"
+
+    return jsonify({"dias": dias, "jugadores": jugadores, "siguiente": siguiente})
+
+
+# ==========================================
+# MARK: REPORTES DE RENDIMIENTO
+# ==========================================
+# Los reportes leen solo los rollups de reports.py; el refresco suma las partidas
+# nuevas desde la marca de agua y lo dispara el cron (antes solo llamaba a /ping).
+@app.route('/api/reportes/jugador/<int:id_jugador>')
+def reporte_jugador(id_jugador):
+    """
+    Partidas, tasa de victoria, puntuación media y tiempo jugado, total y por personaje.
+    """
+    reporte = reports.player_report(id_jugador)
+    if reporte is None:
+        return jsonify({"error": "El jugador aún no tiene partidas en el reporte"}), 404
+
+    return jsonify(reporte)
+
+
+@app.route('/api/reportes/clases')
+def reporte_clases():
+    """
+    Los mismos indicadores agregados por clase de personaje.
+    """
+    ultima, actualizado = reports.watermark()
+    return jsonify({
+        "clases": reports.class_report(),
+        "hasta_partida": ultima,
+        "actualizado_en": actualizado.isoformat()
+    })
+
+
+@app.route('/api/reportes/refrescar', methods=['POST'])
+def refrescar_reportes():
+    """
+    Entrada para el cron: procesa las partidas nuevas (y de paso mantiene despierta la base).
+    """
+    if not servidor_autorizado():
+        return jsonify({"error": "No autorizado"}), 403
+
+    desde, hasta, personajes = reports.refresh()
+    return jsonify({"desde_partida": desde, "hasta_partida": hasta, "personajes": personajes})
+
+
+# ==========================================
+# MARK: EXPORTACIÓN E IMPORTACIÓN MASIVA (ADMIN)
+# ==========================================
+# COPY en ambos sentidos (bulk.py): el export se envía en streaming con memoria
+# constante y el import entra entero en una transacción. Requieren ADMIN_TOKEN.
+TIPOS_EXPORT = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+@app.route('/api/admin/exportar/<tabla>')
+def exportar_tabla(tabla):
+    """
+    Tabla completa (jugador, personaje o mascota) en ?formato=csv|ndjson.
+    """
+    if not token_autorizado("ADMIN_TOKEN"):
+        return jsonify({"error": "No autorizado"}), 403
+
+    formato = request.args.get('formato', 'csv')
+    try:
+        trozos = bulk.stream_export(tabla, formato)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    respuesta = Response(trozos, content_type=TIPOS_EXPORT[formato], headers={
+        "Content-Disposition": f'attachment; filename="{tabla}.{formato}"'
+    })
+    # El COPY sigue con su conexión del pool después de que la vista retorna: el hueco
+    # de admisión se libera al cerrar la respuesta (generador terminado o cliente
+    # desconectado), no en el teardown del request
+    respuesta.call_on_close(admission.detach_slot())
+    return respuesta
+
+
+@app.route('/api/admin/importar/<tabla>', methods=['POST'])
+def importar_tabla(tabla):
+    """
+    Carga el cuerpo (mismo formato que el export, ?formato=csv|ndjson) con COPY a una
+    tabla temporal y lo fusiona por id. Sin leer el archivo entero en memoria.
+    """
+    if not token_autorizado("ADMIN_TOKEN"):
+        return jsonify({"error": "No autorizado"}), 403
+
+    formato = request.args.get('formato', 'csv')
+    try:
+        filas = bulk.import_stream(tabla, formato, request.stream)
+
+    except DatabaseUnavailable:
+        raise
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Cualquier jugador/personaje/mascota pudo cambiar
+    lobby_cache.clear()
+    personaje_cache.clear()
+    mascota_cache.clear()
+
+    return jsonify({"success": True, "tabla": tabla, "filas": filas})
+
+
+# ==========================================
+# MARK: GREMIOS
+# ==========================================
+# Miembros, suma de niveles y puntuación combinada viven en resumen_gremio y se
+# ajustan con deltas al unirse/salir, subir de nivel o jugar una partida. El
+# roster se pagina por keyset sobre (id_gremio, id_jugador).
+def ajustar_resumen_gremios(cur, deltas):
+    """
+    Suma [(id_jugador, delta_nivel, delta_puntuacion)] al resumen de cada gremio del
+    jugador en un solo UPDATE, dentro de la transacción del llamador.
+    Devuelve los id_gremio tocados (para invalidar gremio_cache tras el commit).
+    """
+    deltas = [d for d in deltas if d[1] or d[2]]
+    if not deltas:
+        return []
+
+    cur.execute("""
+        UPDATE resumen_gremio r
+        SET nivel_total = r.nivel_total + d.nivel,
+            puntuacion_total = r.puntuacion_total + d.puntuacion,
+            actualizado_en = NOW()
+        FROM (
+            SELECT pe.id_gremio, SUM(v.nivel) AS nivel, SUM(v.puntuacion) AS puntuacion
+            FROM unnest(%s::int[], %s::int[], %s::bigint[]) AS v(id_jugador, nivel, puntuacion)
+            JOIN pertenece pe ON pe.id_jugador = v.id_jugador
+            GROUP BY pe.id_gremio
+        ) d
+        WHERE r.id_gremio = d.id_gremio
+        RETURNING r.id_gremio;
+    """, columnas(deltas))
+
+    return [row[0] for row in cur.fetchall()]
+
+
+def cargar_gremio(id_gremio):
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT g.id_gremio, g.nombre, g.fecha_fundacion,
+                   COALESCE(r.miembros, 0), COALESCE(r.nivel_total, 0), COALESCE(r.puntuacion_total, 0)
+            FROM gremio g
+            LEFT JOIN resumen_gremio r ON r.id_gremio = g.id_gremio
+            WHERE g.id_gremio = %s;
+        """, (id_gremio,))
+
+        row = cur.fetchone()
+
+    return gremio_a_dict(row) if row else None
+
+
+def gremio_a_dict(row):
+    miembros, nivel_total = row[3], row[4]
+    return {
+        "id_gremio": row[0],
+        "nombre": row[1],
+        "fecha_fundacion": row[2].isoformat(),
+        "miembros": miembros,
+        "nivel_total": nivel_total,
+        "nivel_promedio": round(nivel_total / miembros, 2) if miembros else 0,
+        "puntuacion_total": row[5]
+    }
+
+
+def cargar_miembros(id_gremio, despues, limite):
+    """
+    Una página del roster con el personaje y la mascota activos de cada miembro.
+    Pide limite + 1 filas para saber si hay página siguiente.
+    """
+    with lectura() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT j.id_jugador, j.nombre_usuario, j.nivel, pe.fecha_union,
+                   p.id_personaje, p.nombre, p.clase, p.nivel,
+                   m.id_mascota, m.nombre_mascota, m.tipo, m.nivel
+            FROM pertenece pe
+            JOIN jugador j ON j.id_jugador = pe.id_jugador
+            LEFT JOIN personaje p ON p.id_personaje = j.id_personaje_activo
+            LEFT JOIN mascota m ON m.id_mascota = j.id_mascota_activa
+            WHERE pe.id_gremio = %s AND pe.id_jugador > %s
+            ORDER BY pe.id_jugador
+            LIMIT %s;
+        """, (id_gremio, despues, limite + 1))
+
+        return [{
+            "id_jugador": row[0],
+            "nombre_usuario": row[1],
+            "nivel": row[2],
+            "fecha_union": row[3].isoformat(),
+            "personaje": {"id_personaje": row[4], "nombre": row[5], "clase": row[6], "nivel": row[7]}
+                         if row[4] is not None else None,
+            "mascota": {"id_mascota": row[8], "nombre": row[9], "tipo": row[10], "nivel": row[11]}
+                       if row[8] is not None else None
+        } for row in cur.fetchall()]
+
+
+@app.route('/gremio')
+def gremio():
+    """
+    Lista de gremios con sus agregados (del rollup), paginada por keyset: ?despues=<id_gremio>
+    """
+    despues, limite = leer_pagina()
+
+    with lectura() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT g.id_gremio, g.nombre, g.fecha_fundacion,
+                   COALESCE(r.miembros, 0), COALESCE(r.nivel_total, 0), COALESCE(r.puntuacion_total, 0)
+            FROM gremio g
+            LEFT JOIN resumen_gremio r ON r.id_gremio = g.id_gremio
+            WHERE g.id_gremio > %s
+            ORDER BY g.id_gremio
+            LIMIT %s;
+        """, (despues, limite + 1))
+
+        filas = cur.fetchall()
+
+    lista = [gremio_a_dict(f) for f in filas[:limite]]
+    siguiente = lista[-1]["id_gremio"] if len(filas) > limite else None
+    return render_template('gremio.html', gremios=lista, siguiente=siguiente)
+
+
+@app.route('/gremio/<int:id_gremio>')
+def ver_gremio(id_gremio):
+    entrada = leer_cacheado(gremio_cache, id_gremio, cargar_gremio)
+    if entrada is None:
+        flash('Gremio no encontrado.', 'error')
+        return redirect(url_for('gremio'))
+
+    despues, limite = leer_pagina()
+    miembros = cargar_miembros(id_gremio, despues, limite)
+    siguiente = miembros[limite - 1]["id_jugador"] if len(miembros) > limite else None
+
+    return render_template('gremio.html', gremio=entrada['data'], miembros=miembros[:limite], siguiente=siguiente)
+
+
+@app.route('/api/gremios/<int:id_gremio>')
+def obtener_gremio(id_gremio):
+    """
+    API con los agregados del gremio (miembros, nivel total y promedio, puntuación combinada).
+    """
+    entrada = leer_cacheado(gremio_cache, id_gremio, cargar_gremio)
+    if entrada is None:
+        return jsonify({"error": "Gremio no encontrado"}), 404
+
+    return respuesta_condicional(entrada)
+
+
+@app.route('/api/gremios/<int:id_gremio>/miembros')
+def obtener_miembros(id_gremio):
+    """
+    Roster paginado (keyset): ?despues=<id_jugador>&limite=50
+    """
+    despues, limite = leer_pagina()
+    return respuesta_pagina("miembros", cargar_miembros(id_gremio, despues, limite), limite, "id_jugador")
+
+
+@app.route('/api/gremios/<int:id_gremio>/unirse', methods=['POST'])
+def unirse_gremio(id_gremio):
+    if 'id_jugador' not in session:
+        return jsonify({"error": "No autorizado"}), 403
+
+    with db_connection() as conn, conn.cursor() as cur:
+        try:
+            # Alta y ajuste del resumen en la misma sentencia (crea el resumen si no existía)
+            cur.execute("""
+                WITH alta AS (
+                    INSERT INTO pertenece (id_jugador, id_gremio)
+                    SELECT %s, id_gremio FROM gremio WHERE id_gremio = %s
+                    ON CONFLICT DO NOTHING
+                    RETURNING id_jugador, id_gremio
+                ),
+                ajuste AS (
+                    INSERT INTO resumen_gremio (id_gremio, miembros, nivel_total, puntuacion_total)
+                    SELECT a.id_gremio, 1, j.nivel,
+                           COALESCE((SELECT SUM(r.puntuacion) FROM ranking_personaje r
+                                     WHERE r.id_jugador = a.id_jugador), 0)
+                    FROM alta a
+                    JOIN jugador j ON j.id_jugador = a.id_jugador
+                    ON CONFLICT (id_gremio) DO UPDATE
+                    SET miembros = resumen_gremio.miembros + 1,
+                        nivel_total = resumen_gremio.nivel_total + EXCLUDED.nivel_total,
+                        puntuacion_total = resumen_gremio.puntuacion_total + EXCLUDED.puntuacion_total,
+                        actualizado_en = NOW()
+                    RETURNING id_gremio
+                )
+                SELECT EXISTS (SELECT 1 FROM gremio WHERE id_gremio = %s),
+                       EXISTS (SELECT 1 FROM ajuste);
+            """, (session['id_jugador'], id_gremio, id_gremio))
+
+            existe, unido = cur.fetchone()
+            conn.commit()
+
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 400
+
+    if not existe:
+        return jsonify({"error": "Gremio no encontrado"}), 404
+
+    if not unido:
+        return jsonify({"error": "Ya perteneces a este gremio"}), 409
+
+    gremio_cache.pop(id_gremio)
+    return jsonify({"success": True})
+
+
+@app.route('/api/gremios/<int:id_gremio>/salir', methods=['POST'])
+def salir_gremio(id_gremio):
+    if 'id_jugador' not in session:
+        return jsonify({"error": "No autorizado"}), 403
+
+    with db_connection() as conn, conn.cursor() as cur:
+        try:
+            cur.execute("""
+                WITH baja AS (
+                    DELETE FROM pertenece
+                    WHERE id_jugador = %s AND id_gremio = %s
+                    RETURNING id_jugador, id_gremio
+                )
+                UPDATE resumen_gremio r
+                SET miembros = r.miembros - 1,
+                    nivel_total = r.nivel_total - j.nivel,
+                    puntuacion_total = r.puntuacion_total
+                        - COALESCE((SELECT SUM(rp.puntuacion) FROM ranking_personaje rp
+                                    WHERE rp.id_jugador = b.id_jugador), 0),
+                    actualizado_en = NOW()
+                FROM baja b
+                JOIN jugador j ON j.id_jugador = b.id_jugador
+                WHERE r.id_gremio = b.id_gremio
+                RETURNING r.id_gremio;
+            """, (session['id_jugador'], id_gremio))
+
+            salio = cur.fetchone() is not None
+            conn.commit()
+
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 400
+
+    if not salio:
+        return jsonify({"error": "No perteneces a este gremio"}), 404
+
+    gremio_cache.pop(id_gremio)
+    return jsonify({"success": True})
+
+
+# ==========================================
+# MARK: RUTAS EXTRA (HTML simple)
+# ==========================================
+def cargar_logros(id_jugador):
+    # Catálogo completo con la fecha de desbloqueo del jugador (NULL si aún no lo tiene)
+    with lectura() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT l.id_logro, l.nombre_logro, l.descripcion_logro, o.fecha_desbloqueo
+            FROM logro l
+            LEFT JOIN obtiene o ON o.id_logro = l.id_logro AND o.id_jugador = %s
+            ORDER BY o.fecha_desbloqueo IS NULL, o.fecha_desbloqueo, l.id_logro;
+        """, (id_jugador,))
+
+        return [{
+            "id_logro": row[0],
+            "nombre": row[1],
+            "descripcion": row[2],
+            "fecha_desbloqueo": row[3].isoformat() if row[3] else None
+        } for row in cur.fetchall()]
+
+
+@app.route('/logros')
+def logros():
+    if 'id_jugador' not in session:
+        flash('Debes iniciar sesión primero.', 'warning')
+        return redirect(url_for('login'))
+
+    return render_template('logros.html', logros=cargar_logros(session['id_jugador']))
+
+
+@app.route('/api/logros/<int:id_jugador>')
+def obtener_logros(id_jugador):
+    """
+    API con todos los logros y la fecha en que el jugador desbloqueó cada uno.
+    """
+    return jsonify({"id_jugador": id_jugador, "logros": cargar_logros(id_jugador)})
+
+
+# ==========================================
+# MARK: CICLO DE VIDA DEL WORKER (gunicorn.conf.py)
+# ==========================================
+# La app y sus rutas se crean al importar, pero nada abre conexiones al importar:
+# los pools son por proceso y se crean en el worker, después del fork.
+def calentar():
+    """Abre y valida las conexiones mínimas antes de que el worker reciba tráfico."""
+    try:
+        listas = warm_pool()
+        print(f"🔥 Worker {os.getpid()}: {listas} conexiones listas.")
+    except Exception as e:
+        # Sin base al arrancar el worker igual se levanta: el circuit breaker se encarga
+        print(f"⚠️ Worker {os.getpid()} arranca sin conexiones precalentadas: {e}")
+
+    # El catálogo de logros se registra una vez aquí: así emit() no abre una
+    # conexión propia en medio de un request que ya tiene otra
+    try:
+        logros_engine.sync_catalog()
+    except Exception as e:
+        print(f"⚠️ Catálogo de logros pendiente (se cargará en el primer evento): {e}")
+
+
+def drenar():
+    """
+    Al recibir SIGTERM, cuando ya terminaron los requests en curso: vacía los buffers
+    de escritura (la XP antes que los logros, que reciben sus eventos "nivel") y
+    cierra las conexiones en vez de dejar que Postgres las corte.
+    """
+    for nombre, vaciar in (("experiencia", xp_buffer.shutdown), ("presencia", presencia_buffer.shutdown),
+                           ("logros", logros_engine.shutdown)):
+        try:
+            vaciar()
+        except Exception as e:
+            print(f"⚠️ No se pudo vaciar {nombre} al apagar el worker: {e}")
+
+    hasher.shutdown()
+    close_pool()
+    print(f"👋 Worker {os.getpid()} drenado.")
+
+
+# ==========================================
+# MARK: COMANDOS CLI (flask --app videojuego ...)
+# ==========================================
+@app.cli.command("migrate")
+def migrate_command():
+    """Aplica las migraciones pendientes de migrations/."""
+    import migrate
+
+    aplicadas = migrate.run_migrations()
+    print(f"✅ {len(aplicadas)} migración(es) aplicada(s)." if aplicadas else "✅ La base ya está al día.")
+
+
+@app.cli.command("migrate-status")
+def migrate_status_command():
+    """Muestra qué migraciones están aplicadas."""
+    import migrate
+
+    for version, nombre, aplicada in migrate.migration_status():
+        print(f"{'✔' if aplicada else '·'} {version:04d}_{nombre}")
+
+
+@app.cli.command("check-plans")
+def check_plans_command():
+    """Falla si alguna consulta frecuente no filtra con su índice."""
+    import migrate
+
+    fallos = migrate.check_query_plans()
+
+    for nombre, problemas in fallos.items():
+        print(f"❌ {nombre}: {'; '.join(problemas)}")
+
+    if fallos:
+        raise SystemExit(1)
+
+    print(f"✅ Las {len(migrate.HOT_QUERIES)} consultas frecuentes usan índices.")
+
+
+@app.cli.command("rebuild-ranking")
+def rebuild_ranking_command():
+    """Recalcula ranking_personaje desde participa (tras cargas masivas o correcciones)."""
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("TRUNCATE ranking_personaje;")
+        cur.execute("""
+            INSERT INTO ranking_personaje (id_personaje, id_jugador, clase, puntuacion, partidas, victorias)
+            SELECT p.id_personaje, p.id_jugador, p.clase, SUM(pa.puntuacion), COUNT(*),
+                   COUNT(*) FILTER (WHERE pt.resultado = 'victoria')
+            FROM participa pa
+            JOIN partida pt ON pt.id_partida = pa.id_partida
+            JOIN personaje p ON p.id_personaje = pa.id_personaje
+            GROUP BY p.id_personaje;
+        """)
+        filas = cur.rowcount
+        conn.commit()
+
+    print(f"✅ Ranking recalculado para {filas} personajes.")
+
+
+@app.cli.command("backfill-logros")
+def backfill_logros_command():
+    """Evalúa todas las reglas de logros sobre los jugadores existentes."""
+    for nombre, nuevos in logros_engine.backfill().items():
+        print(f"🏅 {nombre}: {nuevos} desbloqueo(s) nuevo(s)")
+
+
+@app.cli.command("rebuild-gremios")
+def rebuild_gremios_command():
+    """Recalcula resumen_gremio desde pertenece (corrige la deriva de borrados en cascada)."""
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO resumen_gremio (id_gremio, miembros, nivel_total, puntuacion_total)
+            SELECT g.id_gremio,
+                   COUNT(pe.id_jugador),
+                   COALESCE(SUM(j.nivel), 0),
+                   COALESCE(SUM(r.puntuacion), 0)
+            FROM gremio g
+            LEFT JOIN pertenece pe ON pe.id_gremio = g.id_gremio
+            LEFT JOIN jugador j ON j.id_jugador = pe.id_jugador
+            LEFT JOIN (
+                SELECT id_jugador, SUM(puntuacion) AS puntuacion
+                FROM ranking_personaje
+                GROUP BY id_jugador
+            ) r ON r.id_jugador = pe.id_jugador
+            GROUP BY g.id_gremio
+            ON CONFLICT (id_gremio) DO UPDATE
+            SET miembros = EXCLUDED.miembros,
+                nivel_total = EXCLUDED.nivel_total,
+                puntuacion_total = EXCLUDED.puntuacion_total,
+                actualizado_en = NOW();
+        """)
+        filas = cur.rowcount
+        conn.commit()
+
+    print(f"✅ Resumen recalculado para {filas} gremios.")
+
+
+@app.cli.command("refresh-reports")
+def refresh_reports_command():
+    """Suma a los reportes las partidas nuevas desde la última marca de agua."""
+    desde, hasta, personajes = reports.refresh()
+
+    if hasta == desde:
+        print(f"✅ Reportes al día (hasta la partida {hasta}).")
+    else:
+        print(f"✅ Partidas {desde + 1}–{hasta} procesadas ({personajes} personajes actualizados).")
+
+
+@app.cli.command("export")
+@click.argument("tabla", type=click.Choice(list(bulk.TABLES)))
+@click.option("--formato", type=click.Choice(bulk.FORMATS), default="csv")
+@click.option("--salida", type=click.File("wb"), default="-", help="Archivo (por defecto stdout)")
+def export_command(tabla, formato, salida):
+    """Vuelca una tabla con COPY TO STDOUT."""
+    for trozo in bulk.stream_export(tabla, formato):
+        salida.write(trozo)
+
+
+@app.cli.command("import")
+@click.argument("tabla", type=click.Choice(list(bulk.TABLES)))
+@click.argument("archivo", type=click.File("rb"))
+@click.option("--formato", type=click.Choice(bulk.FORMATS), default="csv")
+def import_command(tabla, archivo, formato):
+    """Carga un archivo exportado con COPY FROM STDIN y lo fusiona en una transacción."""
+    filas = bulk.import_stream(tabla, formato, archivo)
+    print(f"✅ {filas} filas importadas en {tabla}.", file=sys.stderr)
+
+
+@app.cli.command("build-assets")
+def build_assets_command():
+    """Genera static/dist/ (archivos con hash, variantes WebP y .gz/.br) y su manifiesto."""
+    manifest = assets.build()
+    print(f"✅ {len(manifest)} archivos en static/dist/ (reinicia la app para usar el manifiesto).")
 
 
 # ==========================================